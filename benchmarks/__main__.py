@@ -0,0 +1,143 @@
+"""
+Benchmarks for the overhead of the eval suite itself, separate from LLM latency.
+
+Run from the root of the repository, against a database with the datasets
+loaded (e.g. a local Postgres container and `python3 -m suite load`):
+
+    uv run python3 -m benchmarks --dataset bird --dataset spider
+
+The results are written to `results/benchmarks/<commit>.json`. Pass a previous
+results file to `--compare` to fail on regressions of the median timings.
+"""
+
+import json
+import platform
+from datetime import UTC, datetime
+from pathlib import Path
+
+import click
+
+from suite.utils import get_git_info
+from suite.validate import collect_gold_queries
+
+from .harness import Benchmark, find_regressions
+from .micro import (
+    bench_compare,
+    bench_generate_report,
+    bench_get_dataframe,
+    bench_parser,
+    bench_serialize,
+)
+from .pipeline import bench_eval
+
+root_directory = Path(__file__).resolve().parent.parent
+datasets_dir = root_directory / "datasets"
+results_dir = root_directory / "results" / "benchmarks"
+
+
+@click.command()
+@click.option(
+    "--dataset",
+    multiple=True,
+    default=["bird", "spider"],
+    help="Datasets to benchmark [default: bird, spider]",
+)
+@click.option(
+    "--repeat", default=5, help="Number of timed runs per micro-benchmark [default: 5]"
+)
+@click.option(
+    "--eval-repeat",
+    default=1,
+    help="Number of timed runs of the eval benchmarks [default: 1]",
+)
+@click.option(
+    "--skip-eval",
+    is_flag=True,
+    default=False,
+    help="Only run the micro-benchmarks, which do not require the eval databases",
+)
+@click.option("--output", default=None, help="File to write the results to")
+@click.option(
+    "--compare",
+    "compare_file",
+    default=None,
+    help="Results of a previous run to check for regressions against",
+)
+@click.option(
+    "--threshold",
+    default=0.2,
+    help="Slowdown of the median that counts as a regression [default: 0.2]",
+)
+def main(
+    dataset: tuple[str, ...],
+    repeat: int,
+    eval_repeat: int,
+    skip_eval: bool,
+    output: str | None,
+    compare_file: str | None,
+    threshold: float,
+) -> None:
+    datasets = list(dataset)
+    queries = collect_gold_queries(datasets_dir, datasets)
+    benchmarks = []  # type: list[Benchmark]
+
+    def report(benchmark: Benchmark | None) -> None:
+        if benchmark is None:
+            return
+        benchmarks.append(benchmark)
+        timings = benchmark["timings"]
+        print(
+            f"  {benchmark['name']}: p50 {timings['p50']:.6f}s, "
+            f"p95 {timings['p95']:.6f}s, "
+            f"{benchmark['throughput']} {benchmark['unit']}/s"
+        )
+
+    print("Micro-benchmarks")
+    report(bench_compare(repeat))
+    report(bench_parser([x for y in queries.values() for x in y], repeat))
+    for results_format in ["json", "parquet"]:
+        report(bench_serialize(repeat, results_format))
+        report(bench_generate_report(repeat, results_format))
+    benchmark = bench_get_dataframe(queries, repeat)
+    if benchmark is None:
+        print("  get_dataframe: skipped, no dataset database is reachable")
+    report(benchmark)
+
+    if not skip_eval:
+        print("Eval pipeline (gold agent)")
+        for name in datasets:
+            report(bench_eval(name, eval_repeat))
+
+    git_info = get_git_info(root_directory)
+    output_file = (
+        Path(output) if output else results_dir / f"{git_info.commit[:12]}.json"
+    )
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with output_file.open("w") as fp:
+        json.dump(
+            {
+                "commit": git_info.commit,
+                "branch": git_info.branch,
+                "time": datetime.now(UTC).isoformat(),
+                "python": platform.python_version(),
+                "benchmarks": benchmarks,
+            },
+            fp,
+            indent=2,
+        )
+    print(f"Results written to {output_file}")
+
+    if compare_file is not None:
+        with open(compare_file) as fp:
+            baseline = json.load(fp)["benchmarks"]
+        regressions = find_regressions(benchmarks, baseline, threshold)
+        if len(regressions) > 0:
+            print("Regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            raise SystemExit(1)
+        print(f"No regressions against {compare_file}")
+
+
+if __name__ == "__main__":
+    main()
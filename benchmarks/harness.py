@@ -0,0 +1,62 @@
+import time
+from collections.abc import Callable
+from typing import NotRequired, TypedDict
+
+from suite.stats import TimingSummary, summarize
+
+
+class Benchmark(TypedDict):
+    name: str
+    timings: TimingSummary
+    throughput: float
+    unit: str
+    # per eval durations, for the end-to-end eval benchmarks
+    eval_duration: NotRequired[TimingSummary]
+
+
+def measure(
+    name: str,
+    fn: Callable[[], int],
+    repeat: int,
+    unit: str = "ops",
+) -> Benchmark:
+    """
+    Run `fn` `repeat` times (after a warmup run), where `fn` returns the number
+    of operations it performed. Throughput is given in operations per second of
+    the median run.
+    """
+    fn()
+    timings = []
+    operations = 1
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operations = fn()
+        timings.append(time.perf_counter() - start)
+    summary = summarize(timings, precision=6)
+    return {
+        "name": name,
+        "timings": summary,
+        "throughput": round(operations / summary["p50"], 3) if summary["p50"] else 0.0,
+        "unit": unit,
+    }
+
+
+def find_regressions(
+    benchmarks: list[Benchmark], baseline: list[Benchmark], threshold: float
+) -> list[str]:
+    """
+    Compare the median timings against a baseline run, returning a message for
+    each benchmark that got slower by more than `threshold` (e.g. 0.2 for 20%).
+    """
+    previous = {x["name"]: x for x in baseline}
+    regressions = []
+    for benchmark in benchmarks:
+        if benchmark["name"] not in previous:
+            continue
+        old = previous[benchmark["name"]]["timings"]["p50"]
+        new = benchmark["timings"]["p50"]
+        if old > 0 and new > old * (1 + threshold):
+            regressions.append(
+                f"{benchmark['name']}: {old:.6f}s -> {new:.6f}s (+{(new / old - 1) * 100:.1f}%)"
+            )
+    return regressions
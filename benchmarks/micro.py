@@ -0,0 +1,206 @@
+"""
+Micro-benchmarks for the parts of the eval pipeline that do not depend on the
+agent: fetching query results, comparing them, parsing the gold queries, and
+serializing and reporting the results.
+"""
+
+import random
+import tempfile
+from pathlib import Path
+from typing import Any
+
+import polars as pl
+import psycopg
+from click.testing import CliRunner
+from sql_metadata import Parser
+
+import suite.main
+from suite.columnar import write_results
+from suite.tasks.text_to_sql import compare, get_dataframe
+from suite.utils import get_psycopg_str
+from suite.validate import GoldQuery
+
+from .harness import Benchmark, measure
+
+ROWS = 10000
+EVALS = 1200
+
+
+def make_frames(rows: int) -> tuple[pl.DataFrame, pl.DataFrame]:
+    rng = random.Random(0)
+    expected = pl.DataFrame(
+        {
+            "id": list(range(rows)),
+            "name": [f"name {i}" for i in range(rows)],
+            "value": [rng.random() for _ in range(rows)],
+        }
+    )
+    # same rows and columns in a different order, with an extra column
+    actual = expected.sample(fraction=1.0, shuffle=True, seed=0).select(
+        pl.col("value"), pl.col("id"), pl.col("name"), pl.lit(1).alias("extra")
+    )
+    return actual, expected
+
+
+def make_results(evals: int) -> dict[str, Any]:
+    datasets = {}
+    for i in range(evals):
+        dataset = f"dataset_{i % 4}"
+        if dataset not in datasets:
+            datasets[dataset] = {
+                "passing": 0,
+                "total": 0,
+                "total_duration": 0.0,
+                "usage": {
+                    "cached_tokens": 0,
+                    "cached_tokens_cost": 0.0,
+                    "request_tokens": 0,
+                    "request_tokens_cost": 0.0,
+                    "response_tokens": 0,
+                    "response_tokens_cost": 0.0,
+                },
+                "failed": [],
+                "failed_error_counts": {},
+                "errored": [],
+                "evals": [],
+            }
+        result = datasets[dataset]
+        status = "pass" if i % 3 else "fail"
+        result["total"] += 1
+        result["passing"] += status == "pass"
+        result["total_duration"] += 1.5
+        if status == "fail":
+            result["failed"].append(f"{i:03}")
+        result["evals"].append(
+            {
+                "status": status,
+                "dataset": dataset,
+                "database": "database",
+                "name": f"{i:03}",
+                "question": "How many rows are there?" * 4,
+                "duration": 1.5,
+                "details": {
+                    "generated_query": "SELECT count(*) FROM t WHERE a = 1" * 4,
+                    "expected_query": "SELECT count(*) FROM t WHERE a = 1" * 4,
+                    "duration": 1.2,
+                    "usage": {"request_tokens": 1000, "response_tokens": 100},
+                    "messages": [{"role": "user", "content": "x" * 2000}],
+                    "timings": {"agent": 1.2, "gold_query": 0.1, "compare": 0.01},
+                },
+            }
+        )
+    return {
+        "task": "text_to_sql",
+        "start_time": "2025-01-01T00:00:00+00:00",
+        "end_time": "2025-01-01T01:00:00+00:00",
+        "details": {},
+        "results": datasets,
+    }
+
+
+def bench_compare(repeat: int) -> Benchmark:
+    actual, expected = make_frames(ROWS)
+    return measure(
+        f"compare[{ROWS} rows]",
+        lambda: int(compare(actual, expected)),
+        repeat,
+        unit="comparisons",
+    )
+
+
+def bench_parser(queries: list[GoldQuery], repeat: int) -> Benchmark:
+    def run() -> int:
+        tables = 0
+        for gold in queries:
+            try:
+                tables += len(Parser(gold["query"]).tables)
+            except Exception:
+                pass
+        return len(queries)
+
+    return measure(f"parser[{len(queries)} queries]", run, repeat, unit="queries")
+
+
+def bench_get_dataframe(
+    queries: dict[tuple[str, str], list[GoldQuery]], repeat: int
+) -> Benchmark | None:
+    """
+    Fetch the results of the gold queries of the first loaded database, or None
+    if no database is reachable.
+    """
+    for dataset, database in queries:
+        try:
+            conn = psycopg.connect(
+                get_psycopg_str(f"{dataset}_{database}"), autocommit=True
+            )
+            break
+        except (KeyError, psycopg.OperationalError):
+            continue
+    else:
+        return None
+    gold_queries = queries[(dataset, database)]
+
+    def run() -> int:
+        for gold in gold_queries:
+            try:
+                get_dataframe(gold["query"], conn)
+            except psycopg.DatabaseError:
+                pass
+        return len(gold_queries)
+
+    with conn:
+        return measure(
+            f"get_dataframe[{dataset}_{database}]", run, repeat, unit="queries"
+        )
+
+
+def get_format_name(name: str, results_format: str) -> str:
+    # the names of the JSON benchmarks predate the Parquet format
+    if results_format == "json":
+        return f"{name}[{EVALS} evals]"
+    return f"{name}[{EVALS} evals, {results_format}]"
+
+
+def bench_serialize(repeat: int, results_format: str = "json") -> Benchmark:
+    results = make_results(EVALS)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f"results.{results_format}"
+
+        def run() -> int:
+            write_results(results, path)
+            return EVALS
+
+        return measure(
+            get_format_name("serialize", results_format), run, repeat, unit="evals"
+        )
+
+
+def bench_generate_report(repeat: int, results_format: str = "json") -> Benchmark:
+    results = make_results(EVALS)
+    with tempfile.TemporaryDirectory() as tmp:
+        results_dir = Path(tmp)
+        write_results(results, results_dir / f"results.{results_format}")
+        runner = CliRunner()
+        original = suite.main.results_dir
+        suite.main.results_dir = results_dir
+        try:
+
+            def run() -> int:
+                result = runner.invoke(
+                    suite.main.cli,
+                    ["generate-report"],
+                    # never save the synthetic results to the report database
+                    env={"REPORT_POSTGRES_DSN": ""},
+                )
+                if result.exception is not None:
+                    raise result.exception
+                return EVALS
+
+            return measure(
+                get_format_name("generate_report", results_format),
+                run,
+                repeat,
+                unit="evals",
+            )
+        finally:
+            suite.main.results_dir = original
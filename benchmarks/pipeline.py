@@ -0,0 +1,66 @@
+"""
+End-to-end benchmark of the `eval` command with the gold agent, which answers
+each question with its gold query, so that the measured time is the overhead of
+the eval pipeline itself (connections, catalog, query execution, comparison and
+bookkeeping) without any LLM latency.
+"""
+
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from click.testing import CliRunner
+
+import suite.main
+from suite.stats import summarize
+
+from .harness import Benchmark
+
+
+def bench_eval(dataset: str, repeat: int) -> Benchmark:
+    runner = CliRunner()
+    original = suite.main.results_dir
+    timings = []
+    durations = []  # type: list[float]
+    evals = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        suite.main.results_dir = Path(tmp)
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                # without the query cache, so that every repeat executes the
+                # generated queries rather than the first one only
+                result = runner.invoke(
+                    suite.main.cli,
+                    [
+                        "eval",
+                        "gold",
+                        "text_to_sql",
+                        "--dataset",
+                        dataset,
+                        "--no-query-cache",
+                    ],
+                )
+                timings.append(time.perf_counter() - start)
+                if result.exception is not None:
+                    raise result.exception
+                with (Path(tmp) / "results.json").open() as fp:
+                    results = json.load(fp)["results"][dataset]
+                evals = results["total"]
+                durations += [x["duration"] for x in results["evals"]]
+                if results["passing"] != results["total"]:
+                    print(
+                        f"  {dataset}: {results['total'] - results['passing']} gold "
+                        "evals did not pass, is the dataset loaded?"
+                    )
+        finally:
+            suite.main.results_dir = original
+    summary = summarize(timings, precision=6)
+    return {
+        "name": f"eval[{dataset}]",
+        "timings": summary,
+        "throughput": round(evals / summary["p50"], 3) if summary["p50"] else 0.0,
+        "unit": "evals",
+        "eval_duration": summarize(durations, precision=6),
+    }
@@ -1,15 +1,22 @@
 #!/usr/bin/env bash
 
+set -eo pipefail
+
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
-if [ -f "$SCRIPT_DIR/databases/postgres_air.sql" ]; then
+if [ -f "$SCRIPT_DIR/databases/postgres_air.sql" ] || [ -f "$SCRIPT_DIR/databases/postgres_air.sql.zst" ]; then
   exit 0
 fi
 
 mkdir -p "${SCRIPT_DIR}/databases"
 
 curl -o /tmp/postgres_air_2024.sql.zip https://popsql-misc.s3.us-east-1.amazonaws.com/postgres_air_2024.sql.zip
-unzip -d "${SCRIPT_DIR}/databases" /tmp/postgres_air_2024.sql.zip
-mv "${SCRIPT_DIR}/databases/postgres_air_2024.sql" "${SCRIPT_DIR}/databases/postgres_air.sql"
-
-# pushd "$SCRIPT_DIR/../.." || exit 1
-# uv run python3 scripts/strip_postgres_dump.py "${SCRIPT_DIR}/databases/postgres_air.sql"
+# stream the dump out of the archive into a zstd compressed file, so that the
+# multi-GB uncompressed dump never has to be written to disk
+unzip -p /tmp/postgres_air_2024.sql.zip postgres_air_2024.sql \
+  | uv run --project "${SCRIPT_DIR}/../.." python3 "${SCRIPT_DIR}/../../scripts/process_dump.py" - \
+    --name postgres_air \
+    --output-dir "${SCRIPT_DIR}/databases" \
+    --no-strip \
+    --max-size 1000000 \
+    --compress zstd
+rm /tmp/postgres_air_2024.sql.zip
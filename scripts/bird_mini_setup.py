@@ -116,17 +116,7 @@ for obj in dev_tables:
         [
             "uv",
             "run",
-            "scripts/strip_postgres_dump.py",
-            str(output_file),
-        ],
-        cwd=str(current_directory.parent),
-    )
-
-    subprocess.run(
-        [
-            "uv",
-            "run",
-            "scripts/split_file.py",
+            "scripts/process_dump.py",
             str(output_file),
         ],
         cwd=str(current_directory.parent),
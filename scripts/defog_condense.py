@@ -88,7 +88,7 @@ for entry in os.scandir(defog_data_dir):
         [
             "uv",
             "run",
-            "scripts/strip_postgres_dump.py",
+            "scripts/process_dump.py",
             f"{str(root_directory)}/datasets/spider/databases/{dataset}.sql",
         ],
         cwd=str(root_directory),
@@ -0,0 +1,260 @@
+"""
+Given a postgres dump file, stream through it in a single pass and:
+1. remove any line that starts with SET or SELECT
+2. remove any line that starts with -- at the start of the file or after an empty line
+3. remove any consecutive empty lines, as well as leading and trailing empty lines
+4. split the output into parts of at most --max-size MB, where each part ends
+   at a full statement so that the parts are executable in sequence (large
+   COPY blocks are split into multiple COPY statements)
+5. optionally compress the output with gzip or zstd
+
+Only the statement currently being processed is kept in memory, so dumps of
+any size can be processed. If the output fits in a single part, it is written
+as `<name>.sql`, otherwise as `<name>.partNNN.sql`. The input file is replaced
+by the output unless --keep-input is given. Use `-` to read the dump from stdin.
+"""
+
+import gzip
+import os
+import re
+import sys
+from pathlib import Path
+from typing import BinaryIO
+
+import click
+import zstandard
+
+BUFFER_SIZE = 1024 * 1024
+# GitHub has a 100MB file size limit, so we need to make sure our files are smaller than that.
+DEFAULT_MAX_SIZE = 95
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+COPY_END = b"\\.\n"
+PART_REGEX = re.compile(r"\.part\d{3}\.sql(\.gz|\.zst)?$")
+
+
+def open_output(path: Path, compress: str) -> BinaryIO:
+    if compress == "gzip":
+        return gzip.open(path, "wb", compresslevel=6)
+    if compress == "zstd":
+        fp = open(path, "wb", buffering=BUFFER_SIZE)
+        return zstandard.ZstdCompressor(level=10).stream_writer(fp, closefd=True)
+    return open(path, "wb", buffering=BUFFER_SIZE)
+
+
+class PartWriter:
+    """
+    Writes statements to sequentially numbered part files, starting a new part
+    whenever the next statement would make the current part exceed the limit.
+    """
+
+    def __init__(self, directory: Path, name: str, limit: int, compress: str):
+        self.directory = directory
+        self.name = name
+        self.limit = limit
+        self.compress = compress
+        self.paths = []  # type: list[Path]
+        self.fp = None  # type: BinaryIO | None
+        self.size = 0
+
+    def new_part(self) -> None:
+        self.close()
+        path = self.directory / f".{self.name}.part{len(self.paths):03}.tmp"
+        self.paths.append(path)
+        self.fp = open_output(path, self.compress)
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        """
+        Write a full statement, starting a new part if it does not fit in the
+        current one.
+        """
+        if self.fp is None or (self.size > 0 and self.size + len(data) > self.limit):
+            self.new_part()
+        self.append(data)
+
+    def append(self, data: bytes) -> None:
+        """
+        Write data to the current part, without checking the limit.
+        """
+        self.fp.write(data)
+        self.size += len(data)
+
+    def close(self) -> None:
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+    def get_final_paths(self) -> list[Path]:
+        suffix = COMPRESSION_SUFFIXES[self.compress]
+        if len(self.paths) == 1:
+            return [self.directory / f"{self.name}.sql{suffix}"]
+        return [
+            self.directory / f"{self.name}.part{i:03}.sql{suffix}"
+            for i in range(len(self.paths))
+        ]
+
+    def finalize(self) -> list[Path]:
+        """
+        Rename the temporary part files to their final names, returning them.
+        """
+        self.close()
+        final = self.get_final_paths()
+        for path, target in zip(self.paths, final, strict=True):
+            os.replace(path, target)
+        return final
+
+    def abort(self) -> None:
+        self.close()
+        for path in self.paths:
+            path.unlink(missing_ok=True)
+
+
+def process(inp: BinaryIO, writer: PartWriter, strip: bool) -> None:
+    """
+    Stream the dump from `inp` to `writer`, buffering a single statement at a time.
+    The rows of COPY blocks are streamed directly, and if a block does not fit in
+    the current part, it is ended and continued by a new COPY in the next part.
+    """
+    statement = []  # type: list[bytes]
+    copy_header = None  # type: bytes | None
+    copy_rows = 0
+    in_string = False
+    pending_blank = False
+    last_line_empty = True
+
+    for line in inp:
+        if copy_header is not None:
+            if line.startswith(COPY_END):
+                writer.append(line)
+                copy_header = None
+                continue
+            if copy_rows > 0 and writer.size + len(line) + len(COPY_END) > writer.limit:
+                writer.append(COPY_END)
+                writer.new_part()
+                writer.append(copy_header)
+                copy_rows = 0
+            writer.append(line)
+            copy_rows += 1
+            continue
+
+        if not in_string:
+            if strip and (line.startswith(b"SELECT") or line.startswith(b"SET")):
+                continue
+            if strip and line.startswith(b"--") and last_line_empty:
+                continue
+            if line.strip() == b"":
+                last_line_empty = True
+                pending_blank = len(statement) > 0 or writer.fp is not None
+                continue
+            last_line_empty = False
+            if pending_blank:
+                statement.append(b"\n")
+                pending_blank = False
+            if line.startswith(b"--"):
+                statement.append(line)
+                continue
+
+        statement.append(line)
+        # quotes are escaped by doubling them, so an odd number toggles the state
+        if line.count(b"'") % 2 == 1:
+            in_string = not in_string
+        if in_string or not line.rstrip().endswith(b";"):
+            continue
+        writer.write(b"".join(statement))
+        statement = []
+        if line.startswith(b"COPY ") and line.rstrip().endswith(b"FROM stdin;"):
+            copy_header = line
+            copy_rows = 0
+
+    if copy_header is not None or in_string:
+        raise SystemExit("The dump ended in the middle of a statement.")
+    statement.append(b"\n")
+    writer.write(b"".join(statement))
+
+
+@click.command()
+@click.argument("file_path")
+@click.option(
+    "--name",
+    default=None,
+    help="Name of the output files [default: name of the input file]",
+)
+@click.option(
+    "--output-dir",
+    default=None,
+    help="Directory to write the output to [default: directory of the input file]",
+)
+@click.option(
+    "--max-size",
+    default=DEFAULT_MAX_SIZE,
+    type=float,
+    help=f"Maximum size of each part in MB [default: {DEFAULT_MAX_SIZE}]",
+)
+@click.option(
+    "--compress",
+    default="none",
+    type=click.Choice(list(COMPRESSION_SUFFIXES.keys())),
+    help="Compress the output files [default: none]",
+)
+@click.option(
+    "--strip/--no-strip",
+    default=True,
+    help="Strip comments, SET and SELECT lines from the dump [default: strip]",
+)
+@click.option(
+    "--keep-input", is_flag=True, default=False, help="Do not remove the input file"
+)
+def main(
+    file_path: str,
+    name: str | None,
+    output_dir: str | None,
+    max_size: float,
+    compress: str,
+    strip: bool,
+    keep_input: bool,
+) -> None:
+    if file_path == "-":
+        if name is None or output_dir is None:
+            raise SystemExit("--name and --output-dir are required when reading stdin")
+        input_path = None
+    else:
+        input_path = Path(file_path)
+        if not input_path.name.endswith(".sql"):
+            raise SystemExit(f"{file_path} is not a .sql file.")
+        if name is None:
+            name = PART_REGEX.sub("", input_path.name).removesuffix(".sql")
+    directory = Path(output_dir) if output_dir else input_path.parent
+    directory.mkdir(parents=True, exist_ok=True)
+
+    writer = PartWriter(directory, name, int(max_size * 1024 * 1024), compress)
+    try:
+        if input_path is None:
+            process(sys.stdin.buffer, writer, strip)
+        else:
+            with input_path.open("rb", buffering=BUFFER_SIZE) as inp:
+                process(inp, writer, strip)
+    except BaseException:
+        writer.abort()
+        raise
+
+    if input_path is not None and not keep_input:
+        input_path.unlink()
+    # remove the outputs of any previous run that are not replaced by this one,
+    # so that stale parts are not loaded. If the input is itself a part, the
+    # other parts next to it are inputs too, so they are left alone.
+    if input_path is None or not PART_REGEX.search(input_path.name):
+        final = set(writer.get_final_paths())
+        for path in directory.iterdir():
+            if not path.name.startswith(name) or path in final or path == input_path:
+                continue
+            # only the exact names of outputs, e.g. not <name>.sqlite
+            rest = path.name[len(name) :]
+            outputs = {f".sql{x}" for x in COMPRESSION_SUFFIXES.values()}
+            if rest in outputs or PART_REGEX.fullmatch(rest):
+                path.unlink()
+    for path in writer.finalize():
+        print(f"Written {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,12 @@ from .baseline import (
 from .baseline import (
     version as baseline_version,
 )
+from .gold import (
+    text_to_sql as gold_text_to_sql,
+)
+from .gold import (
+    version as gold_version,
+)
 from .pgai import (
     setup as pgai_setup,
 )
@@ -51,6 +57,10 @@ def get_agent_fn(agent: str, task: str) -> AgentFn:
         if task != "text_to_sql":
             raise ValueError(f"Invalid task for vanna: {task}")
         agent_fn = vanna_text_to_sql
+    elif agent == "gold":
+        if task != "text_to_sql":
+            raise ValueError(f"Invalid task for gold: {task}")
+        agent_fn = gold_text_to_sql
     else:
         raise ValueError(f"Invalid agent: {agent}")
     return agent_fn
@@ -58,7 +68,7 @@ def get_agent_fn(agent: str, task: str) -> AgentFn:
 
 def get_agent_setup_fn(
     agent: str,
-) -> Callable[[Connection, Provider, str, int], Awaitable[None]]:
+) -> Callable[[Connection, Provider, str, int], Awaitable[int | None]]:
     if agent == "pgai":
         return pgai_setup
     if agent == "vanna" or agent == "vn":
@@ -74,5 +84,7 @@ def get_agent_version(agent: str) -> str:
         return pgai_version()
     elif agent == "vanna" or agent == "vn":
         return vanna_version()
+    elif agent == "gold":
+        return gold_version()
     else:
         raise ValueError(f"Invalid agent: {agent}")
@@ -3,8 +3,14 @@ import os
 import psycopg
 from dotenv import load_dotenv
 from openai import OpenAI
+from openai.types import CompletionUsage
 from pydantic import BaseModel
 
+from ..concurrency import admit
+from ..hedging import get_request_timeout, make_request_sync
+from ..mock_llm import get_mock_openai
+from ..timing import span
+from ..tracing import set_attributes
 from ..types import Provider, TextToSql
 
 load_dotenv()
@@ -23,35 +29,69 @@ class Tables(BaseModel):
     tables: list[str]
 
 
+def get_client(provider: Provider, model: str) -> OpenAI:
+    # the requests are bounded by the client, as the threads of the requests
+    # that time out or lose a hedge are not cancelled
+    timeout = get_request_timeout()
+    agent_client = get_mock_openai(model, "baseline") if provider == "mock" else client
+    if timeout is None:
+        return agent_client
+    return agent_client.with_options(timeout=timeout)
+
+
+def get_usage_attributes(usage: CompletionUsage | None) -> dict[str, int | None]:
+    if usage is None:
+        return {}
+    return {
+        "gen_ai.usage.input_tokens": usage.prompt_tokens,
+        "gen_ai.usage.output_tokens": usage.completion_tokens,
+    }
+
+
 def get_tables(
     conn: psycopg.Connection, inp: str, provider: Provider, model: str
 ) -> list[str]:
-    with conn.cursor() as cur:
+    with span("retrieval"), conn.cursor() as cur:
         cur.execute(
             "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'"
         )
         tables = cur.fetchall()
         tables = [table[0] for table in tables]
     tables = "\n".join(tables)
-    chat = client.beta.chat.completions.parse(
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an AI assistant that can pick out the most relevant SQL tables that would help answer a given question.",
-            },
+    with (
+        admit(provider),
+        span(
+            "llm",
             {
-                "role": "system",
-                "content": f"Here are the tables in the database:\n\n{tables}",
+                "gen_ai.operation.name": "chat",
+                "gen_ai.system": provider,
+                "gen_ai.request.model": "gpt-4o-mini",
             },
-            {
-                "role": "user",
-                "content": f"Which tables would you use to answer the following question:\n\n{inp}",
-            },
-        ],
-        model="gpt-4o-mini",
-        n=1,
-        response_format=Tables,
-    )
+        ),
+    ):
+        chat, _ = make_request_sync(
+            f"{provider}:gpt-4o-mini",
+            lambda: get_client(provider, model).beta.chat.completions.parse(
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are an AI assistant that can pick out the most relevant SQL tables that would help answer a given question.",
+                    },
+                    {
+                        "role": "system",
+                        "content": f"Here are the tables in the database:\n\n{tables}",
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Which tables would you use to answer the following question:\n\n{inp}",
+                    },
+                ],
+                model="gpt-4o-mini",
+                n=1,
+                response_format=Tables,
+            ),
+        )
+        set_attributes(get_usage_attributes(chat.usage))
     return chat.choices[0].message.parsed.tables
 
 
@@ -66,7 +106,7 @@ def text_to_sql(
     tables = get_tables(conn, inp, provider, model)
     table_ddl = []
     for table in tables:
-        with conn.cursor() as cur:
+        with span("retrieval"), conn.cursor() as cur:
             cur.execute(
                 """
 SELECT
@@ -123,11 +163,26 @@ group by relname;
             "content": f"Generate a SQL query for PostgreSQL that answers the following question:\n\n{inp}",
         },
     ]
-    chat = client.beta.chat.completions.parse(
-        messages=messages,
-        model="gpt-4o-mini",
-        n=1,
-        response_format=SQLQuery,
-        temperature=0,
-    )
+    with (
+        admit(provider),
+        span(
+            "llm",
+            {
+                "gen_ai.operation.name": "chat",
+                "gen_ai.system": provider,
+                "gen_ai.request.model": "gpt-4o-mini",
+            },
+        ),
+    ):
+        chat, _ = make_request_sync(
+            f"{provider}:gpt-4o-mini",
+            lambda: get_client(provider, model).beta.chat.completions.parse(
+                messages=messages,
+                model="gpt-4o-mini",
+                n=1,
+                response_format=SQLQuery,
+                temperature=0,
+            ),
+        )
+        set_attributes(get_usage_attributes(chat.usage))
     return {"messages": messages, "query": chat.choices[0].message.parsed.query}
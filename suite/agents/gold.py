@@ -0,0 +1,57 @@
+"""
+Gold agent
+
+Stand-in agent that answers each question with its gold query, without calling
+an LLM. It is used to measure the overhead of the eval pipeline itself (see
+`benchmarks/`), and every eval it runs should pass.
+"""
+
+import json
+from functools import cache
+from pathlib import Path
+
+import psycopg
+
+from ..types import ContextMode, Provider, TextToSql
+
+datasets_dir = Path(__file__).resolve().parent.parent.parent / "datasets"
+
+
+def version() -> str:
+    return "1.0.0"
+
+
+@cache
+def get_gold_queries(dataset: str, database: str) -> dict[str, str]:
+    queries = {}
+    for eval_path in sorted((datasets_dir / dataset / "evals").iterdir()):
+        with (eval_path / "eval.json").open() as fp:
+            inp = json.load(fp)
+        if inp["database"] == database:
+            queries[inp["question"]] = inp["query"]
+    return queries
+
+
+def get_dataset_database(dbname: str) -> tuple[str, str]:
+    # databases are named <dataset>_<database>, and both can contain underscores
+    for dataset in sorted(
+        (x.name for x in datasets_dir.iterdir()), key=len, reverse=True
+    ):
+        if dbname.startswith(f"{dataset}_"):
+            return dataset, dbname[len(dataset) + 1 :]
+    raise ValueError(f"Unknown dataset for database: {dbname}")
+
+
+async def text_to_sql(
+    conn: psycopg.Connection,
+    inp: str,
+    provider: Provider,
+    model: str,
+    context_mode: ContextMode,
+    gold_tables: list[str],
+) -> TextToSql:
+    dataset, database = get_dataset_database(conn.info.dbname)
+    query = get_gold_queries(dataset, database).get(inp)
+    if query is None:
+        return {"error": f"No gold query for question: {inp}", "messages": []}
+    return {"error": None, "messages": [], "query": query}
@@ -1,11 +1,12 @@
 import asyncio
 import os
-import random
 from pathlib import Path
+from typing import Any
 
 import pgai.semantic_catalog as sc
 import psycopg
 import pydantic_ai
+from pgai.semantic_catalog.gen_sql import GenerateSQLResponse
 from psycopg.sql import SQL, Identifier
 from pydantic_ai.messages import (
     ModelRequest,
@@ -14,7 +15,25 @@ from pydantic_ai.messages import (
     ToolCallPart,
     UserPromptPart,
 )
+from tokencost import count_string_tokens
 
+from ..catalogs import (
+    CompiledCatalog,
+    compile_catalog,
+    create_config,
+    diff_catalogs,
+    get_catalog_file,
+    get_config,
+    get_item_key,
+    load_compiled,
+    set_config,
+    to_yaml,
+)
+from ..concurrency import admit, get_backoff
+from ..hedging import make_request
+from ..mock_llm import get_mock_model
+from ..timing import span
+from ..tracing import set_attributes
 from ..types import ContextMode, Provider, TextToSql
 from ..utils import get_db_url_from_connection, get_git_info
 
@@ -24,6 +43,33 @@ def version() -> str:
     return f"{git_info.branch}-{git_info.commit}"
 
 
+async def drop_removed(
+    tcon: psycopg.AsyncConnection,
+    catalog_sc: sc.SemanticCatalog,
+    removed: list[dict[str, Any]],
+) -> int:
+    """
+    Drop the SQL examples and facts of the semantic catalog that were removed
+    from (or changed in) the catalog, returning the number dropped.
+
+    Changed descriptions of tables replace the previous ones when they are
+    saved again, which also clears their embeddings (pgai's triggers null the
+    vectors of the rows whose description is updated) so that `vectorize_all`
+    embeds them again, but SQL examples and facts are added as new rows.
+    """
+    keys = {get_item_key(x) for x in removed}
+    dropped = 0
+    for example in await catalog_sc.list_sql_examples(tcon):
+        if ("sql_example", example.sql, example.description) in keys:
+            await catalog_sc.drop_sql_example(tcon, example.id)
+            dropped += 1
+    for fact in await catalog_sc.list_facts(tcon):
+        if ("fact", fact.description) in keys:
+            await catalog_sc.drop_fact(tcon, fact.id)
+            dropped += 1
+    return dropped
+
+
 async def setup(
     conn: psycopg.Connection,
     catalog: str,
@@ -31,9 +77,19 @@ async def setup(
     provider: Provider,
     model: str,
     vector_dimensions: int,
-):
+) -> int | None:
+    """
+    Create the semantic catalog of the database and import its catalog into
+    it, returning the estimated number of tokens of the paid embeddings.
+
+    If the semantic catalog was already set up with the same embedding
+    model, only the documents that differ from the catalog it was set up with
+    are imported and embedded, and nothing is done if the catalog did not
+    change.
+    """
     import pgai
-    from pgai.semantic_catalog import create
+    from pgai.semantic_catalog import create, from_name
+    from pgai.semantic_catalog.file import item_from_dict, save_to_catalog
     from pgai.semantic_catalog.vectorizer import embedding_config_from_dict
 
     db_url = get_db_url_from_connection(conn)
@@ -63,22 +119,46 @@ async def setup(
     )
 
     database = conn.info.dbname.replace(f"{dataset}_", "")
+    compiled = compile_catalog(get_catalog_file(dataset, catalog, database))
+    embedding = f"{provider}:{model}:{vector_dimensions}"
 
-    yaml_file = (
-        Path(__file__).parent.parent.parent
-        / "datasets"
-        / dataset
-        / "catalogs"
-        / catalog
-        / f"{database}.yaml"
-    )
+    previous: CompiledCatalog | None = None
+    if get_config(conn, "pgai_embedding") == embedding:
+        previous_hash = get_config(conn, "pgai_catalog_hash")
+        if previous_hash == compiled["hash"]:
+            return 0
+        if previous_hash is not None:
+            previous = load_compiled(previous_hash)
+    added, removed = diff_catalogs(previous, compiled)
 
     async with (
         await psycopg.AsyncConnection.connect(db_url) as tcon,
     ):
-        sc = await create(tcon, "default", embedding_name=None, embedding_config=config)
-        with yaml_file.open("r") as f:
-            await sc.import_catalog(tcon, tcon, f, None)
+        if previous is None:
+            # set up from scratch, e.g. with another embedding model
+            for existing in await sc.list_semantic_catalogs(tcon):
+                if existing.name == "default":
+                    await existing.drop(tcon)
+            catalog_sc = await create(
+                tcon, "default", embedding_name=None, embedding_config=config
+            )
+        else:
+            catalog_sc = await from_name(tcon, "default")
+            await drop_removed(tcon, catalog_sc, removed)
+        await save_to_catalog(
+            tcon, tcon, catalog_sc.id, (item_from_dict(x) for x in added)
+        )
+        # only the documents without embeddings are embedded
+        await catalog_sc.vectorize_all(tcon)
+
+    create_config(conn)
+    set_config(conn, "pgai_embedding", embedding)
+    set_config(conn, "pgai_catalog_hash", compiled["hash"])
+    if implementation != "openai" or len(added) == 0:
+        return None
+    # pgai does not report the usage of the embeddings, so it is estimated from
+    # the documents that were embedded
+    return count_string_tokens(to_yaml(added), model)
 
 
 def message_to_json(message: ModelRequest | ModelResponse) -> dict:
@@ -116,51 +196,83 @@ async def text_to_sql(
         sql_ids = None
         fact_ids = None
         if context_mode == "specific_ids":
-            sql_ids = [x.id for x in await catalog.list_sql_examples(target_con)]
-            fact_ids = [x.id for x in await catalog.list_facts(target_con)]
-            async with target_con.cursor() as cur:
-                await cur.execute(
-                    SQL("""
-                        SELECT id
-                        FROM ai.{table}
-                        WHERE objtype = 'table'
-                        AND objnames[1] = %s
-                        AND objnames[2] = ANY(%s);
-                    """).format(
-                        table=Identifier(f"semantic_catalog_obj_{catalog.id}"),
-                    ),
-                    ("public", gold_tables),
-                )
-                obj_ids = [x[0] for x in await cur.fetchall()]
+            with span("retrieval"):
+                sql_ids = [x.id for x in await catalog.list_sql_examples(target_con)]
+                fact_ids = [x.id for x in await catalog.list_facts(target_con)]
+                async with target_con.cursor() as cur:
+                    await cur.execute(
+                        SQL("""
+                            SELECT id
+                            FROM ai.{table}
+                            WHERE objtype = 'table'
+                            AND objnames[1] = %s
+                            AND objnames[2] = ANY(%s);
+                        """).format(
+                            table=Identifier(f"semantic_catalog_obj_{catalog.id}"),
+                        ),
+                        ("public", gold_tables),
+                    )
+                    obj_ids = [x[0] for x in await cur.fetchall()]
 
-        while True:
+        async def generate_sql() -> GenerateSQLResponse:
+            # each copy of a (hedged) request runs on a connection of its own,
+            # which is closed rather than reused when the copy is cancelled in
+            # the middle of a query
+            copy_con = await psycopg.AsyncConnection.connect(db_url)
             try:
-                response = await catalog.generate_sql(
-                    target_con,
-                    target_con,
-                    f"{provider}:{model}",
+                return await catalog.generate_sql(
+                    copy_con,
+                    copy_con,
+                    get_mock_model(model, "pgai")
+                    if provider == "mock"
+                    else f"{provider}:{model}",
                     inp,
                     context_mode=context_mode,
                     obj_ids=obj_ids,
                     sql_ids=sql_ids,
                     fact_ids=fact_ids,
                 )
+            finally:
+                await copy_con.close()
+
+        attempt = 0
+        while True:
+            try:
+                # semantic catalog retrieval and the LLM requests are interleaved
+                # inside generate_sql, so they are timed as a single phase
+                with (
+                    admit(provider),
+                    span(
+                        "generate_sql",
+                        {
+                            "gen_ai.operation.name": "chat",
+                            "gen_ai.system": provider,
+                            "gen_ai.request.model": model,
+                        },
+                    ),
+                ):
+                    response, copies = await make_request(
+                        f"{provider}:{model}", generate_sql
+                    )
+                    set_attributes(
+                        {
+                            "gen_ai.usage.input_tokens": response.usage.request_tokens,
+                            "gen_ai.usage.output_tokens": response.usage.response_tokens,
+                            "gen_ai.response.requests": response.usage.requests,
+                        }
+                    )
             except pydantic_ai.exceptions.ModelHTTPError as e:
                 if e.status_code == 429:
-                    if provider == "mistral":
-                        wait = 5
-                        # mistral has rate limit of 1 request per second
-                        jitter = random.uniform(0, 4)
-                    else:
-                        wait = 60
-                        # other models usually have an input limit of tokens per minute
-                        jitter = random.uniform(-10, 10)
-                    wait = round(wait - jitter, 2)
-                    print(str(e), flush=True)
-                    print(
-                        f"    Rate limit hit, waiting for {wait} seconds...", flush=True
-                    )
-                    await asyncio.sleep(wait)
+                    # the rate limits of providers differ (e.g. mistral allows 1
+                    # request per second, openai limits tokens per minute), so
+                    # back off exponentially until the provider accepts it. The
+                    # rate limit is counted in the metrics of the provider by the
+                    # span of the request, rather than printed, which would break
+                    # the --progress view
+                    wait = round(get_backoff(attempt), 2)
+                    attempt += 1
+                    with span("rate_limit_wait", {"http.response.status_code": 429}):
+                        await asyncio.sleep(wait)
                     continue
                 raise e
             break
@@ -171,11 +283,15 @@ async def text_to_sql(
             (message_to_json(x[0]), message_to_json(x[1])) for x in response.messages
         ],
         "query": response.sql_statement,
+        # a hedged request is billed for each of its copies
         "usage": {
-            "cached_tokens": response.usage.details.get("cached_tokens", 0)
-            if response.usage.details is not None
-            else 0,
-            "request_tokens": response.usage.request_tokens or 0,
-            "response_tokens": response.usage.response_tokens or 0,
+            "cached_tokens": copies
+            * (
+                response.usage.details.get("cached_tokens", 0)
+                if response.usage.details is not None
+                else 0
+            ),
+            "request_tokens": copies * (response.usage.request_tokens or 0),
+            "response_tokens": copies * (response.usage.response_tokens or 0),
         },
     }
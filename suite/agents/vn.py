@@ -15,6 +15,11 @@ from vanna.anthropic import Anthropic_Chat
 from vanna.openai import OpenAI_Chat
 from vanna.pgvector import PG_VectorStore
 
+from ..catalogs import create_config, get_config, set_config
+from ..concurrency import admit
+from ..hedging import get_request_timeout, make_request_sync
+from ..mock_llm import get_mock_openai
+from ..timing import span
 from ..types import Provider, TextToSql
 from ..utils import get_db_url_from_connection
 
@@ -41,7 +46,15 @@ class OpenAIVanna(PG_VectorStore, OpenAI_Chat):
         OpenAI_Chat.__init__(self, config={**config, "temperature": 1})
 
 
-VannaType = Union[OpenAIVanna, AnthropicVanna]
+class MockVanna(PG_VectorStore, OpenAI_Chat):
+    def __init__(self, config=None):
+        PG_VectorStore.__init__(self, config=config)
+        OpenAI_Chat.__init__(
+            self, client=get_mock_openai(config["model"], "vanna"), config=config
+        )
+
+
+VannaType = Union[OpenAIVanna, AnthropicVanna, MockVanna]
 
 
 def get_vanna_client(
@@ -67,8 +80,22 @@ def get_vanna_client(
                 "model": model,
             }
         )
+    elif provider == "mock":
+        vn = MockVanna(
+            config={
+                "connection_string": get_db_url_from_connection(conn).replace(
+                    "postgres://", "postgresql://"
+                ),
+                "model": model,
+            }
+        )
     else:
         raise ValueError(f"Invalid provider: {provider}")
+    # the requests are bounded by the client, as the thread of a request that
+    # times out is not cancelled
+    timeout = get_request_timeout()
+    if timeout is not None:
+        vn.client = vn.client.with_options(timeout=timeout)
     vn.connect_to_postgres(
         host=conn.info.host,
         port=conn.info.port,
@@ -87,7 +114,19 @@ async def setup(
     model: str,
     vector_dimensions: int,
 ):
+    """
+    Train vanna on the tables of the database and their comments, which
+    `load` and `switch-catalog` set from the catalog. Nothing is done if the
+    catalog of the database did not change since vanna was trained on it.
+    """
+    catalog_hash = get_config(conn, "catalog_hash")
+    trained_hash = get_config(conn, "vanna_catalog_hash")
+    if catalog_hash is not None and trained_hash == catalog_hash:
+        return
     vn = get_vanna_client(conn)
+    if trained_hash is not None:
+        # the tables are documented again with the comments of the new catalog
+        vn.remove_collection("documentation")
     df_information_schema = vn.run_sql("""
         SELECT
             *,
@@ -103,6 +142,9 @@ async def setup(
     """)
     plan = vn.get_training_plan_generic(df_information_schema)
     vn.train(plan=plan)
+    if catalog_hash is not None:
+        create_config(conn)
+        set_config(conn, "vanna_catalog_hash", catalog_hash)
 
 
 async def text_to_sql(
@@ -113,11 +155,30 @@ async def text_to_sql(
     entire_schema: bool,
     gold_tables: list[str],
 ) -> TextToSql:
-    vn = get_vanna_client(conn, provider, model)
+    with span("agent_setup"):
+        vn = get_vanna_client(conn, provider, model)
     try:
         sys.stdout = StringIO()
         os.environ["TOKENIZERS_PARALLELISM"] = "false"
-        query = vn.generate_sql(inp, allow_llm_to_see_data=True)
+        # vanna retrieves the training data and calls the LLM within generate_sql
+        with (
+            admit(provider),
+            span(
+                "generate_sql",
+                {
+                    "gen_ai.operation.name": "chat",
+                    "gen_ai.system": provider,
+                    "gen_ai.request.model": model,
+                },
+            ),
+        ):
+            # not hedged, as the copies would share vanna's client and its
+            # connection to the database
+            query, _ = make_request_sync(
+                f"{provider}:{model}",
+                lambda: vn.generate_sql(inp, allow_llm_to_see_data=True),
+                hedge=False,
+            )
     finally:
         sys.stdout = sys.__stdout__
 
@@ -0,0 +1,224 @@
+"""
+Compiled catalogs of the databases, shared by `load`, `switch-catalog` and the
+`setup` of the agents.
+
+The YAML of a catalog is parsed once, with the LibYAML loader when PyYAML was
+built with it, and compiled to a JSON file in `results/catalog_cache/` named
+after the SHA-256 of the YAML (see `compile_catalog()`), so the catalog is not
+parsed again until it changes.
+
+The hash of the catalog whose comments were applied to a database, and of the
+catalog each agent was set up with, are saved in the `text2sql.config` table
+of the database, so that applying the same catalog again does nothing, and
+switching to another catalog (e.g. from `default` to `llm_improved`) only
+changes the comments, and embeds the descriptions, SQL examples and facts,
+that differ between them (see `diff_catalogs()`).
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, TypedDict
+
+import psycopg
+import yaml
+from psycopg.sql import SQL, Identifier
+
+# the LibYAML bindings are only available if PyYAML was built with them
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+Dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+root_directory = Path(__file__).resolve().parent.parent
+CACHE_DIR = root_directory / "results" / "catalog_cache"
+
+COMMENTS_QUERY = """
+SELECT n.nspname, c.relname, a.attname, d.description
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_description d ON d.classoid = 'pg_class'::regclass
+    AND d.objoid = c.oid
+LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = d.objsubid
+WHERE n.nspname = ANY(%s)
+AND (d.objsubid = 0 OR a.attnum IS NOT NULL)
+"""
+
+
+class CompiledCatalog(TypedDict):
+    hash: str
+    # the documents of the catalog, without its header
+    docs: list[dict[str, Any]]
+
+
+# (schema, table, column or None for the table) -> description
+Comments = dict[tuple[str, str, str | None], str]
+
+
+def get_catalog_file(dataset: str, catalog: str, database: str) -> Path:
+    catalog_file = (
+        root_directory
+        / "datasets"
+        / dataset
+        / "catalogs"
+        / catalog
+        / f"{database}.yaml"
+    )
+    if not catalog_file.exists():
+        raise ValueError(f"Catalog {catalog} not found")
+    return catalog_file
+
+
+def load_compiled(hash: str, cache_dir: Path = CACHE_DIR) -> CompiledCatalog | None:
+    path = cache_dir / f"{hash}.json"
+    if not path.exists():
+        return None
+    with path.open() as fp:
+        return json.load(fp)
+
+
+def compile_catalog(catalog_file: Path, cache_dir: Path = CACHE_DIR) -> CompiledCatalog:
+    """
+    Get the compiled catalog of a catalog file, compiling it if it changed
+    since it was last compiled.
+    """
+    data = catalog_file.read_bytes()
+    hash = hashlib.sha256(data).hexdigest()
+    compiled = load_compiled(hash, cache_dir)
+    if compiled is not None:
+        return compiled
+    docs = [
+        x
+        for x in yaml.load_all(data, Loader=Loader)
+        if x is not None and x.get("type") != "header"
+    ]
+    compiled = {"hash": hash, "docs": docs}
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # written under a temporary name, so that concurrent commands never read a
+    # partial file
+    path = cache_dir / f"{hash}.json"
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_path.open("w") as fp:
+        json.dump(compiled, fp)
+    tmp_path.replace(path)
+    return compiled
+
+
+def to_yaml(docs: list[dict[str, Any]]) -> str:
+    return yaml.dump_all(docs, Dumper=Dumper, sort_keys=False)
+
+
+def get_doc_key(doc: dict[str, Any]) -> str:
+    return json.dumps(doc, sort_keys=True)
+
+
+def get_item_key(doc: dict[str, Any]) -> tuple[str | None, ...]:
+    """
+    Get the fields that identify a document of a catalog in the semantic
+    catalog of pgai: the name of a table or view, the query and description
+    of a SQL example, and the description of a fact.
+    """
+    if doc["type"] == "sql_example":
+        return doc["type"], doc["sql"], doc.get("description")
+    if doc["type"] == "fact":
+        return doc["type"], doc["description"]
+    return doc["type"], doc.get("schema"), doc.get("name")
+
+
+def diff_catalogs(
+    previous: CompiledCatalog | None, catalog: CompiledCatalog
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """
+    Get the documents of `catalog` that are not in `previous` (added or
+    changed), and the documents of `previous` that are not in `catalog`
+    (removed or changed).
+    """
+    previous_docs = [] if previous is None else previous["docs"]
+    previous_keys = {get_doc_key(x) for x in previous_docs}
+    keys = {get_doc_key(x) for x in catalog["docs"]}
+    added = [x for x in catalog["docs"] if get_doc_key(x) not in previous_keys]
+    removed = [x for x in previous_docs if get_doc_key(x) not in keys]
+    return added, removed
+
+
+def get_comments(catalog: CompiledCatalog) -> Comments:
+    comments = {}  # type: Comments
+    for doc in catalog["docs"]:
+        if doc["type"] not in ["table", "view"]:
+            continue
+        comments[(doc["schema"], doc["name"], None)] = doc["description"]
+        for column in doc.get("columns", []):
+            comments[(doc["schema"], doc["name"], column["name"])] = column[
+                "description"
+            ]
+    return comments
+
+
+def apply_comments(conn: psycopg.Connection, catalog: CompiledCatalog) -> int:
+    """
+    Comment the tables and columns of the database with their descriptions in
+    the catalog, skipping those that already have the same comment, and
+    return the number of comments that were changed. The comments of the
+    tables and columns of its schemas that the catalog does not describe are
+    removed, e.g. those of another catalog.
+    """
+    comments = get_comments(catalog)  # type: dict[tuple[str, str, str | None], str | None]
+    schemas = sorted({x[0] for x in comments})
+    with conn.cursor() as cur:
+        cur.execute(COMMENTS_QUERY, (schemas,))
+        current = {(x[0], x[1], x[2]): x[3] for x in cur.fetchall()}
+        for key in current:
+            comments.setdefault(key, None)
+        changed = 0
+        for (schema, table, column), description in comments.items():
+            if current.get((schema, table, column)) == description:
+                continue
+            if column is None:
+                cur.execute(
+                    SQL("COMMENT ON TABLE {}.{} IS {}").format(
+                        Identifier(schema), Identifier(table), description
+                    )
+                )
+            else:
+                cur.execute(
+                    SQL("COMMENT ON COLUMN {}.{}.{} IS {}").format(
+                        Identifier(schema),
+                        Identifier(table),
+                        Identifier(column),
+                        description,
+                    )
+                )
+            changed += 1
+    return changed
+
+
+def create_config(conn: psycopg.Connection) -> None:
+    with conn.cursor() as cur:
+        cur.execute("CREATE SCHEMA IF NOT EXISTS text2sql")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS text2sql.config (
+                    name varchar NOT NULL PRIMARY KEY,
+                    value varchar NOT NULL
+            )
+        """)
+
+
+def get_config(conn: psycopg.Connection, name: str) -> str | None:
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('text2sql.config')")
+        row = cur.fetchone()
+        if row is None or row[0] is None:
+            return None
+        cur.execute("SELECT value FROM text2sql.config WHERE name = %s", (name,))
+        row = cur.fetchone()
+        return None if row is None else row[0]
+
+
+def set_config(conn: psycopg.Connection, name: str, value: str) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO text2sql.config VALUES (%s, %s)
+            ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value
+            """,
+            (name, value),
+        )
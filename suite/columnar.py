@@ -0,0 +1,230 @@
+"""
+Columnar results format, as an alternative to a single `results.json`.
+
+A results file `<name>.parquet` holds a row of the scalar fields of each eval
+(dataset, database, name, status, duration, token usage and costs, and the
+time of each phase as `timing_<phase>`), so that results can be aggregated
+with polars without parsing the details of every eval. The rest of the run
+(task, times, details and the aggregates of each dataset) is kept next to it
+in `<name>.run.json`, and the details of each eval (messages, catalog,
+queries, tracebacks, ...) in a blob store in the `blobs/` directory next to
+it, as zstd compressed JSON addressed by its sha256.
+
+`load_results()` and `write_results()` read and write results in either
+format, by the suffix of the file. Writing results in one format removes the
+results of the same name in the other format, so that they are not reported
+twice, and the blobs that no results file of the directory refers to anymore.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any
+
+import polars as pl
+import zstandard
+
+from .sharding import USAGE_KEYS
+
+TIMING_PREFIX = "timing_"
+
+EVAL_SCHEMA = {
+    "dataset": pl.String,
+    "database": pl.String,
+    "name": pl.String,
+    "question": pl.String,
+    "status": pl.String,
+    "duration": pl.Float64,
+    "exception_class": pl.String,
+    "cached_tokens": pl.Int64,
+    "cached_tokens_cost": pl.Float64,
+    "request_tokens": pl.Int64,
+    "request_tokens_cost": pl.Float64,
+    "response_tokens": pl.Int64,
+    "response_tokens_cost": pl.Float64,
+    "details_blob": pl.String,
+}
+
+
+class BlobStore:
+    def __init__(self, blob_dir: Path):
+        self.blob_dir = blob_dir
+
+    def get_path(self, key: str) -> Path:
+        return self.blob_dir / key[:2] / f"{key}.json.zst"
+
+    def put(self, obj: Any) -> str:
+        data = json.dumps(obj, sort_keys=True).encode("utf-8")
+        key = hashlib.sha256(data).hexdigest()
+        path = self.get_path(key)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_bytes(zstandard.ZstdCompressor().compress(data))
+            tmp_path.replace(path)
+        return key
+
+    def get(self, key: str) -> Any:
+        data = zstandard.ZstdDecompressor().decompress(self.get_path(key).read_bytes())
+        return json.loads(data)
+
+
+def is_results_file(path: Path) -> bool:
+    if path.name.endswith(".run.json"):
+        return False
+    return path.suffix in (".json", ".parquet")
+
+
+def get_header_file(results_file: Path) -> Path:
+    return results_file.with_suffix(".run.json")
+
+
+def get_blob_store(results_file: Path) -> BlobStore:
+    return BlobStore(results_file.parent / "blobs")
+
+
+def to_frame(
+    results_obj: dict[str, Any], blobs: BlobStore | None = None
+) -> pl.DataFrame:
+    """
+    Flatten the evals of the results into a frame of their scalar fields,
+    storing their details in the blob store if one is given.
+    """
+    rows = []
+    for dataset_results in results_obj["results"].values():
+        for result in dataset_results["evals"]:
+            details = result.get("details", {})
+            usage = details.get("usage", {})
+            row = {
+                "dataset": result["dataset"],
+                "database": result["database"],
+                "name": result["name"],
+                "question": result.get("question"),
+                "status": result["status"],
+                "duration": result["duration"],
+                "exception_class": details.get("exception_class"),
+                **{key: usage.get(key, 0) for key in USAGE_KEYS},
+                "details_blob": None if blobs is None else blobs.put(details),
+            }
+            for phase, elapsed in details.get("timings", {}).items():
+                row[f"{TIMING_PREFIX}{phase}"] = elapsed
+            rows.append(row)
+    schema = dict(EVAL_SCHEMA)
+    for phase in sorted({x for y in rows for x in y if x.startswith(TIMING_PREFIX)}):
+        schema[phase] = pl.Float64
+    return pl.DataFrame(rows, schema=schema, orient="row")
+
+
+def write_columnar(results_obj: dict[str, Any], results_file: Path) -> None:
+    header = {
+        **{k: v for k, v in results_obj.items() if k != "results"},
+        "results": {
+            dataset: {k: v for k, v in dataset_results.items() if k != "evals"}
+            for dataset, dataset_results in results_obj["results"].items()
+        },
+    }
+    to_frame(results_obj, get_blob_store(results_file)).write_parquet(results_file)
+    with get_header_file(results_file).open("w") as fp:
+        json.dump(header, fp)
+
+
+def read_columnar(results_file: Path, with_details: bool = False) -> dict[str, Any]:
+    """
+    Read columnar results back into the structure of `results.json`. Unless
+    `with_details`, the details of the evals only hold their usage, timings
+    and exception class, rather than being read from the blob store.
+    """
+    with get_header_file(results_file).open() as fp:
+        results_obj = json.load(fp)
+    blobs = get_blob_store(results_file)
+    df = pl.read_parquet(results_file)
+    timing_columns = [x for x in df.columns if x.startswith(TIMING_PREFIX)]
+    for dataset_results in results_obj["results"].values():
+        dataset_results["evals"] = []
+    for row in df.iter_rows(named=True):
+        if with_details:
+            details = blobs.get(row["details_blob"])
+        else:
+            details = {
+                "usage": {key: row[key] for key in USAGE_KEYS},
+                "timings": {
+                    x.removeprefix(TIMING_PREFIX): row[x]
+                    for x in timing_columns
+                    if row[x] is not None
+                },
+            }
+            if row["exception_class"] is not None:
+                details["exception_class"] = row["exception_class"]
+        results_obj["results"][row["dataset"]]["evals"].append(
+            {
+                "status": row["status"],
+                "dataset": row["dataset"],
+                "database": row["database"],
+                "name": row["name"],
+                "question": row["question"],
+                "duration": row["duration"],
+                "details": details,
+            }
+        )
+    return results_obj
+
+
+def load_frame(results_file: Path) -> tuple[dict[str, Any], pl.DataFrame]:
+    """
+    Read the run of a results file, without the evals of its datasets, and a
+    frame of its evals (see `to_frame()`).
+    """
+    if results_file.suffix == ".parquet":
+        with get_header_file(results_file).open() as fp:
+            return json.load(fp), pl.read_parquet(results_file)
+    with results_file.open() as fp:
+        results_obj = json.load(fp)
+    df = to_frame(results_obj)
+    for dataset_results in results_obj["results"].values():
+        del dataset_results["evals"]
+    return results_obj, df
+
+
+def load_results(results_file: Path, with_details: bool = False) -> dict[str, Any]:
+    if results_file.suffix == ".parquet":
+        return read_columnar(results_file, with_details)
+    with results_file.open() as fp:
+        return json.load(fp)
+
+
+def collect_blobs(results_dir: Path) -> int:
+    """
+    Delete the blobs of a directory that none of its Parquet results files
+    refer to, returning the number of blobs deleted.
+    """
+    blob_dir = results_dir / "blobs"
+    if not blob_dir.exists():
+        return 0
+    referenced = set()  # type: set[str]
+    for path in results_dir.glob("*.parquet"):
+        try:
+            df = pl.read_parquet(path, columns=["details_blob"])
+        except (pl.exceptions.PolarsError, OSError):
+            # the blobs of a file that cannot be read are not known
+            return 0
+        referenced.update(df["details_blob"].drop_nulls().to_list())
+    deleted = 0
+    for path in blob_dir.glob("*/*.json.zst"):
+        if path.name.removesuffix(".json.zst") not in referenced:
+            path.unlink(missing_ok=True)
+            deleted += 1
+    return deleted
+
+
+def write_results(results_obj: dict[str, Any], results_file: Path) -> None:
+    results_file.parent.mkdir(parents=True, exist_ok=True)
+    if results_file.suffix == ".parquet":
+        write_columnar(results_obj, results_file)
+        results_file.with_suffix(".json").unlink(missing_ok=True)
+    else:
+        with results_file.open("w") as fp:
+            json.dump(results_obj, fp)
+        parquet_file = results_file.with_suffix(".parquet")
+        parquet_file.unlink(missing_ok=True)
+        get_header_file(parquet_file).unlink(missing_ok=True)
+    collect_blobs(results_file.parent)
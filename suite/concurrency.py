@@ -0,0 +1,151 @@
+"""
+Adaptive concurrency of the LLM requests of each provider.
+
+While `use_adaptive_concurrency()` is active, the agents admit each LLM request
+with `admit(provider)`, which waits until the provider has fewer requests in
+flight than its current limit. The limit of each provider is adjusted by an
+AIMD (additive increase, multiplicative decrease) controller from the outcome
+of its requests:
+
+- a request that succeeds raises the limit, by one per request while in slow
+  start (doubling the limit every round trip), and by one per round trip after
+  the first decrease
+- a request that fails with a 429, or takes more than `LATENCY_SPIKE` times
+  the average latency of the provider, cuts the limit by `DECREASE`, at most
+  once per round trip so that a burst of 429s counts as one
+
+so that each provider settles just below the rate it accepts, without tuning
+the concurrency of each model by hand. The limits stay between 1 and the
+maximum given to `use_adaptive_concurrency()`.
+"""
+
+import random
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+MIN_LIMIT = 1
+DECREASE = 0.5
+LATENCY_SPIKE = 3.0
+# weight of a request in the average latency of its provider
+LATENCY_ALPHA = 0.1
+# delay before retrying a rate limited request, doubled for every retry
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+class Controller:
+    def __init__(self, maximum: int):
+        self.condition = threading.Condition()
+        self.maximum = maximum
+        self.limit = float(MIN_LIMIT)
+        self.slow_start = True
+        self.in_flight = 0
+        self.latency = None  # type: float | None
+        self.decreased_at = None  # type: float | None
+        self.requests = 0
+        self.decreases = 0
+        self.peak = MIN_LIMIT
+
+    def acquire(self) -> None:
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, elapsed: float, status_code: int | None) -> None:
+        with self.condition:
+            self.in_flight -= 1
+            self.requests += 1
+            spike = self.latency is not None and elapsed > LATENCY_SPIKE * self.latency
+            if status_code == 429 or (status_code is None and spike):
+                self.decrease(elapsed)
+            elif status_code is None:
+                self.increase()
+            if status_code is None:
+                if self.latency is None:
+                    self.latency = elapsed
+                else:
+                    self.latency += LATENCY_ALPHA * (elapsed - self.latency)
+            self.condition.notify_all()
+
+    def increase(self) -> None:
+        step = 1.0 if self.slow_start else 1.0 / self.limit
+        self.limit = min(self.limit + step, float(self.maximum))
+        self.peak = max(self.peak, int(self.limit))
+
+    def decrease(self, elapsed: float) -> None:
+        now = time.monotonic()
+        round_trip = self.latency if self.latency is not None else elapsed
+        if self.decreased_at is not None and now - self.decreased_at < round_trip:
+            return
+        self.limit = max(self.limit * DECREASE, float(MIN_LIMIT))
+        self.slow_start = False
+        self.decreased_at = now
+        self.decreases += 1
+
+
+class Controllers:
+    def __init__(self, maximum: int):
+        self.lock = threading.Lock()
+        self.maximum = maximum
+        self.providers = {}  # type: dict[str, Controller]
+
+    def get(self, provider: str) -> Controller:
+        with self.lock:
+            if provider not in self.providers:
+                self.providers[provider] = Controller(self.maximum)
+            return self.providers[provider]
+
+
+_controllers = ContextVar("controllers", default=None)  # type: ContextVar[Controllers | None]
+
+
+@contextmanager
+def use_adaptive_concurrency(maximum: int) -> Iterator[Controllers]:
+    controllers = Controllers(maximum)
+    token = _controllers.set(controllers)
+    try:
+        yield controllers
+    finally:
+        _controllers.reset(token)
+
+
+@contextmanager
+def admit(provider: str) -> Iterator[None]:
+    """
+    Wait for the LLM request in the block to be admitted by the controller of
+    the provider, and report its outcome to it. Blocks the thread while
+    waiting, so it must not be used by requests sharing an event loop with
+    the requests they wait for. A no-op outside of
+    `use_adaptive_concurrency()`.
+    """
+    controllers = _controllers.get()
+    if controllers is None:
+        yield
+        return
+    controller = controllers.get(provider)
+    controller.acquire()
+    start = time.perf_counter()
+    status_code = None  # type: int | None
+    try:
+        yield
+    except BaseException as e:
+        # errors without a status code are not a signal of the load of the
+        # provider, so they count as neither success nor congestion
+        status_code = getattr(e, "status_code", 0)
+        raise
+    finally:
+        controller.release(time.perf_counter() - start, status_code)
+
+
+def get_backoff(attempt: int) -> float:
+    """
+    Get the delay before retrying a rate limited request for the `attempt`-th
+    time (0-based), jittered so that the retries of concurrent requests spread
+    out.
+    """
+    delay = min(BACKOFF_BASE * 2**attempt, BACKOFF_MAX)
+    return delay / 2 + random.uniform(0, delay / 2)
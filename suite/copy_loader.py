@@ -0,0 +1,343 @@
+"""
+Loader that restores a dump through psycopg instead of replaying it with psql.
+
+The dump is streamed once and its statements are split into three phases:
+
+1. schema (pre-data) statements are executed as they are read
+2. table data (COPY blocks and INSERT statements) is loaded with
+   `COPY ... FROM STDIN`, with each table being loaded on its own connection
+   so that multiple tables are loaded in parallel. The rows of COPY blocks are
+   sent as they are in the dump, without being parsed, so that every value
+   (e.g. intervals, infinite or BC dates) is loaded exactly as pg_dump wrote
+   it
+3. indexes and constraints (post-data) are created after all data is loaded,
+   in parallel where possible, followed by an `ANALYZE` of the database
+"""
+
+import queue
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import psycopg
+from psycopg.sql import SQL, Identifier
+
+from .dumps import iter_statements
+
+INSERT_REGEX = re.compile(
+    r"^INSERT INTO (?P<table>\S+?)\s*(?:\((?P<columns>[^)]*)\)\s*)?VALUES\s*",
+    flags=re.IGNORECASE,
+)
+COPY_REGEX = re.compile(
+    r"^COPY (?P<table>\S+?)\s*(?:\((?P<columns>[^)]*)\)\s*)?FROM stdin;$",
+    flags=re.IGNORECASE,
+)
+NUMBER_REGEX = re.compile(r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+# statements that can be run concurrently after the data has been loaded
+PARALLEL_POST_DATA_REGEX = re.compile(
+    r"^(CREATE (UNIQUE )?INDEX |ALTER TABLE .* ADD CONSTRAINT \S+ (PRIMARY KEY|UNIQUE) )",
+    flags=re.IGNORECASE | re.DOTALL,
+)
+POST_DATA_REGEX = re.compile(
+    r"^(CREATE (UNIQUE )?INDEX |CREATE TRIGGER |CREATE CONSTRAINT TRIGGER "
+    r"|ALTER TABLE .* ADD CONSTRAINT |ALTER TABLE .* CLUSTER ON "
+    r"|SELECT pg_catalog\.setval)",
+    flags=re.IGNORECASE | re.DOTALL,
+)
+SESSION_REGEX = re.compile(
+    r"^(SET |SELECT pg_catalog\.set_config)",
+    flags=re.IGNORECASE,
+)
+# sentinel put on a table queue once all of its rows have been queued
+END_OF_DATA = None
+QUEUE_SIZE = 10000
+
+Row = list[bytes | None]
+# a row of a COPY block, as a line of the text format, or of an INSERT
+Item = bytes | Row
+
+
+def parse_insert_values(values: str) -> list[Row] | None:
+    """
+    Parse the `(...), (...);` part of an INSERT statement into rows of fields in
+    the postgres text format. Returns None if a value is not a plain literal
+    (e.g. a function call or a cast), in which case the statement should be
+    executed as is.
+    """
+    rows = []  # type: list[Row]
+    i = 0
+    length = len(values)
+    while True:
+        while i < length and values[i].isspace():
+            i += 1
+        if i >= length or values[i] != "(":
+            return None
+        i += 1
+        row = []  # type: Row
+        while True:
+            while i < length and values[i].isspace():
+                i += 1
+            if i >= length:
+                return None
+            if values[i] == "'":
+                end = i + 1
+                parts = []
+                while True:
+                    quote = values.find("'", end)
+                    if quote == -1:
+                        return None
+                    parts.append(values[end:quote])
+                    if values.startswith("''", quote):
+                        parts.append("'")
+                        end = quote + 2
+                        continue
+                    break
+                row.append("".join(parts).encode("utf-8"))
+                i = quote + 1
+            elif values.startswith("NULL", i):
+                row.append(None)
+                i += 4
+            elif values.startswith("true", i):
+                row.append(b"t")
+                i += 4
+            elif values.startswith("false", i):
+                row.append(b"f")
+                i += 5
+            else:
+                match = NUMBER_REGEX.match(values, i)
+                if match is None:
+                    return None
+                row.append(match.group(0).encode("utf-8"))
+                i = match.end()
+            while i < length and values[i].isspace():
+                i += 1
+            if i >= length:
+                return None
+            if values[i] == ",":
+                i += 1
+                continue
+            if values[i] == ")":
+                i += 1
+                break
+            return None
+        rows.append(row)
+        while i < length and values[i].isspace():
+            i += 1
+        if i < length and values[i] == ",":
+            i += 1
+            continue
+        if values[i:].strip() == ";":
+            return rows
+        return None
+
+
+def split_identifier(identifier: str) -> list[str]:
+    """
+    Split a (possibly schema qualified and quoted) identifier into its parts,
+    folding unquoted parts to lowercase like postgres does.
+    """
+    parts = []
+    for part in re.findall(r'"(?:[^"]|"")*"|[^.]+', identifier.strip()):
+        if part.startswith('"'):
+            parts.append(part[1:-1].replace('""', '"'))
+        else:
+            parts.append(part.lower())
+    return parts
+
+
+def split_columns(columns: str | None) -> list[str] | None:
+    if columns is None:
+        return None
+    return [
+        split_identifier(x)[0] for x in re.findall(r'"(?:[^"]|"")*"|[^,\s]+', columns)
+    ]
+
+
+def copy_table(
+    db_url: str,
+    settings: list[str],
+    table: str,
+    columns: list[str] | None,
+    rows: "queue.Queue[Item | None]",
+) -> int:
+    """
+    Load the rows of a table from the queue with a text COPY, returning the
+    number of loaded rows.
+    """
+    loaded = 0
+    with psycopg.connect(db_url) as conn:
+        for setting in settings:
+            conn.execute(setting)
+        query = SQL("COPY {}{} FROM STDIN").format(
+            SQL(".").join(Identifier(x) for x in split_identifier(table)),
+            SQL("")
+            if columns is None
+            else SQL(" ({})").format(SQL(", ").join(Identifier(x) for x in columns)),
+        )
+        with conn.cursor() as cur, cur.copy(query) as copy:
+            while True:
+                row = rows.get()
+                if row is END_OF_DATA:
+                    break
+                if isinstance(row, bytes):
+                    copy.write(row if row.endswith(b"\n") else row + b"\n")
+                else:
+                    copy.write_row(
+                        [None if value is None else value.decode() for value in row]
+                    )
+                loaded += 1
+    return loaded
+
+
+class TableLoader:
+    """
+    Dispatches the data of the dump to per table COPY workers. The data for a
+    table is usually contiguous in a dump, so each contiguous run of rows for a
+    table is loaded by one worker, and other workers can continue loading the
+    previous tables in the meantime.
+    """
+
+    def __init__(self, db_url: str, settings: list[str], jobs: int):
+        self.db_url = db_url
+        self.settings = settings
+        self.executor = ThreadPoolExecutor(max_workers=max(1, jobs))
+        self.futures: list[Future[int]] = []
+        self.key = None  # type: tuple[str, str | None] | None
+        self.rows = None  # type: queue.Queue[Item | None] | None
+
+    def start(self, table: str, columns: str | None) -> None:
+        if self.key == (table, columns):
+            return
+        self.end()
+        self.key = (table, columns)
+        self.rows = queue.Queue(maxsize=QUEUE_SIZE)
+        self.futures.append(
+            self.executor.submit(
+                copy_table,
+                self.db_url,
+                self.settings,
+                table,
+                split_columns(columns),
+                self.rows,
+            )
+        )
+
+    def put(self, row: Item) -> None:
+        while True:
+            try:
+                self.rows.put(row, timeout=1)
+                return
+            except queue.Full:
+                # surface errors of a failed worker instead of waiting forever
+                if self.futures[-1].done():
+                    self.futures[-1].result()
+
+    def end(self) -> None:
+        if self.rows is not None:
+            self.put(END_OF_DATA)
+        self.key = None
+        self.rows = None
+
+    def abort(self) -> None:
+        """
+        Stop the workers after an error, without raising their own errors, so
+        that the original error is not hidden.
+        """
+        if self.rows is not None:
+            while not self.futures[-1].done():
+                try:
+                    self.rows.put(END_OF_DATA, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+        self.key = None
+        self.rows = None
+        self.executor.shutdown(cancel_futures=True)
+
+    def wait(self) -> int:
+        self.end()
+        loaded = sum(future.result() for future in self.futures)
+        self.executor.shutdown()
+        return loaded
+
+
+def execute(conn: psycopg.Connection, statement: str) -> None:
+    """
+    Execute a statement, reporting but ignoring errors like psql does.
+    """
+    try:
+        conn.execute(statement)
+    except psycopg.DatabaseError as e:
+        print(f"        ERROR: {str(e).strip()}")
+
+
+def run_parallel(db_url: str, settings: list[str], statements: list[str], jobs: int):
+    def run(statement: str) -> None:
+        with psycopg.connect(db_url, autocommit=True) as conn:
+            for setting in settings:
+                conn.execute(setting)
+            execute(conn, statement)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for future in [executor.submit(run, x) for x in statements]:
+            future.result()
+
+
+def load_dump(db_url: str, paths: list[Path], jobs: int) -> int:
+    """
+    Load the dump files into the database, returning the number of loaded rows.
+    """
+    settings = []  # type: list[str]
+    post_data = []  # type: list[str]
+    with psycopg.connect(db_url, autocommit=True) as conn:
+        loader = TableLoader(db_url, settings, jobs)
+        try:
+            for statement, copy_rows in iter_statements(paths):
+                if copy_rows is not None:
+                    match = COPY_REGEX.match(statement)
+                    if match is None:
+                        raise ValueError(f"Invalid COPY statement: {statement}")
+                    # not mixed with the rows of INSERT statements, which are
+                    # buffered by psycopg
+                    loader.end()
+                    loader.start(match.group("table"), match.group("columns"))
+                    for line in copy_rows:
+                        loader.put(line)
+                    loader.end()
+                    continue
+                match = INSERT_REGEX.match(statement)
+                if match is not None:
+                    rows = parse_insert_values(statement[match.end() :])
+                    if rows is None:
+                        execute(conn, statement)
+                        continue
+                    loader.start(match.group("table"), match.group("columns"))
+                    for row in rows:
+                        loader.put(row)
+                    continue
+                loader.end()
+                if SESSION_REGEX.match(statement):
+                    settings.append(statement)
+                    execute(conn, statement)
+                elif POST_DATA_REGEX.match(statement):
+                    post_data.append(statement)
+                else:
+                    execute(conn, statement)
+        except BaseException:
+            loader.abort()
+            raise
+        loaded = loader.wait()
+
+        print("      Creating indexes and constraints")
+        run_parallel(
+            db_url,
+            settings,
+            [x for x in post_data if PARALLEL_POST_DATA_REGEX.match(x)],
+            jobs,
+        )
+        for statement in post_data:
+            if not PARALLEL_POST_DATA_REGEX.match(statement):
+                execute(conn, statement)
+        print("      Analyzing")
+        conn.execute("ANALYZE")
+    return loaded
@@ -0,0 +1,113 @@
+"""
+Gating of generated queries by their estimated cost, so that queries that are
+obviously catastrophic (e.g. a cross join of large tables) fail in
+milliseconds instead of running until their timeout.
+
+Within `use_cost_gate()`, generated queries are planned with `EXPLAIN` before
+they are executed, and fail if the total cost or the number of rows estimated
+by the planner is more than `multiple` times that of the gold query of the
+eval. The plans of the gold queries are cached for the run. As planner
+estimates are rough, the costs and rows of the gold query are given a floor,
+so that a generated query is not failed for being somewhat slower than a
+trivial gold query.
+"""
+
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TypedDict
+
+import psycopg
+
+# floors of the gold plan, below which estimates are not compared
+MIN_COST = 1000.0
+MIN_ROWS = 10000.0
+
+
+class Plan(TypedDict):
+    cost: float
+    rows: float
+
+
+class CostCheck(TypedDict):
+    plan: Plan
+    gold_plan: Plan
+
+
+class CostExceededError(Exception):
+    pass
+
+
+class CostGate:
+    def __init__(self, multiple: float):
+        self.multiple = multiple
+        self.lock = threading.Lock()
+        self.gold_plans = {}  # type: dict[tuple[str, int, str, str], Plan]
+        self.checked = 0
+        self.gated = 0
+
+    def count(self, gated: bool) -> None:
+        with self.lock:
+            self.checked += 1
+            if gated:
+                self.gated += 1
+
+    def get_gold_plan(self, gold_query: str, conn: psycopg.Connection) -> Plan:
+        key = (conn.info.host, conn.info.port, conn.info.dbname, gold_query)
+        with self.lock:
+            if key in self.gold_plans:
+                return self.gold_plans[key]
+        plan = explain(gold_query, conn)
+        with self.lock:
+            self.gold_plans[key] = plan
+        return plan
+
+
+_cost_gate = ContextVar("cost_gate", default=None)  # type: ContextVar[CostGate | None]
+
+
+@contextmanager
+def use_cost_gate(multiple: float) -> Iterator[CostGate]:
+    gate = CostGate(multiple)
+    token = _cost_gate.set(gate)
+    try:
+        yield gate
+    finally:
+        _cost_gate.reset(token)
+
+
+def explain(query: str, conn: psycopg.Connection) -> Plan:
+    """
+    Get the total cost and rows of the plan of a query, without executing it.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"EXPLAIN (FORMAT JSON) {query.strip().rstrip(';').rstrip()}")
+        plan = cur.fetchone()[0][0]["Plan"]
+    return {"cost": float(plan["Total Cost"]), "rows": float(plan["Plan Rows"])}
+
+
+def check_cost(
+    query: str, gold_query: str, conn: psycopg.Connection
+) -> CostCheck | None:
+    """
+    Check the estimated cost of a generated query against its gold query if
+    the cost gate is active, raising a `CostExceededError` if it is more than
+    the multiple of the gate. Returns None if the gate is not active.
+    """
+    gate = _cost_gate.get()
+    if gate is None:
+        return None
+    gold_plan = gate.get_gold_plan(gold_query, conn)
+    plan = explain(query, conn)
+    max_cost = gate.multiple * max(gold_plan["cost"], MIN_COST)
+    max_rows = gate.multiple * max(gold_plan["rows"], MIN_ROWS)
+    gated = plan["cost"] > max_cost or plan["rows"] > max_rows
+    gate.count(gated)
+    if gated:
+        raise CostExceededError(
+            f"Estimated cost {plan['cost']:.0f} and rows {plan['rows']:.0f} exceed"
+            f" {gate.multiple:g} times those of the gold query"
+            f" ({gold_plan['cost']:.0f} and {gold_plan['rows']:.0f})"
+        )
+    return {"plan": plan, "gold_plan": gold_plan}
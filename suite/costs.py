@@ -0,0 +1,137 @@
+"""
+Cost accounting of the tokens used by a run.
+
+The pricing of a model is resolved once per run (see `get_pricing()`), first
+from `pricing.json` at the root of the repository, which can add models that
+tokencost does not know about or override its prices, and then from tokencost,
+by the name of the model and then by `provider/model`. The entries of
+`pricing.json` use the fields of tokencost:
+
+    {
+        "ollama/llama3.3": {
+            "input_cost_per_token": 0.0,
+            "output_cost_per_token": 0.0,
+            "cache_read_input_token_cost": 0.0
+        }
+    }
+
+The evals only record their token counts, and the costs of all the evals of a
+dataset are computed at once when the results are aggregated (see
+`price_evals()`). The calls of the LLM judge and the embeddings of `setup` are
+priced the same way (see `price_usage()`).
+"""
+
+import json
+from functools import cache
+from pathlib import Path
+from typing import Any, TypedDict
+
+import polars as pl
+from tokencost import TOKEN_COSTS
+
+PRICING_FILE = Path(__file__).resolve().parent.parent / "pricing.json"
+
+TOKEN_KEYS = ["cached_tokens", "request_tokens", "response_tokens"]
+
+# fields of the tokencost table for each kind of token
+TOKEN_FIELDS = {
+    "cached_tokens": "cache_read_input_token_cost",
+    "request_tokens": "input_cost_per_token",
+    "response_tokens": "output_cost_per_token",
+}
+
+
+class Usage(TypedDict):
+    cached_tokens: int
+    cached_tokens_cost: float
+    request_tokens: int
+    request_tokens_cost: float
+    response_tokens: int
+    response_tokens_cost: float
+
+
+# token key -> cost per token
+Pricing = dict[str, float]
+
+
+def new_usage() -> Usage:
+    return {
+        "cached_tokens": 0,
+        "cached_tokens_cost": 0.0,
+        "request_tokens": 0,
+        "request_tokens_cost": 0.0,
+        "response_tokens": 0,
+        "response_tokens_cost": 0.0,
+    }
+
+
+def load_overrides() -> dict[str, dict[str, Any]]:
+    if not PRICING_FILE.exists():
+        return {}
+    with PRICING_FILE.open() as fp:
+        return {k.lower(): v for k, v in json.load(fp).items()}
+
+
+@cache
+def get_pricing(provider: str, model: str) -> Pricing | None:
+    """
+    Get the cost per token of each kind of token of the model, or None if
+    neither `pricing.json` nor tokencost know the model. Kinds of tokens that
+    the model has no price for are free.
+    """
+    names = [model.lower(), f"{provider}/{model}".lower()]
+    for table in [load_overrides(), TOKEN_COSTS]:
+        for name in names:
+            if name in table:
+                return {
+                    key: float(table[name].get(field, 0.0) or 0.0)
+                    for key, field in TOKEN_FIELDS.items()
+                }
+    return None
+
+
+def get_cost(usage: dict[str, Any], pricing: Pricing | None) -> float:
+    if pricing is None:
+        return 0.0
+    return sum(usage.get(key, 0) * pricing[key] for key in TOKEN_KEYS)
+
+
+def get_usage_cost(usage: dict[str, Any]) -> float:
+    return sum(usage.get(f"{key}_cost", 0.0) for key in TOKEN_KEYS)
+
+
+def price_usage(usage: dict[str, Any], pricing: Pricing | None) -> Usage:
+    priced = new_usage()
+    for key in TOKEN_KEYS:
+        priced[key] = usage.get(key, 0)
+        if pricing is not None:
+            priced[f"{key}_cost"] = priced[key] * pricing[key]
+    return priced
+
+
+def add_usage(total: Usage, usage: dict[str, Any]) -> None:
+    for key in total:
+        total[key] += usage.get(key, 0)
+
+
+def price_evals(evals: list[dict[str, Any]], pricing: Pricing | None) -> Usage:
+    """
+    Set the costs of the usage of the evals from their token counts, and
+    return their total usage.
+    """
+    usages = [x["details"]["usage"] for x in evals if "usage" in x["details"]]
+    if len(usages) == 0:
+        return new_usage()
+    tokens = pl.DataFrame(
+        [[x.get(key, 0) for key in TOKEN_KEYS] for x in usages],
+        schema={key: pl.Int64 for key in TOKEN_KEYS},
+        orient="row",
+    )
+    costs = tokens.select(
+        (pl.col(key) * (0.0 if pricing is None else pricing[key])).alias(f"{key}_cost")
+        for key in TOKEN_KEYS
+    )
+    for usage, row in zip(usages, costs.iter_rows(named=True), strict=True):
+        usage.update(row)
+    totals = pl.concat([tokens, costs], how="horizontal").sum().row(0, named=True)
+    return {key: totals[key] for key in new_usage()}
@@ -0,0 +1,129 @@
+import gzip
+import io
+import re
+import shutil
+import subprocess
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+import zstandard
+
+BUFFER_SIZE = 1024 * 1024
+DUMP_REGEX = re.compile(
+    r"^(?P<name>.+?)(?:\.part(?P<part>\d{3}))?(?P<suffix>\.sql(?:\.gz|\.zst)?)$"
+)
+COPY_END = b"\\.\n"
+DOLLAR_QUOTE_REGEX = re.compile(rb"\$[A-Za-z_]*\$")
+
+
+def list_databases(databases_dir: Path) -> dict[str, list[Path]]:
+    """
+    List the databases of a dataset, mapping each database name to the ordered
+    list of dump files that need to be restored for it.
+
+    A database is either a single `<name>.sql` file, or a sequence of part files
+    `<name>.part000.sql`, `<name>.part001.sql`, ..., optionally compressed with
+    gzip (`.sql.gz`) or zstd (`.sql.zst`).
+    """
+    databases = {}  # type: dict[str, list[Path]]
+    if not databases_dir.is_dir():
+        return databases
+    for entry in sorted(databases_dir.iterdir()):
+        match = DUMP_REGEX.match(entry.name)
+        if match is None or not entry.is_file():
+            continue
+        name = match.group("name")
+        if match.group("part") is None:
+            databases[name] = [entry]
+            continue
+        if match.group("part") != "000":
+            continue
+        parts = []
+        i = 0
+        while True:
+            part = databases_dir / f"{name}.part{i:03}{match.group('suffix')}"
+            if not part.exists():
+                break
+            parts.append(part)
+            i += 1
+        databases[name] = parts
+    return databases
+
+
+def open_dump(path: Path) -> BinaryIO:
+    """
+    Open a dump file for reading, decompressing it on the fly if needed.
+    """
+    if path.name.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.name.endswith(".zst"):
+        fp = path.open("rb", buffering=BUFFER_SIZE)
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(fp, closefd=True), BUFFER_SIZE
+        )
+    return path.open("rb", buffering=BUFFER_SIZE)
+
+
+def restore_dump(db_url: str, paths: list[Path]) -> None:
+    """
+    Restore the dump files into the database by streaming them, in order, to the
+    stdin of a single psql process, so that compressed dumps never have to be
+    decompressed to disk.
+    """
+    proc = subprocess.Popen(["psql", "-q", db_url, "-f", "-"], stdin=subprocess.PIPE)
+    try:
+        for path in paths:
+            with open_dump(path) as fp:
+                shutil.copyfileobj(fp, proc.stdin, BUFFER_SIZE)
+    finally:
+        proc.stdin.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, proc.args)
+
+
+def iter_statements(
+    paths: list[Path],
+) -> Iterator[tuple[str, Iterator[bytes] | None]]:
+    """
+    Iterate over the statements of the dump files, without comments and blank
+    lines. Each statement is yielded along with, for `COPY ... FROM stdin`
+    statements, an iterator over the raw lines of its data. The data iterator
+    must be consumed before advancing to the next statement, otherwise the
+    remaining data is skipped.
+    """
+    statement = []  # type: list[bytes]
+    in_string = False
+    in_dollar = False
+
+    def iter_copy(lines: Iterator[bytes]) -> Iterator[bytes]:
+        for line in lines:
+            if line.startswith(COPY_END.rstrip()):
+                return
+            yield line
+
+    for path in paths:
+        with open_dump(path) as fp:
+            lines = iter(fp)
+            for line in lines:
+                if not statement and not in_string and not in_dollar:
+                    if line.strip() == b"" or line.startswith(b"--"):
+                        continue
+                statement.append(line)
+                if not in_dollar and line.count(b"'") % 2 == 1:
+                    in_string = not in_string
+                if not in_string and len(DOLLAR_QUOTE_REGEX.findall(line)) % 2 == 1:
+                    in_dollar = not in_dollar
+                if in_string or in_dollar or not line.rstrip().endswith(b";"):
+                    continue
+                text = b"".join(statement).decode("utf-8").strip()
+                statement = []
+                if text.startswith("COPY ") and text.endswith("FROM stdin;"):
+                    rows = iter_copy(lines)
+                    yield text, rows
+                    for _ in rows:
+                        pass
+                else:
+                    yield text, None
+    if statement and b"".join(statement).strip():
+        raise ValueError("The dump ended in the middle of a statement")
@@ -0,0 +1,284 @@
+"""
+Timeouts and hedging of the LLM requests of the agents and the judge, to bound
+the tail latency of a run.
+
+While a `RequestPolicy` is active (see `use_request_policy()`), the requests
+made with `make_request()` (or `make_request_sync()` for blocking clients)
+fail with a `RequestTimeoutError` after the timeout of the policy. With hedging, a request
+that takes longer than the p95 latency of the previous requests to the same
+model is sent a second time, and whichever copy answers first is used. The
+copy that loses is cancelled, but the provider still bills for it, so the
+agents count the usage of a hedged request once per copy (see the number of
+copies returned by `make_request()`), as an estimate of what was billed.
+
+Blocking calls cannot be cancelled, so the copies of `make_request_sync()`
+that time out or lose keep running in their threads. Agents bound them by
+passing the timeout of the policy (see `get_request_timeout()`) to their
+client, and only hedge calls that share no state between the copies.
+
+The policy is configured per agent (and for the `judge`) with the
+`--request-timeout` and `--hedge` options of `eval`.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+import click
+
+from .stats import percentile
+from .tracing import set_attributes
+
+T = TypeVar("T")
+
+DEFAULT_TIMEOUT = 300.0
+# latencies kept per model for the hedging delay
+LATENCY_SAMPLES = 200
+# requests to a model before its p95 latency is trusted for hedging
+MIN_SAMPLES = 20
+HEDGE_PERCENTILE = 95
+
+
+class RequestTimeoutError(TimeoutError):
+    pass
+
+
+class Latencies:
+    """
+    Recent latencies of the successful requests, by model, shared by the
+    policies of a run.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.models = {}  # type: dict[str, deque[float]]
+
+    def add(self, key: str, elapsed: float) -> None:
+        with self.lock:
+            if key not in self.models:
+                self.models[key] = deque(maxlen=LATENCY_SAMPLES)
+            self.models[key].append(elapsed)
+
+    def get_percentile(self, key: str, pct: float) -> float | None:
+        with self.lock:
+            latencies = list(self.models.get(key, []))
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return percentile(latencies, pct)
+
+
+class RequestPolicy:
+    def __init__(self, timeout: float | None, hedge: bool, latencies: Latencies):
+        self.timeout = timeout
+        self.hedge = hedge
+        self.latencies = latencies
+        self.lock = threading.Lock()
+        self.timeouts = 0
+        self.hedged = 0
+        self.hedges_won = 0
+
+    def get_hedge_delay(self, key: str) -> float | None:
+        if not self.hedge:
+            return None
+        return self.latencies.get_percentile(key, HEDGE_PERCENTILE)
+
+    def record(self, key: str, elapsed: float, copies: int, hedge_won: bool) -> None:
+        self.latencies.add(key, elapsed)
+        with self.lock:
+            self.hedged += copies - 1
+            self.hedges_won += int(hedge_won)
+
+
+_policy = ContextVar("request_policy", default=None)  # type: ContextVar[RequestPolicy | None]
+
+
+@contextmanager
+def use_request_policy(policy: RequestPolicy) -> Iterator[RequestPolicy]:
+    token = _policy.set(policy)
+    try:
+        yield policy
+    finally:
+        _policy.reset(token)
+
+
+def get_request_timeout() -> float | None:
+    """
+    Get the timeout of the current policy, for the clients of blocking calls.
+    """
+    policy = _policy.get()
+    return None if policy is None else policy.timeout
+
+
+def get_remaining(deadline: float | None) -> float | None:
+    if deadline is None:
+        return None
+    return max(deadline - time.perf_counter(), 0.0)
+
+
+def on_timeout(policy: RequestPolicy, key: str) -> RequestTimeoutError:
+    with policy.lock:
+        policy.timeouts += 1
+    return RequestTimeoutError(
+        f"Request to {key} did not finish within {policy.timeout} seconds"
+    )
+
+
+async def make_request(key: str, fn: Callable[[], Awaitable[T]]) -> tuple[T, int]:
+    """
+    Make the request `fn` to the model `key` under the current policy,
+    returning its result and the number of copies of it that were sent.
+    """
+    policy = _policy.get()
+    if policy is None:
+        return await fn(), 1
+    start = time.perf_counter()
+    deadline = None if policy.timeout is None else start + policy.timeout
+    delay = policy.get_hedge_delay(key)
+    tasks = [asyncio.ensure_future(fn())]
+    try:
+        if delay is not None:
+            remaining = get_remaining(deadline)
+            await asyncio.wait(
+                tasks, timeout=delay if remaining is None else min(delay, remaining)
+            )
+            if not tasks[0].done() and get_remaining(deadline) != 0:
+                tasks.append(asyncio.ensure_future(fn()))
+        error = None  # type: BaseException | None
+        pending = set(tasks)
+        while len(pending) > 0:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=get_remaining(deadline),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if len(done) == 0:
+                raise on_timeout(policy, key)
+            for task in tasks:
+                if task not in done:
+                    continue
+                if task.exception() is None:
+                    policy.record(
+                        key,
+                        time.perf_counter() - start,
+                        len(tasks),
+                        task is not tasks[0],
+                    )
+                    set_attributes({"gen_ai.request.copies": len(tasks)})
+                    return task.result(), len(tasks)
+                error = error or task.exception()
+        # every copy failed
+        assert error is not None
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def make_request_sync(
+    key: str, fn: Callable[[], T], hedge: bool = True
+) -> tuple[T, int]:
+    """
+    Like `make_request()`, for blocking clients. The copies are run in
+    threads, and a copy that times out or loses is left to finish in the
+    background, as blocking calls cannot be cancelled. Calls whose copies
+    would share state (e.g. a connection) must not be hedged.
+    """
+    policy = _policy.get()
+    if policy is None:
+        return fn(), 1
+    start = time.perf_counter()
+    deadline = None if policy.timeout is None else start + policy.timeout
+    delay = policy.get_hedge_delay(key) if hedge else None
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+    def submit() -> concurrent.futures.Future[Any]:
+        # the copies see the context of the caller, e.g. its timings
+        return executor.submit(contextvars.copy_context().run, fn)
+
+    futures = [submit()]
+    try:
+        if delay is not None:
+            remaining = get_remaining(deadline)
+            concurrent.futures.wait(
+                futures, timeout=delay if remaining is None else min(delay, remaining)
+            )
+            if not futures[0].done() and get_remaining(deadline) != 0:
+                futures.append(submit())
+        error = None  # type: BaseException | None
+        pending = set(futures)
+        while len(pending) > 0:
+            done, pending = concurrent.futures.wait(
+                pending,
+                timeout=get_remaining(deadline),
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            if len(done) == 0:
+                raise on_timeout(policy, key)
+            for future in futures:
+                if future not in done:
+                    continue
+                if future.exception() is None:
+                    policy.record(
+                        key,
+                        time.perf_counter() - start,
+                        len(futures),
+                        future is not futures[0],
+                    )
+                    set_attributes({"gen_ai.request.copies": len(futures)})
+                    return future.result(), len(futures)
+                error = error or future.exception()
+        assert error is not None
+        raise error
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PerAgentParamType(click.ParamType):
+    """
+    A value for all agents (e.g. `120`), or values by agent, with `judge` for
+    the LLM judge (e.g. `pgai=120,vanna=300,judge=60`).
+    """
+
+    name = "VALUE|AGENT=VALUE,..."
+
+    def __init__(self, convert: Callable[[str], Any]):
+        self.convert_value = convert
+
+    def convert(self, value: Any, param: Any, ctx: Any) -> dict[str, Any]:
+        if isinstance(value, dict):
+            return value
+        values = {}  # type: dict[str, Any]
+        try:
+            for part in value.split(","):
+                agent, _, agent_value = part.strip().rpartition("=")
+                values[agent.strip() or "*"] = self.convert_value(agent_value.strip())
+        except ValueError:
+            self.fail(f"{value!r} is not a value or a list of agent=value")
+        return values
+
+
+def parse_timeout(value: str) -> float | None:
+    timeout = float(value)
+    if timeout < 0:
+        raise ValueError(f"Invalid timeout: {value}")
+    # 0 disables the timeout
+    return timeout or None
+
+
+def parse_hedge(value: str) -> bool:
+    if value.lower() in ["true", "yes", "1", "on"]:
+        return True
+    if value.lower() in ["false", "no", "0", "off"]:
+        return False
+    raise ValueError(f"Invalid hedge: {value}")
+
+
+def get_agent_value(values: dict[str, Any], agent: str, default: Any) -> Any:
+    return values.get(agent, values.get("*", default))
@@ -0,0 +1,143 @@
+"""
+Historical per eval statistics (duration, tokens, cost, gold query time) of
+previous eval runs, grouped by the agent and model they were run with.
+
+They are used to schedule the evals that are expected to take the longest
+first, and to project the cost of the evals that are still to be run against
+a budget. The history is kept in `results/history/evals.json`, and is seeded
+from the results files of previous runs when it does not exist yet.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, TypedDict
+
+from .columnar import is_results_file, load_results
+from .costs import get_usage_cost
+
+# weight of a new run is at least 1/MAX_RUNS, so that the stats follow changes
+MAX_RUNS = 5
+
+
+class EvalStats(TypedDict):
+    runs: int
+    duration: float
+    gold_query: float
+    tokens: float
+    cost: float
+
+
+# config key (agent/provider:model) -> eval key (dataset/name) -> stats
+History = dict[str, dict[str, EvalStats]]
+
+EMPTY_STATS = {
+    "runs": 0,
+    "duration": 0.0,
+    "gold_query": 0.0,
+    "tokens": 0.0,
+    "cost": 0.0,
+}  # type: EvalStats
+
+
+def get_config_key(agent: str, provider: str, model: str) -> str:
+    return f"{agent}/{provider}:{model}"
+
+
+def get_eval_key(dataset: str, name: str) -> str:
+    return f"{dataset}/{name}"
+
+
+def get_eval_cost(result: dict[str, Any]) -> float:
+    return get_usage_cost(result.get("details", {}).get("usage", {}))
+
+
+def update_history(history: History, config_key: str, results: dict[str, Any]) -> None:
+    """
+    Fold the evals of the `results` of a run into the history.
+    """
+    config = history.setdefault(config_key, {})
+    for dataset, dataset_results in results.items():
+        for result in dataset_results["evals"]:
+            key = get_eval_key(dataset, result["name"])
+            stats = config.get(key, EMPTY_STATS)
+            details = result.get("details", {})
+            usage = details.get("usage", {})
+            values = {
+                "duration": result["duration"],
+                "gold_query": details.get("timings", {}).get("gold_query", 0.0),
+                "tokens": usage.get("request_tokens", 0)
+                + usage.get("response_tokens", 0),
+                "cost": get_eval_cost(result),
+            }
+            weight = 1 / min(stats["runs"] + 1, MAX_RUNS)
+            config[key] = {
+                "runs": stats["runs"] + 1,
+                **{
+                    name: round(stats[name] + (value - stats[name]) * weight, 6)
+                    for name, value in values.items()
+                },
+            }
+
+
+def load_history(results_dir: Path) -> History:
+    history_file = results_dir / "history" / "evals.json"
+    if history_file.exists():
+        with history_file.open() as fp:
+            return json.load(fp)
+    history = {}  # type: History
+    if not results_dir.is_dir():
+        return history
+    for results_file in sorted(results_dir.iterdir()):
+        if not results_file.is_file() or not is_results_file(results_file):
+            continue
+        try:
+            results = load_results(results_file)
+            details = results["details"]
+            config_key = get_config_key(
+                details["agent"]["name"], details["provider"], details["model"]
+            )
+            update_history(history, config_key, results["results"])
+        except (json.JSONDecodeError, KeyError, TypeError):
+            continue
+    return history
+
+
+def save_history(results_dir: Path, history: History) -> None:
+    history_file = results_dir / "history" / "evals.json"
+    history_file.parent.mkdir(parents=True, exist_ok=True)
+    with history_file.open("w") as fp:
+        json.dump(history, fp, indent=2, sort_keys=True)
+
+
+def get_expected_stats(
+    history: History, config_key: str, eval_keys: list[str]
+) -> dict[str, EvalStats]:
+    """
+    Get the expected stats of the evals for the given config. Evals without
+    history for the config use their history with other configs if there is
+    any, and otherwise the mean of the evals with history for the config.
+    """
+    config = history.get(config_key, {})
+    mean = dict(EMPTY_STATS)  # type: EvalStats
+    if len(config) > 0:
+        for name in ["duration", "gold_query", "tokens", "cost"]:
+            mean[name] = sum(x[name] for x in config.values()) / len(config)
+    expected = {}
+    for key in eval_keys:
+        if key in config:
+            expected[key] = config[key]
+            continue
+        others = [x[key] for x in history.values() if key in x]
+        if len(others) == 0:
+            expected[key] = mean
+            continue
+        # durations and tokens of other models are a rough guide at best, so
+        # only use them for the ordering, and not for the projected cost
+        expected[key] = {
+            "runs": 0,
+            "duration": sum(x["duration"] for x in others) / len(others),
+            "gold_query": sum(x["gold_query"] for x in others) / len(others),
+            "tokens": sum(x["tokens"] for x in others) / len(others),
+            "cost": mean["cost"],
+        }
+    return expected
@@ -0,0 +1,350 @@
+"""
+Index advisor for the dataset databases.
+
+Replays the gold queries of a database, extracts the columns used in their
+filter predicates and join keys, and proposes secondary indexes for the columns
+that are not yet covered by an index, weighted by how long the queries that use
+them take to run.
+"""
+
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+from typing import Literal, TypedDict
+
+import psycopg
+import sqlglot
+from psycopg.sql import SQL, Identifier
+from sqlglot import exp
+from sqlglot.optimizer.scope import traverse_scope
+
+TableName = tuple[str, str]
+Schema = dict[TableName, set[str]]
+CandidateKind = Literal["filter", "join"]
+
+INDEX_STATEMENT_REGEX = re.compile(
+    r"^CREATE INDEX IF NOT EXISTS (\S+) ON", flags=re.IGNORECASE
+)
+
+PREDICATE_TYPES = (
+    exp.EQ,
+    exp.GT,
+    exp.GTE,
+    exp.LT,
+    exp.LTE,
+    exp.In,
+    exp.Between,
+)
+
+
+class IndexCandidate(TypedDict):
+    schema: str
+    table: str
+    column: str
+    kind: CandidateKind
+
+
+class QueryStats(TypedDict):
+    name: str
+    calls: int
+    total_exec_time: float
+    mean_exec_time: float
+    error: str
+    candidates: list[IndexCandidate]
+
+
+class IndexProposal(TypedDict):
+    schema: str
+    table: str
+    column: str
+    name: str
+    statement: str
+    kinds: list[CandidateKind]
+    queries: int
+    score: float
+
+
+def _normalize(identifier: exp.Identifier | None) -> str:
+    if identifier is None:
+        return ""
+    return identifier.name if identifier.quoted else identifier.name.lower()
+
+
+def _resolve_table(table: exp.Table, schema: Schema) -> TableName | None:
+    name = _normalize(table.this)
+    db = _normalize(table.args.get("db"))
+    if db:
+        return (db, name) if (db, name) in schema else None
+    matches = sorted(key for key in schema if key[1] == name)
+    if len(matches) == 0:
+        return None
+    for match in matches:
+        if match[0] == "public":
+            return match
+    return matches[0]
+
+
+def extract_index_candidates(query: str, schema: Schema) -> list[IndexCandidate]:
+    """
+    Extract the columns that are used in filter predicates (WHERE) or join keys
+    (JOIN ... ON) of the query, resolved against the tables in the schema.
+
+    Only columns that are directly compared (e.g. `col = 1` or `a.id = b.a_id`)
+    are considered, as wrapping a column in a function (e.g. `SUBSTR(col, 1, 4)`)
+    prevents a plain index from being used.
+    """
+    try:
+        ast = sqlglot.parse_one(query, read="postgres")
+    except sqlglot.errors.ParseError:
+        return []
+
+    candidates = {}  # type: dict[tuple[str, str, str], set[CandidateKind]]
+    for scope in traverse_scope(ast):
+        tables = {}  # type: dict[str, TableName]
+        for alias, source in scope.sources.items():
+            if not isinstance(source, exp.Table):
+                continue
+            resolved = _resolve_table(source, schema)
+            if resolved is not None:
+                tables[alias.lower()] = resolved
+
+        for column in scope.columns:
+            if not isinstance(column.parent, PREDICATE_TYPES):
+                continue
+            ancestor = column.find_ancestor(exp.Where, exp.Join, exp.Select)
+            if isinstance(ancestor, exp.Where):
+                kind = "filter"
+            elif isinstance(ancestor, exp.Join):
+                kind = "join"
+            else:
+                continue
+            name = _normalize(column.this)
+            if column.table:
+                table = tables.get(column.table.lower())
+            else:
+                matches = [x for x in set(tables.values()) if name in schema[x]]
+                table = matches[0] if len(matches) == 1 else None
+            if table is None or name not in schema[table]:
+                continue
+            key = (table[0], table[1], name)
+            if key not in candidates:
+                candidates[key] = set()
+            candidates[key].add(kind)
+
+    return [
+        {"schema": key[0], "table": key[1], "column": key[2], "kind": kind}
+        for key in sorted(candidates)
+        for kind in sorted(candidates[key])
+    ]
+
+
+def get_schema(conn: psycopg.Connection) -> Schema:
+    schema = {}  # type: Schema
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT table_schema, table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema NOT IN ('information_schema', 'pg_catalog', 'text2sql')
+            AND table_schema NOT LIKE 'pg_toast%%'
+        """)
+        for table_schema, table_name, column_name in cur.fetchall():
+            key = (table_schema, table_name)
+            if key not in schema:
+                schema[key] = set()
+            schema[key].add(column_name)
+    return schema
+
+
+def get_indexed_columns(conn: psycopg.Connection) -> set[tuple[str, str, str]]:
+    """
+    Get the columns that are the leading column of an existing index.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT n.nspname, c.relname, a.attname
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        """)
+        return {(row[0], row[1], row[2]) for row in cur.fetchall()}
+
+
+def get_table_rows(conn: psycopg.Connection) -> dict[TableName, float]:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT n.nspname, c.relname, c.reltuples
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind IN ('r', 'p')
+        """)
+        return {(row[0], row[1]): row[2] for row in cur.fetchall()}
+
+
+def get_index_name(table: str, column: str) -> str:
+    name = f"{table}_{column}"
+    # postgres truncates identifiers to 63 bytes, so long names are shortened
+    # to leave room for the suffix, with a hash of the full name so that they
+    # stay distinct
+    if len(name) > 55:
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+        name = f"{name[:46]}_{digest}"
+    return name + "_t2s_idx"
+
+
+def replay_queries(
+    conn: psycopg.Connection,
+    queries: dict[str, str],
+    repeat: int,
+    statement_timeout: int,
+    schema: Schema,
+) -> list[QueryStats]:
+    """
+    Replay the queries `repeat` times each, recording timings in the style of
+    `pg_stat_statements` (calls, total and mean execution time in milliseconds),
+    along with the index candidates of each query.
+    """
+    stats = []  # type: list[QueryStats]
+    # autocommit can only be changed outside of a transaction, e.g. the one
+    # left open by `get_schema()`, and is restored afterwards, as the caller
+    # keeps using the connection
+    conn.commit()
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    conn.execute(f"SET statement_timeout = {int(statement_timeout)}")
+    try:
+        for name, query in queries.items():
+            times = []
+            error = ""
+            for _ in range(repeat):
+                start = time.perf_counter()
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(query)
+                        cur.fetchall()
+                except psycopg.errors.QueryCanceled as e:
+                    # count timed out queries at the timeout so they rank highest
+                    error = str(e)
+                    times.append(float(statement_timeout))
+                    break
+                except psycopg.DatabaseError as e:
+                    error = str(e)
+                    break
+                times.append((time.perf_counter() - start) * 1000)
+            stats.append(
+                {
+                    "name": name,
+                    "calls": len(times),
+                    "total_exec_time": round(sum(times), 3),
+                    "mean_exec_time": round(sum(times) / len(times), 3)
+                    if times
+                    else 0.0,
+                    "error": error,
+                    "candidates": extract_index_candidates(query, schema),
+                }
+            )
+    finally:
+        conn.execute("RESET statement_timeout")
+        conn.autocommit = autocommit
+    return stats
+
+
+def propose_indexes(
+    conn: psycopg.Connection,
+    stats: list[QueryStats],
+    min_rows: int,
+    limit: int,
+) -> list[IndexProposal]:
+    """
+    Propose indexes for candidate columns that are not the leading column of an
+    existing index, on tables with at least `min_rows` rows. The proposals are
+    scored by the summed mean execution time of the queries that use the column.
+    """
+    indexed = get_indexed_columns(conn)
+    table_rows = get_table_rows(conn)
+    proposals = {}  # type: dict[tuple[str, str, str], IndexProposal]
+    for query_stats in stats:
+        seen = set()
+        for candidate in query_stats["candidates"]:
+            key = (candidate["schema"], candidate["table"], candidate["column"])
+            if key in indexed:
+                continue
+            if table_rows.get((key[0], key[1]), 0) < min_rows:
+                continue
+            if key not in proposals:
+                name = get_index_name(key[1], key[2])
+                proposals[key] = {
+                    "schema": key[0],
+                    "table": key[1],
+                    "column": key[2],
+                    "name": name,
+                    "statement": SQL("CREATE INDEX IF NOT EXISTS {} ON {}.{} ({})")
+                    .format(
+                        Identifier(name),
+                        Identifier(key[0]),
+                        Identifier(key[1]),
+                        Identifier(key[2]),
+                    )
+                    .as_string(conn),
+                    "kinds": [],
+                    "queries": 0,
+                    "score": 0.0,
+                }
+            proposal = proposals[key]
+            if candidate["kind"] not in proposal["kinds"]:
+                proposal["kinds"].append(candidate["kind"])
+            if key in seen:
+                continue
+            seen.add(key)
+            proposal["queries"] += 1
+            proposal["score"] = round(
+                proposal["score"] + query_stats["mean_exec_time"], 3
+            )
+    return sorted(proposals.values(), key=lambda x: x["score"], reverse=True)[:limit]
+
+
+def read_index_file(index_file: Path) -> list[str]:
+    statements = []
+    with index_file.open("r") as fp:
+        for line in fp:
+            line = line.strip()
+            if line == "" or line.startswith("--"):
+                continue
+            statements.append(line)
+    return statements
+
+
+def write_index_file(index_file: Path, proposals: list[IndexProposal]) -> None:
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    with index_file.open("w") as fp:
+        fp.write("-- Generated by `python3 -m suite advise-indexes`\n")
+        for proposal in proposals:
+            fp.write(
+                f"-- score: {proposal['score']}ms, queries: {proposal['queries']}\n"
+            )
+            fp.write(f"{proposal['statement']};\n")
+
+
+def apply_indexes(conn: psycopg.Connection, statements: list[str]) -> list[str]:
+    """
+    Create the indexes and record their names in `text2sql.config` under the
+    `indexes` entry.
+    """
+    names = []
+    with conn.cursor() as cur:
+        for statement in statements:
+            match = INDEX_STATEMENT_REGEX.match(statement)
+            if match is None:
+                raise ValueError(f"Invalid index statement: {statement}")
+            cur.execute(statement)
+            names.append(match.group(1).strip('"'))
+        cur.execute(
+            """
+            INSERT INTO text2sql.config VALUES ('indexes', %s)
+            ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value
+            """,
+            (json.dumps(names),),
+        )
+    return names
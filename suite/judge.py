@@ -0,0 +1,278 @@
+"""
+LLM judge of the generated queries of evals, run as a pass after the evals of a
+run have finished, so that judging does not add to the duration of each eval.
+
+The evals only record what the judge needs (see `get_judge_request()`), with
+compact previews of the expected and actual results, and `judge_all()` then
+sends the requests concurrently. Verdicts are cached in
+`results/judge/verdicts.json` by the judge model, question, gold query and
+generated query, so re-running an eval that generated the same query does not
+judge it again.
+"""
+
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from textwrap import dedent
+from typing import Any, TypedDict
+
+import polars as pl
+from pydantic_ai.direct import model_request
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import ModelRequest
+from pydantic_ai.models import Model, ModelRequestParameters
+from pydantic_ai.tools import ToolDefinition
+
+from .costs import Pricing, get_pricing
+from .hedging import make_request
+from .mock_llm import get_mock_model
+from .timing import span
+
+DEFAULT_JUDGE_MODEL = "openai:gpt-4.1-nano"
+PREVIEW_ROWS = 10
+PREVIEW_VALUE_LENGTH = 50
+MAX_ATTEMPTS = 3
+
+JUDGE_TOOL = ToolDefinition(
+    name="sql_judge",
+    description="Provide a yes or no answer to whether the actual query is equivalent to the expected query for the given question along with reasoning on why.",
+    parameters_json_schema={
+        "type": "object",
+        "properties": {
+            "judgement": {
+                "type": "boolean",
+                "description": (
+                    "Indicate whether the actual query is equivalent to the expected query"
+                ),
+            },
+            "explanation": {
+                "type": "string",
+                "description": (
+                    "Concise explanation of the judgement if queries were equivalent or not"
+                ),
+            },
+        },
+        "required": [
+            "judgement",
+            "explanation",
+        ],
+    },
+)
+
+
+class JudgeRequest(TypedDict):
+    question: str
+    gold_query: str
+    generated_query: str
+    expected_preview: str
+    actual_preview: str
+
+
+class Verdict(TypedDict):
+    judgement: bool | None
+    explanation: str
+
+
+def format_preview(df: pl.DataFrame, rows: int = PREVIEW_ROWS) -> str:
+    """
+    Render the first rows of a frame as a GitHub flavored markdown table.
+    """
+    head = df.head(rows)
+
+    def cell(value: Any) -> str:
+        text = "" if value is None else str(value).replace("|", "\\|")
+        text = " ".join(text.split())
+        if len(text) > PREVIEW_VALUE_LENGTH:
+            text = text[: PREVIEW_VALUE_LENGTH - 3] + "..."
+        return text
+
+    lines = [
+        "| " + " | ".join(cell(x) for x in head.columns) + " |",
+        "|" + "|".join("---" for _ in head.columns) + "|",
+    ]
+    for row in head.iter_rows():
+        lines.append("| " + " | ".join(cell(x) for x in row) + " |")
+    return "\n".join(lines)
+
+
+def get_judge_request(
+    question: str,
+    gold_query: str,
+    generated_query: str,
+    expected: pl.DataFrame,
+    actual: pl.DataFrame,
+) -> JudgeRequest:
+    return {
+        "question": question,
+        "gold_query": gold_query,
+        "generated_query": generated_query,
+        "expected_preview": format_preview(expected),
+        "actual_preview": format_preview(actual),
+    }
+
+
+def build_prompt(request: JudgeRequest) -> str:
+    return "".join(
+        [
+            dedent(f"""
+                Is the following query equivalent to the expected query for the given question?
+                You MUST answer using the `sql_judge` tool call.
+
+                Question: {request["question"]}
+
+                Expected Query:
+                ```sql
+                {request["gold_query"]}
+                ```
+
+                Subset of expected results:
+            """),
+            request["expected_preview"],
+            dedent(f"""
+
+                Actual Query:
+                ```sql
+                {request["generated_query"]}
+                ```
+
+                Subset of actual results:
+            """),
+            request["actual_preview"],
+        ]
+    )
+
+
+def get_judge_model(judge_model: str) -> Model | str:
+    # with the mock provider, the judge is mocked by the given profile
+    if judge_model.startswith("mock:"):
+        return get_mock_model(judge_model.split(":", 1)[1], "judge")
+    return judge_model
+
+
+def get_cache_key(judge_model: str, request: JudgeRequest) -> str:
+    key = json.dumps(
+        [
+            judge_model,
+            request["question"],
+            request["gold_query"],
+            request["generated_query"],
+        ]
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def load_verdicts(results_dir: Path) -> dict[str, Verdict]:
+    verdicts_file = results_dir / "judge" / "verdicts.json"
+    if not verdicts_file.exists():
+        return {}
+    with verdicts_file.open() as fp:
+        return json.load(fp)
+
+
+def save_verdicts(results_dir: Path, verdicts: dict[str, Verdict]) -> None:
+    verdicts_file = results_dir / "judge" / "verdicts.json"
+    verdicts_file.parent.mkdir(parents=True, exist_ok=True)
+    with verdicts_file.open("w") as fp:
+        json.dump(verdicts, fp, indent=2, sort_keys=True)
+
+
+def get_judge_pricing(judge_model: str) -> Pricing | None:
+    provider, _, model = judge_model.rpartition(":")
+    return get_pricing(provider, model)
+
+
+async def judge(
+    judge_model: str, request: JudgeRequest
+) -> tuple[Verdict, dict[str, int]]:
+    messages = [ModelRequest.user_text_prompt(build_prompt(request))]
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with span(
+                "judge",
+                {
+                    "gen_ai.operation.name": "chat",
+                    "gen_ai.system": judge_model.rpartition(":")[0] or None,
+                    "gen_ai.request.model": judge_model,
+                },
+            ):
+                model_response, copies = await make_request(
+                    judge_model,
+                    lambda: model_request(
+                        get_judge_model(judge_model),
+                        messages,
+                        model_request_parameters=ModelRequestParameters(
+                            output_tools=[JUDGE_TOOL]
+                        ),
+                    ),
+                )
+            break
+        except ModelHTTPError as e:
+            if attempt == MAX_ATTEMPTS - 1 or (
+                e.status_code != 429 and e.status_code < 500
+            ):
+                raise
+            await asyncio.sleep(2**attempt)
+    # a hedged request is billed for each of its copies
+    usage = {
+        "cached_tokens": copies
+        * (model_response.usage.details or {}).get("cached_tokens", 0),
+        "request_tokens": copies * (model_response.usage.request_tokens or 0),
+        "response_tokens": copies * (model_response.usage.response_tokens or 0),
+    }
+    part = model_response.parts[0]
+    if part.part_kind != "tool-call":
+        return {
+            "judgement": None,
+            "explanation": "Unexpected response from LLM judge, expected tool call",
+        }, usage
+    args = part.args_as_dict()
+    return {
+        "judgement": args.get("judgement", None),
+        "explanation": args.get("explanation", ""),
+    }, usage
+
+
+async def judge_all(
+    requests: list[JudgeRequest],
+    judge_model: str,
+    concurrency: int,
+    verdicts: dict[str, Verdict],
+    usages: dict[str, dict[str, int]] | None = None,
+) -> list[Verdict]:
+    """
+    Judge the requests, at most `concurrency` at a time, using and updating the
+    cached `verdicts`. Returns the verdicts in the order of the requests.
+    Requests that fail are given a verdict without a judgement, which is not
+    cached. The token usage of the requests sent to the judge is added to
+    `usages` by their cache key, if given.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = {}  # type: dict[str, asyncio.Task[Verdict]]
+
+    async def run(request: JudgeRequest) -> Verdict:
+        async with semaphore:
+            try:
+                verdict, usage = await judge(judge_model, request)
+                if usages is not None:
+                    usages[get_cache_key(judge_model, request)] = usage
+                return verdict
+            except Exception as e:
+                return {
+                    "judgement": None,
+                    "explanation": f"{type(e).__name__}: {e}",
+                }
+
+    for request in requests:
+        key = get_cache_key(judge_model, request)
+        if key not in verdicts and key not in pending:
+            pending[key] = asyncio.create_task(run(request))
+    for key, task in pending.items():
+        verdict = await task
+        if verdict["judgement"] is not None:
+            verdicts[key] = verdict
+    results = []
+    for request in requests:
+        key = get_cache_key(judge_model, request)
+        results.append(verdicts[key] if key in verdicts else pending[key].result())
+    return results
@@ -1,24 +1,107 @@
 import asyncio
 import json
 import os
+import re
 import subprocess
 import time
+from contextlib import nullcontext
 from datetime import UTC, datetime
 from pathlib import Path
 from traceback import format_exc
-from typing import Dict, Optional
+from typing import Any, Awaitable, Callable, Optional, TypedDict
 
 import click
+import polars as pl
 import psycopg
 from dotenv import load_dotenv
-from psycopg.sql import SQL, Identifier
-from yaml import safe_load_all
 
-from .agents import get_agent_fn, get_agent_setup_fn, get_agent_version
+from .agents import AgentFn, get_agent_fn, get_agent_setup_fn, get_agent_version
+from .catalogs import (
+    apply_comments,
+    compile_catalog,
+    create_config,
+    get_catalog_file,
+    get_config,
+    set_config,
+)
+from .columnar import is_results_file, load_frame, load_results, write_results
+from .concurrency import use_adaptive_concurrency
+from .copy_loader import load_dump
+from .cost_gate import use_cost_gate
+from .costs import (
+    Pricing,
+    add_usage,
+    get_cost,
+    get_pricing,
+    get_usage_cost,
+    new_usage,
+    price_evals,
+    price_usage,
+)
+from .dumps import list_databases, restore_dump
 from .exceptions import GetExpectedError
+from .hedging import (
+    DEFAULT_TIMEOUT,
+    Latencies,
+    PerAgentParamType,
+    RequestPolicy,
+    get_agent_value,
+    parse_hedge,
+    parse_timeout,
+    use_request_policy,
+)
+from .history import (
+    get_config_key,
+    get_eval_key,
+    get_expected_stats,
+    load_history,
+    save_history,
+    update_history,
+)
+from .index_advisor import (
+    apply_indexes,
+    get_schema,
+    propose_indexes,
+    read_index_file,
+    replay_queries,
+    write_index_file,
+)
+from .judge import (
+    DEFAULT_JUDGE_MODEL,
+    get_judge_pricing,
+    judge_all,
+    load_verdicts,
+    save_verdicts,
+)
+from .judge import get_cache_key as get_judge_cache_key
+from .metrics import Metrics, serve_metrics, show_progress, use_metrics
+from .preflight import use_preflight
+from .query_cache import use_query_cache
+from .report import (
+    concat_frames,
+    get_breakdown,
+    get_error_counts,
+    summarize_timings,
+    summarize_usage,
+)
+from .sampling import (
+    PassRate,
+    Sample,
+    SampleParamType,
+    Stratum,
+    estimate_pass_rate,
+    get_complexity_index,
+    sample_evals,
+)
+from .sandbox import DEFAULT_LIMITS, Limits, get_limits, use_sandbox
+from .sharding import Shard, ShardParamType, merge_results, partition
+from .stats import summarize
 from .tasks.get_tables import run as get_tables
 from .tasks.text_to_sql import run as text_to_sql
-from .types import ContextMode, Results
+from .tasks.text_to_sql import share_gold_results
+from .timing import PhaseSummary, record_timings, span, summarize_phases
+from .tracing import start_tracing, trace_span
+from .types import ContextMode, Provider
 from .utils import (
     expand_embedding_model,
     expand_task_model,
@@ -26,6 +109,8 @@ from .utils import (
     get_git_info,
     get_psycopg_str,
 )
+from .validate import collect_gold_queries
+from .validate import validate_gold_queries as run_validate_gold_queries
 
 load_dotenv()
 
@@ -34,6 +119,225 @@ datasets_dir = root_directory / "datasets"
 results_dir = root_directory / "results"
 
 
+def print_timings(timings: dict[str, PhaseSummary], indent: str) -> None:
+    if len(timings) == 0:
+        return
+    print(f"{indent}Timings (p50 / p95 / max seconds):")
+    for name, summary in timings.items():
+        print(
+            f"{indent}  {name}: {summary['p50']:.3f} / {summary['p95']:.3f} / {summary['max']:.3f}"
+        )
+
+
+class Combo(TypedDict):
+    agent: str
+    agent_fn: AgentFn
+    provider: Provider
+    model: str
+    pricing: Pricing | None
+    policy: RequestPolicy
+
+
+def get_combo_key(combo: Combo) -> str:
+    return get_config_key(combo["agent"], combo["provider"], combo["model"])
+
+
+async def run_combo(
+    dataset: str,
+    eval_path: Path,
+    inp: dict[str, Any],
+    task_fn: Callable[..., Awaitable[Any]],
+    combo: Combo,
+    context_mode: ContextMode,
+    llm_judge: str,
+    strict: bool,
+    output_path: Path,
+) -> dict[str, Any] | None:
+    """
+    Run a single eval for an agent and model, returning its result, or None if
+    the gold query of the eval could not be executed.
+    """
+    with (
+        trace_span(
+            "eval",
+            {
+                "eval.dataset": dataset,
+                "eval.database": inp["database"],
+                "eval.name": eval_path.name,
+                "eval.agent": combo["agent"],
+                "gen_ai.request.model": combo["model"],
+            },
+        ) as eval_span,
+        record_timings() as timings,
+        use_request_policy(combo["policy"]),
+    ):
+        with span("connect"):
+            db = psycopg.connect(get_psycopg_str(f"{dataset}_{inp['database']}"))
+        with db:
+            # outside of a transaction block, so that the timeout applies to
+            # the whole session rather than ending with the first transaction
+            with db.cursor() as cur:
+                cur.execute(
+                    f"SET statement_timeout = {int(get_limits()['statement_timeout'])}"
+                )
+            db.commit()
+
+            with span("catalog"):
+                catalog = get_catalog(db)
+
+            error_path = output_path / "error.txt"
+            if error_path.exists():
+                error_path.unlink()
+            start = time.time()
+            try:
+                result = await task_fn(
+                    db,
+                    str(eval_path),
+                    inp["question"],
+                    combo["agent_fn"],
+                    combo["provider"],
+                    combo["model"],
+                    context_mode,
+                    llm_judge,
+                    strict,
+                    output_path=str(output_path),
+                )
+            except GetExpectedError:
+                return None
+            except Exception as e:
+                result = {
+                    "status": "error",
+                    "details": {
+                        "exception_class": type(e).__name__,
+                        "exception": str(e),
+                        "exception_traceback": format_exc(),
+                    },
+                }
+            duration = round(time.time() - start, 3)
+            result["details"]["catalog"] = catalog
+        result["details"]["timings"] = timings
+        if eval_span is not None:
+            eval_span.set_attributes({"eval.status": result["status"]})
+            if result["status"] == "error":
+                eval_span.set_error(result["details"]["exception"])
+
+    result["dataset"] = dataset
+    result["database"] = inp["database"]
+    result["name"] = eval_path.name
+    result["question"] = inp["question"]
+    if "duration" not in result:
+        result["duration"] = duration
+    result["details"]["question"] = inp["question"]
+    return result
+
+
+async def run_eval(
+    dataset: str,
+    eval_path: Path,
+    inp: dict[str, Any],
+    task_fn: Callable[..., Awaitable[Any]],
+    combos: list[Combo],
+    context_mode: ContextMode,
+    llm_judge: str,
+    strict: bool,
+) -> dict[str, dict[str, Any] | None]:
+    """
+    Run a single eval for each agent and model combination, returning their
+    results by combo key. The gold query of the eval is only executed once, and
+    its results shared between the combinations, which run concurrently.
+    """
+    if len(combos) == 1:
+        result = await run_combo(
+            dataset,
+            eval_path,
+            inp,
+            task_fn,
+            combos[0],
+            context_mode,
+            llm_judge,
+            strict,
+            eval_path,
+        )
+        return {get_combo_key(combos[0]): result}
+
+    with share_gold_results():
+        coros = []
+        for combo in combos:
+            # keep the artifacts of each combination apart
+            output_path = eval_path / "matrix" / get_combo_filename(combo)
+            output_path.mkdir(parents=True, exist_ok=True)
+            coro = run_combo(
+                dataset,
+                eval_path,
+                inp,
+                task_fn,
+                combo,
+                context_mode,
+                llm_judge,
+                strict,
+                output_path,
+            )
+            # the tasks and some of the agents are blocking, so each
+            # combination runs in a thread with its own event loop
+            coros.append(asyncio.to_thread(asyncio.run, coro))
+        results = await asyncio.gather(*coros)
+    return {get_combo_key(x): y for x, y in zip(combos, results, strict=True)}
+
+
+def get_combo_filename(combo: Combo) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", get_combo_key(combo))
+
+
+def new_dataset_results() -> dict[str, Any]:
+    return {
+        "passing": 0,
+        "total": 0,
+        "total_duration": 0,
+        "usage": new_usage(),
+        "timings": {},
+        "failed": [],
+        "failed_error_counts": {},
+        "errored": [],
+        "evals": [],
+        "skipped": [],
+    }
+
+
+def format_pass_rate(pass_rate: PassRate) -> str:
+    return (
+        f"{pass_rate['estimate']:.2f}"
+        f" (95% CI {pass_rate['low']:.2f}-{pass_rate['high']:.2f})"
+    )
+
+
+def format_cost_per_pass(cost_per_pass: float | None) -> str:
+    if cost_per_pass is None:
+        return "no passing evals"
+    return f"${cost_per_pass:.8f} per passing eval"
+
+
+def print_summary(breakdown: dict[str, Any], evals: pl.DataFrame, indent: str) -> None:
+    """
+    Print the durations, phase timings, usage and cost of a row of
+    `get_breakdown()` and its evals.
+    """
+    print(f"{indent}Total duration: {round(breakdown['duration'], 3)}")
+    print(
+        f"{indent}Eval duration (p50 / p95 seconds):"
+        f" {breakdown['duration_p50']:.3f} / {breakdown['duration_p95']:.3f}"
+    )
+    print_timings(summarize_timings(evals), indent)
+    usage = summarize_usage(evals)
+    print(f"{indent}Usage:")
+    print(f"{indent}  Request tokens: {usage['request_tokens']}")
+    print(f"{indent}  Request tokens cost: ${usage['request_tokens_cost']:.8f}")
+    print(f"{indent}  Cached tokens: {usage['cached_tokens']}")
+    print(f"{indent}  Cached tokens cost: ${usage['cached_tokens_cost']:.8f}")
+    print(f"{indent}  Response tokens: {usage['response_tokens']}")
+    print(f"{indent}  Response tokens cost: ${usage['response_tokens_cost']:.8f}")
+    print(f"{indent}Cost: {format_cost_per_pass(breakdown['cost_per_pass'])}")
+
+
 @click.group()
 def cli():
     pass
@@ -63,18 +367,7 @@ def generate_matrix(filter: Optional[str]) -> None:
             for db in databases:
                 include.append({"dataset": dataset.name, "database": db})
             continue
-        for database in (dataset / "databases").iterdir():
-            if database.suffix != ".sql":
-                continue
-            if not database.is_file():
-                continue
-            db_name = database.name
-            if ".part" in db_name and ".part000" not in db_name:
-                continue
-            if ".part000" in db_name:
-                db_name = db_name[:-12]
-            else:
-                db_name = database.stem
+        for db_name in list_databases(dataset / "databases"):
             include.append({"dataset": dataset.name, "database": db_name})
     if filter is not None:
         filter_datasets = [x.strip() for x in filter.split(",")]
@@ -99,13 +392,42 @@ def generate_matrix(filter: Optional[str]) -> None:
 @click.option(
     "--database", default="all", help="Database to load [defaults to all databases]"
 )
+@click.option(
+    "--indexes/--no-indexes",
+    default=True,
+    help="Create the advised indexes of the datasets after loading [default: true]",
+)
+@click.option(
+    "--loader",
+    default="psql",
+    type=click.Choice(["psql", "copy"]),
+    help="Restore dumps with psql, or with parallel COPY [default: psql]",
+)
+@click.option(
+    "--jobs",
+    default=4,
+    help="Number of parallel connections for the copy loader [default: 4]",
+)
 def load(
     catalog: str,
     dataset: str,
     database: str,
+    indexes: bool,
+    loader: str,
+    jobs: int,
 ) -> None:
     """
     Load the datasets into the database.
+
+    Dumps can be plain (`.sql`) or compressed (`.sql.gz`, `.sql.zst`) files,
+    optionally split into parts, and are streamed into psql without being
+    decompressed to disk. With `--loader copy`, the table data is instead loaded
+    with COPY over `--jobs` parallel connections, and indexes and
+    constraints are created once all data has been loaded. If a dataset has an `indexes/<database>.sql` file (see `advise-indexes`),
+    its indexes are created after the dump has been restored.
+
+    The catalog is compiled once to results/catalog_cache/ and reused by
+    `switch-catalog` and `setup` until its YAML changes.
     """
     datasets = os.listdir(datasets_dir) if dataset == "all" else [dataset]
     print(f"Loading datasets using catalog {catalog}...")
@@ -118,12 +440,8 @@ def load(
         if setup_sh.exists():
             print("    Running setup.sh")
             subprocess.run(f"bash {str(setup_sh)}", shell=True, check=True)
-        for entry in (datasets_dir / dataset / "databases").iterdir():
-            if entry.suffix != ".sql":
-                continue
-            if ".part" in entry.name and ".part000" not in entry.name:
-                continue
-            name = entry.stem if ".part" not in entry.name else entry.name[:-12]
+        databases = list_databases(datasets_dir / dataset / "databases")
+        for name, dump_files in databases.items():
             if database != "all" and name != database:
                 continue
             db_name = f"{dataset}_{name}"
@@ -135,61 +453,61 @@ def load(
                 print("      CREATE DATABASE")
                 root_db.execute(f"CREATE DATABASE {db_name}")
 
-            def load_sql_file(db_url, sql_file: Path) -> None:
-                subprocess.run(["psql", "-q", db_url, "-f", str(sql_file)], check=True)
-
             db_url = get_psycopg_str(db_name)
             with psycopg.connect(db_url) as db:
                 print("      Restoring dump")
-                if ".part" not in entry.name:
-                    load_sql_file(db_url, entry)
+                if loader == "copy":
+                    rows = load_dump(db_url, dump_files, jobs)
+                    print(f"      Loaded {rows} rows")
                 else:
-                    i = 0
-                    while True:
-                        sql_file = entry.parent / f"{name}.part{str(i).zfill(3)}.sql"
-                        if not sql_file.exists():
-                            break
-                        load_sql_file(db_url, sql_file)
-                        i += 1
+                    restore_dump(db_url, dump_files)
                 print("      Loading descriptions")
-                catalog_file = (
-                    datasets_dir / dataset / "catalogs" / catalog / f"{name}.yaml"
-                )
-                if not catalog_file.exists():
-                    raise ValueError(f"Catalog {catalog} not found")
-                with catalog_file.open("r") as fp:
-                    for doc in safe_load_all(fp):
-                        if doc["type"] != "table":
-                            continue
-                        with db.cursor() as cur:
-                            cur.execute(
-                                SQL("COMMENT ON TABLE {}.{} IS {}").format(
-                                    Identifier(doc["schema"]),
-                                    Identifier(doc["name"]),
-                                    doc["description"],
-                                ),
-                            )
-                            for column in doc["columns"]:
-                                cur.execute(
-                                    SQL("COMMENT ON COLUMN {}.{}.{} IS {}").format(
-                                        Identifier(doc["schema"]),
-                                        Identifier(doc["name"]),
-                                        Identifier(column["name"]),
-                                        column["description"],
-                                    ),
-                                )
+                compiled = compile_catalog(get_catalog_file(dataset, catalog, name))
+                apply_comments(db, compiled)
                 print("      Saving config")
-                with db.cursor() as cur:
-                    cur.execute("CREATE SCHEMA text2sql")
-                    cur.execute("""
-                        CREATE TABLE text2sql.config (
-                                name varchar NOT NULL PRIMARY KEY,
-                                value varchar NOT NULL
-                        )
-                    """)
-                    cur.execute(
-                        "INSERT INTO text2sql.config VALUES ('catalog', %s)", (catalog,)
-                    )
+                create_config(db)
+                set_config(db, "catalog", catalog)
+                set_config(db, "catalog_hash", compiled["hash"])
+                index_file = datasets_dir / dataset / "indexes" / f"{name}.sql"
+                if indexes and index_file.exists():
+                    print("      Creating indexes")
+                    apply_indexes(db, read_index_file(index_file))
+
+
+@cli.command("switch-catalog")
+@click.option("--catalog", required=True, help="Catalog to switch to")
+@click.option(
+    "--dataset", default="all", help="Dataset to switch [defaults to all datasets]"
+)
+@click.option(
+    "--database", default="all", help="Database to switch [defaults to all databases]"
+)
+def switch_catalog(catalog: str, dataset: str, database: str) -> None:
+    """
+    Switch the loaded databases to another catalog without reloading them.
+
+    Only the comments that differ between the catalogs are changed, and
+    databases that already use the catalog are skipped. Run `setup` afterwards
+    to update the agents, which only embed what changed.
+    """
+    datasets = sorted(os.listdir(datasets_dir) if dataset == "all" else [dataset])
+    print(f"Switching datasets to catalog {catalog}...")
+    for dataset in datasets:
+        print(f"  {dataset}")
+        for name in list_databases(datasets_dir / dataset / "databases"):
+            if database != "all" and name != database:
+                continue
+            db_name = f"{dataset}_{name}"
+            compiled = compile_catalog(get_catalog_file(dataset, catalog, name))
+            with psycopg.connect(get_psycopg_str(db_name)) as db:
+                if get_config(db, "catalog_hash") == compiled["hash"]:
+                    print(f"    {db_name}: up to date")
+                    continue
+                changed = apply_comments(db, compiled)
+                create_config(db)
+                set_config(db, "catalog", catalog)
+                set_config(db, "catalog_hash", compiled["hash"])
+            print(f"    {db_name}: {changed} comments changed")
 
 
 @cli.command()
@@ -222,25 +540,22 @@ def setup(
     agent_setup_fn = get_agent_setup_fn(agent)
     print(f"Setting up agent {agent}...")
     datasets = sorted(os.listdir(datasets_dir) if dataset == "all" else [dataset])
+    embedding_tokens = 0
 
     async def run():
+        nonlocal embedding_tokens
         for i in range(len(datasets)):
             if i > 0:
                 print()
             dataset = datasets[i]
             print(f"  Setting up {dataset}...")
-            for entry in (datasets_dir / dataset / "databases").iterdir():
-                if entry.suffix != ".sql":
-                    continue
-                if ".part" in entry.name and ".part000" not in entry.name:
-                    continue
-                name = entry.stem if ".part" not in entry.name else entry.name[:-12]
+            for name in list_databases(datasets_dir / dataset / "databases"):
                 if database and name != database:
                     continue
                 db_name = f"{dataset}_{name}"
                 print(f"    {db_name}", end="")
                 with psycopg.connect(get_psycopg_str(db_name)) as db:
-                    await agent_setup_fn(
+                    tokens = await agent_setup_fn(
                         db,
                         get_catalog(db),
                         dataset,
@@ -248,23 +563,261 @@ def setup(
                         model,
                         dimensions,
                     )
+                embedding_tokens += tokens or 0
                 print(" done")
 
     asyncio.run(run())
+    if embedding_tokens > 0:
+        usage = price_usage(
+            {"request_tokens": embedding_tokens}, get_pricing(provider, model)
+        )
+        print(
+            f"Embedding tokens (estimated): {embedding_tokens},"
+            f" cost: ${get_usage_cost(usage):.8f}"
+        )
+
+
+@cli.command()
+@click.option(
+    "--dataset", default="all", help="Dataset to validate [default all datasets]"
+)
+@click.option("--database", default=None, help="Database to validate")
+@click.option(
+    "--repeat", default=3, help="Number of times to execute each query [default: 3]"
+)
+@click.option(
+    "--explain",
+    default=5,
+    help="Capture EXPLAIN (ANALYZE, BUFFERS) for the N slowest queries [default: 5]",
+)
+@click.option(
+    "--concurrency",
+    default=4,
+    help="Number of databases to validate concurrently [default: 4]",
+)
+@click.option(
+    "--statement-timeout",
+    default=120000,
+    help="Statement timeout in milliseconds [default: 120000]",
+)
+@click.option(
+    "--output",
+    default=str(results_dir / "validation" / "gold_queries.json"),
+    help="Path to write the validation report to",
+)
+def validate_gold_queries(
+    dataset: str,
+    database: Optional[str],
+    repeat: int,
+    explain: int,
+    concurrency: int,
+    statement_timeout: int,
+    output: str,
+) -> None:
+    """
+    Validates that the gold queries execute and return results, timing them.
+
+    Databases are validated concurrently, with each query being executed
+    `--repeat` times to get its p50/p95/p99 execution time. The report is
+    written as JSON to `--output`.
+    """
+    if repeat < 1:
+        raise ValueError(f"Invalid repeat: {repeat}")
+    datasets = sorted(os.listdir(datasets_dir) if dataset == "all" else [dataset])
+    queries = collect_gold_queries(datasets_dir, datasets, database)
+    print(
+        f"Validating {sum(len(x) for x in queries.values())} gold queries "
+        f"across {len(queries)} databases..."
+    )
+    start_time = datetime.now(UTC).isoformat()
+    results = asyncio.run(
+        run_validate_gold_queries(
+            queries, repeat, explain, concurrency, statement_timeout
+        )
+    )
+
+    failed = 0
+    report = {
+        "start_time": start_time,
+        "end_time": datetime.now(UTC).isoformat(),
+        "repeat": repeat,
+        "statement_timeout": statement_timeout,
+        "timing": summarize(
+            x["timing"]["p50"] for x in results if x["status"] != "error"
+        ),
+        "datasets": {},
+        "queries": results,
+    }
+    for dataset in datasets:
+        dataset_results = [x for x in results if x["dataset"] == dataset]
+        if len(dataset_results) == 0:
+            continue
+        print(f"  {dataset}")
+        for result in dataset_results:
+            if result["status"] != "pass":
+                failed += 1
+                print(f"    {result['database']}/{result['name']}: {result['error']}")
+        databases = {}
+        for db in sorted({x["database"] for x in dataset_results}):
+            db_results = [x for x in dataset_results if x["database"] == db]
+            databases[db] = {
+                "total": len(db_results),
+                "failed": sum(1 for x in db_results if x["status"] != "pass"),
+                "timing": summarize(
+                    x["timing"]["p50"] for x in db_results if x["status"] != "error"
+                ),
+            }
+        timing = summarize(
+            x["timing"]["p50"] for x in dataset_results if x["status"] != "error"
+        )
+        report["datasets"][dataset] = {
+            "total": len(dataset_results),
+            "failed": sum(1 for x in dataset_results if x["status"] != "pass"),
+            "timing": timing,
+            "databases": databases,
+        }
+        print(f"    Queries: {len(dataset_results)}")
+        print(
+            f"    p50: {timing['p50']}s, p95: {timing['p95']}s, "
+            f"p99: {timing['p99']}s, max: {timing['max']}s"
+        )
+
+    slowest = [x for x in results if "explain" in x]
+    if len(slowest) > 0:
+        print("Slowest queries:")
+        for result in sorted(slowest, key=lambda x: x["timing"]["p50"], reverse=True):
+            print(
+                f"  {result['dataset']}_{result['database']}/{result['name']}: "
+                f"{result['timing']['p50']}s"
+            )
+
+    output_path = Path(output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w") as fp:
+        json.dump(report, fp, indent=2)
+    print(f"Report written to {output_path}")
+
+    if failed > 0:
+        raise SystemExit(f"Failed {failed} queries")
+
+
+@cli.command()
+@click.option("--dataset", required=True, help="Dataset to advise indexes for")
+@click.option(
+    "--database",
+    default=None,
+    help="Database to advise indexes for [default all databases of the dataset]",
+)
+@click.option(
+    "--repeat", default=1, help="Number of times to execute each query [default: 1]"
+)
+@click.option(
+    "--min-rows",
+    default=10000,
+    help="Minimum estimated rows for a table to be indexed [default: 10000]",
+)
+@click.option(
+    "--limit", default=10, help="Maximum number of indexes per database [default: 10]"
+)
+@click.option(
+    "--statement-timeout",
+    default=120000,
+    help="Statement timeout in milliseconds [default: 120000]",
+)
+@click.option(
+    "--write",
+    is_flag=True,
+    default=False,
+    help="Write the proposed indexes to the dataset for `load` to create",
+)
+@click.option(
+    "--apply",
+    is_flag=True,
+    default=False,
+    help="Create the proposed indexes in the loaded database",
+)
+def advise_indexes(
+    dataset: str,
+    database: Optional[str],
+    repeat: int,
+    min_rows: int,
+    limit: int,
+    statement_timeout: int,
+    write: bool,
+    apply: bool,
+) -> None:
+    """
+    Proposes secondary indexes for a dataset based on its gold queries.
+
+    The gold queries of each database are replayed to time them, and the columns
+    used in their filters and join keys are extracted with sqlglot. Columns that
+    are not covered by an existing index are proposed, ranked by the time spent
+    in the queries that use them. With `--write`, the proposals are saved to
+    `datasets/<dataset>/indexes/<database>.sql`, which `load` applies after
+    restoring the dump.
+    """
+    queries = collect_gold_queries(datasets_dir, [dataset], database)
+    for i, ((dataset, db_name), gold_queries) in enumerate(sorted(queries.items())):
+        if i > 0:
+            print()
+        print(f"{dataset}_{db_name} ({len(gold_queries)} queries)")
+        with psycopg.connect(get_psycopg_str(f"{dataset}_{db_name}")) as db:
+            stats = replay_queries(
+                db,
+                {x["name"]: x["query"] for x in gold_queries},
+                repeat,
+                statement_timeout,
+                get_schema(db),
+            )
+            proposals = propose_indexes(db, stats, min_rows, limit)
+            print(
+                f"  Total time: {round(sum(x['total_exec_time'] for x in stats), 3)}ms"
+            )
+            if len(proposals) == 0:
+                print("  No indexes to propose")
+                continue
+            print("  Proposed indexes:")
+            for proposal in proposals:
+                print(
+                    f"    {proposal['statement']} "
+                    f"-- score: {proposal['score']}ms, queries: {proposal['queries']}"
+                )
+            if write:
+                index_file = datasets_dir / dataset / "indexes" / f"{db_name}.sql"
+                write_index_file(index_file, proposals)
+                print(f"  Written to {index_file}")
+            if apply:
+                print("  Creating indexes...", end="", flush=True)
+                apply_indexes(db, [x["statement"] for x in proposals])
+                print(" done")
 
 
 @cli.command()
 @click.argument("agent")
 @click.argument("task")
 @click.option(
-    "--model", default="openai:gpt-4.1-nano", help="Model to use for the task"
+    "--model",
+    default="openai:gpt-4.1-nano",
+    help="Model to use for the task, or a comma separated list of models",
 )
 @click.option(
     "--dataset", default="all", help="Dataset to evaluate [default eval all datasets]"
 )
 @click.option("--database", default=None, help="Database to evaluate")
 @click.option("--eval", default=None, help="Eval case to run")
-@click.option("--fast", is_flag=True, default=False, help="Run 50 evals per dataset")
+@click.option(
+    "--sample",
+    default=None,
+    type=SampleParamType(),
+    help="Run a stratified sample of N evals, or a fraction of the evals, per dataset",
+)
+@click.option("--seed", default=0, type=int, help="Seed used to draw the sample")
+@click.option(
+    "--stratify-complexity",
+    is_flag=True,
+    default=False,
+    help="Stratify the sample by gold query complexity, as well as by database",
+)
 @click.option(
     "--context-mode",
     default="semantic_search",
@@ -277,7 +830,113 @@ def setup(
     type=click.Choice(["all", "fail", "none"]),
     help="Use LLM to judge evals (allowed values: 'all', 'fail', 'none')",
 )
+@click.option(
+    "--judge-model",
+    default=None,
+    help=f"Model of the LLM judge [default: {DEFAULT_JUDGE_MODEL}, or the mock profile with the mock provider]",
+)
+@click.option(
+    "--judge-concurrency",
+    default=8,
+    type=int,
+    help="Number of LLM judge requests to run at once",
+)
 @click.option("--strict", is_flag=True, default=False, help="Use strict evaluation")
+@click.option(
+    "--query-cache/--no-query-cache",
+    default=True,
+    help="Reuse the results of generated queries that were executed before",
+)
+@click.option(
+    "--preflight/--no-preflight",
+    default=True,
+    help="Check generated queries against the database schema before executing them",
+)
+@click.option(
+    "--statement-timeout",
+    default=DEFAULT_LIMITS["statement_timeout"],
+    type=int,
+    help="Statement timeout of generated and gold queries in milliseconds [default: 120000]",
+)
+@click.option(
+    "--work-mem",
+    default=DEFAULT_LIMITS["work_mem"],
+    help="work_mem of generated queries [default: 64MB]",
+)
+@click.option(
+    "--temp-file-limit",
+    default=DEFAULT_LIMITS["temp_file_limit"],
+    help="temp_file_limit of generated queries, setting it requires a superuser [default: 1GB]",
+)
+@click.option(
+    "--max-rows",
+    default=DEFAULT_LIMITS["max_rows"],
+    type=int,
+    help="Cancel generated queries that return more rows than this [default: 1000000]",
+)
+@click.option(
+    "--cost-gate",
+    default=None,
+    type=float,
+    help="Fail generated queries whose estimated cost is more than this many times that of the gold query",
+)
+@click.option(
+    "--results-format",
+    default="json",
+    type=click.Choice(["json", "parquet"]),
+    help="Write results as a single JSON file, or as a Parquet table of the evals with their details in results/blobs/",
+)
+@click.option(
+    "--trace",
+    is_flag=True,
+    default=False,
+    help="Export a trace of the run to the OTLP collector at OTEL_EXPORTER_OTLP_ENDPOINT, or to results/traces/",
+)
+@click.option(
+    "--concurrency", default=1, type=int, help="Number of evals to run at once"
+)
+@click.option(
+    "--adaptive-concurrency",
+    is_flag=True,
+    default=False,
+    help="Adapt the LLM requests in flight of each provider to its latency and rate limits, up to --concurrency",
+)
+@click.option(
+    "--request-timeout",
+    default=str(int(DEFAULT_TIMEOUT)),
+    type=PerAgentParamType(parse_timeout),
+    help="Seconds before an LLM request fails, for all agents or as agent=seconds,... (judge= for the LLM judge, 0 for no timeout)",
+)
+@click.option(
+    "--hedge",
+    default="off",
+    type=PerAgentParamType(parse_hedge),
+    help="Send a second copy of LLM requests slower than the p95 latency of their model, on/off for all agents or as agent=on,... (judge= for the LLM judge)",
+)
+@click.option(
+    "--budget",
+    default=None,
+    type=float,
+    help="Stop starting new evals once their projected cost would exceed this many dollars",
+)
+@click.option(
+    "--shard",
+    default=None,
+    type=ShardParamType(),
+    help="Only run the i-th of N shards of the evals, partitioned by eval name",
+)
+@click.option(
+    "--progress",
+    is_flag=True,
+    default=False,
+    help="Show a live view of the progress, rates and ETA instead of a line per eval",
+)
+@click.option(
+    "--metrics-port",
+    default=None,
+    type=int,
+    help="Serve live metrics of the run in the Prometheus text format on this port",
+)
 def eval(
     task: str,
     agent: str,
@@ -285,215 +944,402 @@ def eval(
     dataset: str,
     database: Optional[str],
     eval: Optional[str],
-    fast: bool,
+    sample: int | float | None,
+    seed: int,
+    stratify_complexity: bool,
     context_mode: ContextMode,
     llm_judge: str,
+    judge_model: Optional[str],
+    judge_concurrency: int,
     strict: bool,
+    query_cache: bool,
+    preflight: bool,
+    statement_timeout: int,
+    work_mem: str,
+    temp_file_limit: str,
+    max_rows: int,
+    cost_gate: Optional[float],
+    results_format: str,
+    trace: bool,
+    concurrency: int,
+    adaptive_concurrency: bool,
+    request_timeout: dict[str, float | None],
+    hedge: dict[str, bool],
+    budget: Optional[float],
+    shard: Optional[tuple[int, int]],
+    progress: bool,
+    metrics_port: Optional[int],
 ) -> None:
     """
     Runs the eval suite for a given agent and task.
 
-    The agent can be one of "baseline" or "pgai".
+    The agent can be one of "baseline", "pgai", "vanna" or "gold".
     The task can be one of "get_tables" or "text_to_sql".
+
+    With a comma separated list of agents and/or models, each eval is run for
+    every agent and model combination concurrently, executing its gold query
+    only once. The results of each combination are written to results/matrix/.
+
+    The results of generated queries are cached in results/query_cache/ by
+    their normalized text and a fingerprint of the database, so queries that
+    were generated before are not executed again (unless `--no-query-cache`).
+
+    Generated queries are checked against the schema of their database before
+    they are executed (unless `--no-preflight`), so queries with unknown tables
+    or columns are not sent to the database, and queries that would write to it
+    are never executed. They are executed in a read only transaction, with the
+    `--statement-timeout`, `--work-mem` and `--temp-file-limit`, and cancelled
+    once they return more than `--max-rows` rows. With `--cost-gate`, they fail
+    without being executed if the cost or rows estimated by `EXPLAIN` are more
+    than the given multiple of those of the gold query.
+
+    With `--trace`, the run is recorded as a trace with a span per eval and child
+    spans for its phases (agent and LLM calls, SQL executions, judge), exported
+    as OTLP/JSON.
+
+    With `--adaptive-concurrency`, up to `--concurrency` evals are run at once,
+    and the LLM requests in flight of each provider are limited by an AIMD
+    controller, which raises the limit while requests succeed and halves it
+    on rate limits (429) and latency spikes.
+
+    The LLM requests of the agents and the judge fail after
+    `--request-timeout` seconds. With `--hedge`, a request that is slower than
+    the p95 latency of the previous requests to its model is sent a second
+    time, and the first copy to answer is used; the tokens of both copies are
+    counted in the usage.
+
+    Evals are run longest-expected-first, based on the stats of previous runs
+    in results/history/. With `--budget`, no new evals are started once the
+    cost spent plus the expected cost of the next eval would exceed it.
+
+    With `--sample`, each dataset is sampled per database (and with
+    `--stratify-complexity` per gold query complexity), and its pass rate is
+    reported with a 95% confidence interval.
+
+    With `--shard i/N`, only the evals of the i-th of N shards are run, so that
+    a run can be split over multiple machines. The results of the shards can be
+    combined with the `merge-results` command.
+
+    With `--progress`, the evals of each dataset are shown as a live view of
+    the evals completed and in flight, the evals per second and ETA, and the
+    latency, rate limited requests and tokens per second of each provider.
+    With `--metrics-port`, the same metrics are served at /metrics on that port
+    in the Prometheus text format.
     """
-    try:
-        [provider, model] = expand_task_model(model).split(":", 1)
-    except ValueError:
-        raise ValueError(f"Invalid model: {model}") from None
+    if concurrency < 1:
+        raise ValueError(f"Invalid concurrency: {concurrency}")
+    if judge_concurrency < 1:
+        raise ValueError(f"Invalid judge concurrency: {judge_concurrency}")
+    if max_rows < 1:
+        raise ValueError(f"Invalid max rows: {max_rows}")
+    if cost_gate is not None and cost_gate <= 0:
+        raise ValueError(f"Invalid cost gate: {cost_gate}")
+    limits: Limits = {
+        "statement_timeout": statement_timeout,
+        "work_mem": work_mem,
+        "temp_file_limit": temp_file_limit,
+        "max_rows": max_rows,
+    }
     if task not in ["get_tables", "text_to_sql"]:
         raise ValueError(f"Invalid task: {task}")
     if llm_judge not in ["all", "fail", "none"]:
         raise ValueError(f"Invalid llm judge: {llm_judge}")
+    latencies = Latencies()
+    policies = {}  # type: dict[str, RequestPolicy]
+    for agent_name in [x.strip() for x in agent.split(",")] + ["judge"]:
+        policies[agent_name] = RequestPolicy(
+            get_agent_value(request_timeout, agent_name, DEFAULT_TIMEOUT),
+            get_agent_value(hedge, agent_name, False),
+            latencies,
+        )
+    combos = []  # type: list[Combo]
+    for agent_name in [x.strip() for x in agent.split(",")]:
+        for task_model in [x.strip() for x in model.split(",")]:
+            try:
+                [provider, model_name] = expand_task_model(task_model).split(":", 1)
+            except ValueError:
+                raise ValueError(f"Invalid model: {task_model}") from None
+            combos.append(
+                {
+                    "agent": agent_name,
+                    "agent_fn": get_agent_fn(agent_name, task),
+                    "provider": provider,
+                    "model": model_name,
+                    "pricing": get_pricing(provider, model_name),
+                    "policy": policies[agent_name],
+                }
+            )
+            if combos[-1]["pricing"] is None and provider != "mock":
+                print(f"No pricing for {task_model}, its costs are reported as $0")
+    combo_keys = [get_combo_key(x) for x in combos]
+    if len(set(combo_keys)) < len(combo_keys):
+        raise ValueError(f"Duplicate agent and model combinations: {combo_keys}")
+    matrix = len(combos) > 1
+
+    def get_combo_judge_model(combo: Combo) -> str:
+        if judge_model is not None:
+            return judge_model
+        if combo["provider"] == "mock":
+            return f"mock:{combo['model']}"
+        return DEFAULT_JUDGE_MODEL
+
     datasets = sorted(os.listdir(datasets_dir) if dataset == "all" else [dataset])
     task_fn = get_tables if task == "get_tables" else text_to_sql
-    agent_fn = get_agent_fn(agent, task)
-    errored_evals = {}  # type: dict[str, list[str]]
-    failed_evals = {}  # type: dict[str, list[str]]
-    failed_error_counts = {}  # type: dict[str, dict[str, int]]
-    eval_results = {}  # type: dict[str, Any]
     git_info = get_git_info(root_directory)
-    results: Dict[str, str | Dict[str, Results]] = {
-        "task": task,
-        "start_time": datetime.now(UTC).isoformat(),
-        "end_time": None,
-        "details": {
-            "agent": {
-                "name": agent,
-                "version": get_agent_version(agent),
+    start_time = datetime.now(UTC).isoformat()
+    combo_results = {}  # type: dict[str, dict[str, Any]]
+    for combo in combos:
+        combo_results[get_combo_key(combo)] = {
+            "task": task,
+            "start_time": start_time,
+            "end_time": None,
+            "details": {
+                "agent": {
+                    "name": combo["agent"],
+                    "version": get_agent_version(combo["agent"]),
+                },
+                "eval_suite": {
+                    "branch": git_info.branch,
+                    "commit": git_info.commit,
+                },
+                "provider": combo["provider"],
+                "model": combo["model"],
+                "llm_judge": llm_judge,
+                "judge_model": get_combo_judge_model(combo),
+                "judge_usage": new_usage(),
+                "query_cache": query_cache,
+                "preflight": preflight,
+                "limits": limits,
+                "cost_gate": cost_gate,
+                "sample": sample,
+                "seed": seed,
+                "stratify_complexity": stratify_complexity,
+                "shard": None if shard is None else f"{shard[0]}/{shard[1]}",
+                "concurrency": concurrency,
+                "adaptive_concurrency": adaptive_concurrency,
+                "request_timeout": combo["policy"].timeout,
+                "hedge": combo["policy"].hedge,
+                "budget": budget,
+                "context_mode": context_mode,
+                "entire_schema": context_mode == "entire_catalog",
+                "gold_tables": context_mode == "specific_ids",
             },
-            "eval_suite": {
-                "branch": git_info.branch,
-                "commit": git_info.commit,
-            },
-            "provider": provider,
-            "model": model,
-            "llm_judge": llm_judge,
-            "fast": fast,
-            "context_mode": context_mode,
-            "entire_schema": context_mode == "entire_catalog",
-            "gold_tables": context_mode == "specific_ids",
-        },
-        "results": {},
-    }
+            "results": {},
+        }
 
-    async def run():
-        for i in range(len(datasets)):
-            if i > 0:
-                print()
-            dataset = datasets[i]
-            errored_evals[dataset] = []
-            failed_evals[dataset] = []
-            failed_error_counts[dataset] = {}
-            eval_results[dataset] = []
-            total_duration = 0
-            usage = {
-                "cached_tokens": 0,
-                "cached_tokens_cost": 0.0,
-                "request_tokens": 0,
-                "request_tokens_cost": 0.0,
-                "response_tokens": 0,
-                "response_tokens_cost": 0.0,
+    history = load_history(results_dir)
+    spent = 0.0
+    budget_exhausted = False
+
+    async def run_dataset(dataset: str, metrics: Metrics) -> None:
+        nonlocal spent, budget_exhausted
+        dataset_results = {x: new_dataset_results() for x in combo_keys}
+        print(f"Evaluating {dataset}", end="")
+        evals_path = datasets_dir / dataset / "evals"
+        eval_paths = sorted(list(evals_path.iterdir()))
+        evals_to_run = []
+        for eval_path in eval_paths:
+            if eval is not None and eval_path.name != eval:
+                continue
+            with (eval_path / "eval.json").open() as fp:
+                inp = json.load(fp)
+            if database and inp["database"] != database:
+                continue
+            evals_to_run.append((eval_path, inp))
+
+        drawn: Sample | None = None
+        if sample is not None:
+            complexities = None
+            if stratify_complexity:
+                complexities = get_complexity_index(
+                    results_dir,
+                    dataset,
+                    {x[0].name: x[1]["query"] for x in evals_to_run},
+                )
+            drawn = sample_evals(
+                dataset,
+                {x[0].name: x[1]["database"] for x in evals_to_run},
+                sample,
+                seed,
+                complexities,
+            )
+            print(f" (sampling {drawn['size']} evals of {len(evals_to_run)})...")
+            sampled = {y for x in drawn["strata"].values() for y in x["evals"]}
+            evals_to_run = [x for x in evals_to_run if x[0].name in sampled]
+        else:
+            print(f" ({len(evals_to_run)} evals)...")
+
+        eval_keys = [get_eval_key(dataset, x[0].name) for x in evals_to_run]
+        combo_expected = [get_expected_stats(history, x, eval_keys) for x in combo_keys]
+        # the combinations of an eval run concurrently, so the eval takes as
+        # long as the slowest of them, and costs the sum of them
+        expected = {
+            key: {
+                "duration": max(x[key]["duration"] for x in combo_expected),
+                "cost": sum(x[key]["cost"] for x in combo_expected),
             }
-            passing = 0
-            total = 0
-            print(f"Evaluating {dataset}", end="")
-            evals_path = datasets_dir / dataset / "evals"
-            eval_paths = sorted(list(evals_path.iterdir()))
-            evals_to_run = []
-            for eval_path in eval_paths:
-                if eval is not None and eval_path.name != eval:
-                    continue
-                with (eval_path / "eval.json").open() as fp:
-                    inp = json.load(fp)
-                if database and inp["database"] != database:
-                    continue
-                evals_to_run.append(eval_path)
-
-            sample_size = 50
-            if fast and len(evals_to_run) > sample_size:
-                print(f" (sampling {sample_size} evals of {len(evals_to_run)})...")
-                step = (len(evals_to_run) - 1) / (sample_size - 1)
-                indices = [round(i * step) for i in range(sample_size)]
-                evals_to_run = [evals_to_run[i] for i in indices]
+            for key in eval_keys
+        }
+        # run the evals that are expected to take the longest first, so that
+        # they do not end up last and stretch the wall time of the run
+        evals_to_run.sort(
+            key=lambda x: expected[get_eval_key(dataset, x[0].name)]["duration"],
+            reverse=True,
+        )
+        shard_info: Shard | None = None
+        if shard is not None:
+            shards = partition([x[0].name for x in evals_to_run], shard[1])
+            shard_info = {
+                "index": shard[0],
+                "count": shard[1],
+                "population": len(evals_to_run),
+            }
+            in_shard = set(shards[shard[0] - 1])
+            evals_to_run = [x for x in evals_to_run if x[0].name in in_shard]
+            print(f"  Running shard {shard[0]}/{shard[1]} ({len(evals_to_run)} evals)")
+        in_flight = {}  # type: dict[str, float]
+
+        def handle_result(combo_key: str, result: dict[str, Any]) -> None:
+            combo_dataset_results = dataset_results[combo_key]
+            combo_dataset_results["total"] += 1
+            combo_dataset_results["total_duration"] += result["duration"]
+            to_print = f"    {result['status'].upper()}"
+            if matrix:
+                to_print = f"    {combo_key}: {result['status'].upper()}"
+            if result["details"].get("llm_judge", None) is not None:
+                to_print += f" (LLM judge: {result['details']['llm_judge']})"
+            if result["status"] == "error":
+                class_name = result["details"]["exception_class"]
+                failed_error_counts = combo_dataset_results["failed_error_counts"]
+                if class_name not in failed_error_counts:
+                    failed_error_counts[class_name] = 0
+                failed_error_counts[class_name] += 1
+                to_print += f" ({class_name}: {result['details']['exception']})"
+                error_path = evals_path / result["name"] / "error.txt"
+                if matrix:
+                    error_path = (
+                        evals_path
+                        / result["name"]
+                        / "matrix"
+                        / get_combo_filename(combos[combo_keys.index(combo_key)])
+                        / "error.txt"
+                    )
+                with error_path.open("w") as fp:
+                    fp.write(class_name + "\n\n")
+                    fp.write(result["details"]["exception_traceback"] + "\n\n")
+                    fp.write(result["details"]["exception"])
+            # the live view replaces the lines of the evals
+            if not progress:
+                print(to_print, flush=True)
+            if result["status"] == "pass":
+                combo_dataset_results["passing"] += 1
+            elif result["status"] == "fail":
+                combo_dataset_results["failed"].append(result["name"])
             else:
-                print(f" ({len(evals_to_run)} evals)...")
+                combo_dataset_results["errored"].append(result["name"])
+            combo_dataset_results["evals"].append(result)
 
-            for eval_path in evals_to_run:
-                if eval is not None and eval_path.name != eval:
-                    continue
-                with (eval_path / "eval.json").open() as fp:
-                    inp = json.load(fp)
-                if database and inp["database"] != database:
+        async def worker() -> None:
+            nonlocal spent, budget_exhausted
+            while len(evals_to_run) > 0 and not budget_exhausted:
+                eval_path, inp = evals_to_run[0]
+                key = get_eval_key(dataset, eval_path.name)
+                projected = spent + sum(in_flight.values()) + expected[key]["cost"]
+                if budget is not None and projected > budget:
+                    budget_exhausted = True
+                    break
+                evals_to_run.pop(0)
+                in_flight[key] = expected[key]["cost"]
+                metrics.start_evals(len(combos))
+                args = (
+                    dataset,
+                    eval_path,
+                    inp,
+                    task_fn,
+                    combos,
+                    context_mode,
+                    llm_judge,
+                    strict,
+                )
+                try:
+                    if concurrency > 1:
+                        # the tasks and some of the agents are blocking, so
+                        # each eval runs in a thread with its own event loop
+                        results = await asyncio.to_thread(asyncio.run, run_eval(*args))
+                    else:
+                        results = await run_eval(*args)
+                finally:
+                    del in_flight[key]
+                for combo, result in zip(combos, results.values(), strict=True):
+                    metrics.finish_eval(combo["provider"], result)
+                if all(x is None for x in results.values()):
                     continue
-                print(f"  {eval_path.name}:", flush=True)
-                total += 1
-                with psycopg.connect(
-                    get_psycopg_str(f"{dataset}_{inp['database']}")
-                ) as db:
-                    with db.cursor() as cur:
-                        cur.execute("SET LOCAL statement_timeout = 120000;")
-
-                    catalog = get_catalog(db)
-
-                    error_path = eval_path / "error.txt"
-                    if error_path.exists():
-                        error_path.unlink()
-                    start = time.time()
-                    try:
-                        result = await task_fn(
-                            db,
-                            str(eval_path),
-                            inp["question"],
-                            agent_fn,
-                            provider,
-                            model,
-                            context_mode,
-                            llm_judge,
-                            strict,
+                if not progress:
+                    print(f"  {eval_path.name}:", flush=True)
+                for combo, (combo_key, result) in zip(
+                    combos, results.items(), strict=True
+                ):
+                    if result is not None:
+                        spent += get_cost(
+                            result["details"].get("usage", {}), combo["pricing"]
                         )
-                    except GetExpectedError:
-                        total -= 1
-                        continue
-                    except Exception as e:
-                        result = {
-                            "status": "error",
-                            "details": {
-                                "exception_class": type(e).__name__,
-                                "exception": str(e),
-                                "exception_traceback": format_exc(),
-                            },
-                        }
-                    duration = round(time.time() - start, 3)
-                    result["details"]["catalog"] = catalog
-
-                result["dataset"] = dataset
-                result["database"] = inp["database"]
-                result["name"] = eval_path.name
-                result["question"] = inp["question"]
-                if "duration" not in result:
-                    result["duration"] = duration
-                result["details"]["question"] = inp["question"]
-                total_duration += result["duration"]
-                if "usage" in result["details"]:
-                    usage["cached_tokens"] += result["details"]["usage"][
-                        "cached_tokens"
-                    ]
-                    usage["cached_tokens_cost"] += result["details"]["usage"][
-                        "cached_tokens_cost"
-                    ]
-                    usage["request_tokens"] += result["details"]["usage"][
-                        "request_tokens"
-                    ]
-                    usage["request_tokens_cost"] += result["details"]["usage"][
-                        "request_tokens_cost"
-                    ]
-                    usage["response_tokens"] += result["details"]["usage"][
-                        "response_tokens"
-                    ]
-                    usage["response_tokens_cost"] += result["details"]["usage"][
-                        "response_tokens_cost"
-                    ]
-                to_print = f"    {result['status'].upper()}"
-                if result["details"].get("llm_judge", None) is not None:
-                    to_print += f" (LLM judge: {result['details']['llm_judge']})"
-                print(to_print, end="", flush=True)
-                if result["status"] == "error":
-                    class_name = result["details"]["exception_class"]
-                    if class_name not in failed_error_counts[dataset]:
-                        failed_error_counts[dataset][class_name] = 0
-                    failed_error_counts[dataset][class_name] += 1
-                    print(
-                        f" ({class_name}: {result['details']['exception']})",
-                        end="",
-                        flush=True,
-                    )
-                    with error_path.open("w") as fp:
-                        fp.write(class_name + "\n\n")
-                        fp.write(result["details"]["exception_traceback"] + "\n\n")
-                        fp.write(result["details"]["exception"])
-                print(flush=True)
-                if result["status"] == "pass":
-                    passing += 1
-                elif result["status"] == "fail":
-                    failed_evals[dataset].append(eval_path.name)
-                else:
-                    errored_evals[dataset].append(eval_path.name)
-                eval_results[dataset].append(result)
+                        handle_result(combo_key, result)
 
+        metrics.start_dataset(dataset, len(evals_to_run) * len(combos))
+        with show_progress(metrics) if progress else nullcontext():
+            await asyncio.gather(*[worker() for _ in range(concurrency)])
+        skipped_evals = []  # type: list[str]
+        if len(evals_to_run) > 0:
+            metrics.skip_evals(len(evals_to_run) * len(combos))
+            skipped_evals = sorted(x[0].name for x in evals_to_run)
             print(
-                f"  {1 if total == 0 else round(passing/total, 2)} ({passing}/{total})"
+                f"  Budget of ${budget:.2f} reached, skipped {len(skipped_evals)} evals"
+            )
+
+        for combo, combo_key in zip(combos, combo_keys, strict=True):
+            combo_dataset_results = dataset_results[combo_key]
+            combo_dataset_results["evals"].sort(key=lambda x: x["name"])
+            combo_dataset_results["usage"] = price_evals(
+                combo_dataset_results["evals"], combo["pricing"]
             )
-            if len(failed_evals[dataset]) > 0:
+            combo_dataset_results["skipped"] = skipped_evals
+            passing = combo_dataset_results["passing"]
+            total = combo_dataset_results["total"]
+            failed_evals = combo_dataset_results["failed"]
+            errored_evals = combo_dataset_results["errored"]
+            failed_error_counts = combo_dataset_results["failed_error_counts"]
+            usage = combo_dataset_results["usage"]
+
+            if matrix:
+                print(f"{combo_key}:")
+            print(
+                f"  {1 if total == 0 else round(passing / total, 2)} ({passing}/{total})"
+            )
+            if drawn is not None:
+                pass_rate = estimate_pass_rate(
+                    drawn["strata"],
+                    {x["name"]: x["status"] for x in combo_dataset_results["evals"]},
+                )
+                combo_dataset_results["sample"] = drawn
+                combo_dataset_results["pass_rate"] = pass_rate
+                print(f"  Estimated pass rate: {format_pass_rate(pass_rate)}")
+            if shard_info is not None:
+                combo_dataset_results["shard"] = shard_info
+            if len(failed_evals) > 0:
                 print("Failed error type counts:")
-                for error in sorted(failed_error_counts[dataset].keys()):
-                    print(f"  {error}: {failed_error_counts[dataset][error]}")
-                print(f"Failed evals:\n{sorted(failed_evals[dataset])}")
-            if len(errored_evals[dataset]) > 0:
-                print(f"Errored evals:\n{sorted(errored_evals[dataset])}")
+                for error in sorted(failed_error_counts.keys()):
+                    print(f"  {error}: {failed_error_counts[error]}")
+                print(f"Failed evals:\n{sorted(failed_evals)}")
+            if len(errored_evals) > 0:
+                print(f"Errored evals:\n{sorted(errored_evals)}")
 
-            total_duration = round(total_duration, 3)
+            total_duration = round(combo_dataset_results["total_duration"], 3)
+            timings = summarize_phases(combo_dataset_results["evals"])
+            combo_dataset_results["total_duration"] = total_duration
+            combo_dataset_results["timings"] = timings
 
             print(f"  Total duration: {total_duration} seconds")
+            print_timings(timings, "  ")
             print("  Usage:")
             print(f"    Request tokens: {usage['request_tokens']}")
             print(f"    Request tokens cost: ${usage['request_tokens_cost']:.8f}")
@@ -502,51 +1348,261 @@ def eval(
             print(f"    Response tokens: {usage['response_tokens']}")
             print(f"    Response tokens cost: ${usage['response_tokens_cost']:.8f}")
 
-            results["results"][dataset] = {
-                "passing": passing,
-                "total": total,
-                "total_duration": total_duration,
-                "usage": usage,
-                "failed": failed_evals[dataset],
-                "failed_error_counts": failed_error_counts[dataset],
-                "errored": errored_evals[dataset],
-                "evals": eval_results[dataset],
+            combo_results[combo_key]["results"][dataset] = combo_dataset_results
+
+    async def run_judge() -> None:
+        # judge model -> (combo key, result) of the evals to judge
+        pending = {}  # type: dict[str, list[tuple[str, dict[str, Any]]]]
+        for combo in combos:
+            combo_key = get_combo_key(combo)
+            for dataset_results in combo_results[combo_key]["results"].values():
+                for result in dataset_results["evals"]:
+                    if "judge" in result:
+                        pending.setdefault(get_combo_judge_model(combo), []).append(
+                            (combo_key, result)
+                        )
+        if len(pending) == 0:
+            return
+        verdicts = load_verdicts(results_dir)
+        for model_name, to_judge in pending.items():
+            cached = sum(
+                1
+                for _, x in to_judge
+                if get_judge_cache_key(model_name, x["judge"]["request"]) in verdicts
+            )
+            print()
+            print(
+                f"Judging {len(to_judge)} evals with {model_name} ({cached} cached)...",
+                flush=True,
+            )
+            start = time.time()
+            usages = {}  # type: dict[str, dict[str, int]]
+            with use_request_policy(policies["judge"]):
+                judged = await judge_all(
+                    [x["judge"]["request"] for _, x in to_judge],
+                    model_name,
+                    judge_concurrency,
+                    verdicts,
+                    usages,
+                )
+            pricing = get_judge_pricing(model_name)
+            cost = 0.0
+            for (combo_key, result), verdict in zip(to_judge, judged, strict=True):
+                judge = result.pop("judge")
+                key = get_judge_cache_key(model_name, judge["request"])
+                if key in usages:
+                    # the same request of several evals is only judged once
+                    usage = price_usage(usages.pop(key), pricing)
+                    add_usage(combo_results[combo_key]["details"]["judge_usage"], usage)
+                    cost += get_cost(usage, pricing)
+                details_path = Path(judge["details_path"])
+                if verdict["judgement"] is None:
+                    print(
+                        f"  {result['dataset']}/{result['name']}: {verdict['explanation']}"
+                    )
+                    continue
+                result["details"]["llm_judge"] = verdict["judgement"]
+                result["details"]["llm_explanation"] = verdict["explanation"]
+                if details_path.exists():
+                    with details_path.open() as fp:
+                        details = json.load(fp)
+                    details["details"]["llm_judge"] = verdict["judgement"]
+                    details["details"]["llm_explanation"] = verdict["explanation"]
+                    with details_path.open("w") as fp:
+                        json.dump(details, fp, indent=2)
+            equivalent = sum(1 for x in judged if x["judgement"] is True)
+            errored = sum(1 for x in judged if x["judgement"] is None)
+            print(
+                f"  {equivalent} equivalent, {len(judged) - equivalent - errored}"
+                f" not equivalent, {errored} errored"
+                f" ({round(time.time() - start, 3)} seconds, ${cost:.8f})"
+            )
+        save_verdicts(results_dir, verdicts)
+
+    async def run():
+        with (
+            use_query_cache(results_dir / "query_cache")
+            if query_cache
+            else nullcontext() as cache,
+            use_preflight() if preflight else nullcontext() as schemas,
+            use_sandbox(limits),
+            use_cost_gate(cost_gate)
+            if cost_gate is not None
+            else nullcontext() as gate,
+            use_adaptive_concurrency(concurrency)
+            if adaptive_concurrency
+            else nullcontext() as controllers,
+            use_metrics() as metrics,
+            serve_metrics(metrics, metrics_port)
+            if metrics_port is not None
+            else nullcontext(),
+        ):
+            if metrics_port is not None:
+                print(f"Serving metrics at http://127.0.0.1:{metrics_port}/metrics")
+            for i in range(len(datasets)):
+                if i > 0:
+                    print()
+                await run_dataset(datasets[i], metrics)
+        if (
+            cache is not None
+            or schemas is not None
+            or gate is not None
+            or controllers is not None
+        ):
+            print()
+        if cache is not None:
+            print(f"Generated query cache: {cache.hits} hits, {cache.misses} misses")
+        if schemas is not None:
+            print(
+                f"Preflight checks: {schemas.rejected} of {schemas.checked}"
+                " generated queries rejected"
+            )
+        if gate is not None:
+            print(
+                f"Cost gate: {gate.gated} of {gate.checked} generated queries"
+                " exceeded the cost of their gold query"
+            )
+        if controllers is not None:
+            for provider, controller in sorted(controllers.providers.items()):
+                print(
+                    f"Adaptive concurrency of {provider}: limit {int(controller.limit)}"
+                    f" (peak {controller.peak}), {controller.decreases} backoffs"
+                    f" over {controller.requests} requests"
+                )
+        await run_judge()
+        for name, policy in policies.items():
+            if policy.timeouts > 0 or policy.hedged > 0:
+                print(
+                    f"LLM requests of {name}: {policy.timeouts} timed out,"
+                    f" {policy.hedged} hedged ({policy.hedges_won} won by the hedge)"
+                )
+
+    if trace:
+        with start_tracing(
+            {
+                "eval.task": task,
+                "eval.agent": ",".join(sorted({x["agent"] for x in combos})),
+                "gen_ai.system": ",".join(sorted({x["provider"] for x in combos})),
+                "gen_ai.request.model": ",".join(sorted({x["model"] for x in combos})),
             }
+        ) as tracer:
+            with trace_span("eval_run"):
+                asyncio.run(run())
+        trace_file = results_dir / "traces" / f"{start_time.replace(':', '-')}.json"
+        print(f"Trace exported to {tracer.export(trace_file)}")
+    else:
+        asyncio.run(run())
 
-    asyncio.run(run())
+    end_time = datetime.now(UTC).isoformat()
+    for combo in combos:
+        combo_key = get_combo_key(combo)
+        results = combo_results[combo_key]
+        results["end_time"] = end_time
+        results_file = results_dir / f"results.{results_format}"
+        if matrix:
+            results_file = (
+                results_dir / "matrix" / f"{get_combo_filename(combo)}.{results_format}"
+            )
+        write_results(results, results_file)
+        update_history(history, combo_key, results["results"])
+    save_history(results_dir, history)
 
-    results["end_time"] = datetime.now(UTC).isoformat()
-    with (results_dir / "results.json").open("w") as fp:
-        json.dump(
-            results,
-            fp,
+    if matrix:
+        print()
+        print("Results by agent and model:")
+        for combo_key in combo_keys:
+            passing = sum(
+                x["passing"] for x in combo_results[combo_key]["results"].values()
+            )
+            total = sum(
+                x["total"] for x in combo_results[combo_key]["results"].values()
+            )
+            print(
+                f"  {combo_key}: {1 if total == 0 else round(passing / total, 2)}"
+                f" ({passing}/{total})"
+            )
+        print(f"Results written to {results_dir / 'matrix'}")
+
+
+@cli.command("merge-results")
+@click.argument("files", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option(
+    "--output",
+    default=None,
+    type=click.Path(),
+    help="File (.json or .parquet) to write the merged results to [default: results/results.json]",
+)
+def merge_results_cmd(files: tuple[str, ...], output: Optional[str]) -> None:
+    """
+    Merges the results files of the shards of a run (see `eval --shard`) into
+    a single results file, in the format of the suffix of `--output`.
+    """
+    shards = [load_results(Path(x), with_details=True) for x in files]
+    merged = merge_results(shards)
+    output_file = Path(output) if output else results_dir / "results.json"
+    write_results(merged, output_file)
+    for dataset, dataset_results in merged["results"].items():
+        print(
+            f"{dataset}: {dataset_results['passing']}/{dataset_results['total']}"
+            f" from {len(files)} shards"
         )
+    print(f"Merged results written to {output_file}")
 
 
 @cli.command()
-def generate_report():
-    combined_results = {}  # type: dict[str, Results]
-    if not results_dir.exists() or not results_dir.is_dir():
+@click.argument("files", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+def generate_report(files: tuple[str, ...]):
+    """
+    Prints a report of the results files (.json or .parquet) given, or of all
+    results files in the results directory, e.g. those of the matrix of an
+    `eval` run in results/matrix/.
+
+    The evals of all files are aggregated as a single frame, and broken down
+    by dataset, database and error class.
+    """
+    if len(files) == 0 and (not results_dir.exists() or not results_dir.is_dir()):
         print("No results direcotry found. Please run the eval command first.")
         return
 
     start_time = None  # type: Optional[datetime]
     end_time = None  # type: Optional[datetime]
+    # strata of the evals of each dataset, so that the pass rate of sampled runs
+    # can be estimated, with the evals of full runs as fully sampled strata
+    strata: dict[str, dict[str, Stratum]] = {}
+    sampled_datasets = set()  # type: set[str]
+    runs = []  # type: list[tuple[Path, dict[str, Any]]]
+    frames = []  # type: list[pl.DataFrame]
+    # dataset/file index/eval name -> status
+    statuses = {}  # type: dict[str, str]
 
-    for results_file in results_dir.iterdir():
-        if not results_file.is_file() or not results_file.name.endswith(".json"):
+    results_files = [Path(x) for x in files] if files else results_dir.iterdir()
+    for results_file in results_files:
+        if not results_file.is_file() or not is_results_file(results_file):
             continue
-        with results_file.open() as fp:
-            try:
-                results_obj = json.load(fp)
-            except json.JSONDecodeError:
-                print(f"Failed to decode {results_file.name}, contents:")
-                print()
-                print(fp.read())
-                print()
-                print("Skipping file...")
-                continue
-        results = results_obj["results"]
+        try:
+            results_obj, df = load_frame(results_file)
+        except json.JSONDecodeError:
+            print(f"Failed to decode {results_file.name}, contents:")
+            print()
+            print(results_file.read_text())
+            print()
+            print("Skipping file...")
+            continue
+        except (pl.exceptions.PolarsError, OSError) as e:
+            # e.g. a corrupt Parquet file, or one without its .run.json
+            print(f"Failed to read {results_file.name}: {e}")
+            print("Skipping file...")
+            continue
+        # the evals of each file are kept apart in the strata and statuses, as
+        # the files can be of different agents or models (e.g. of a matrix)
+        file_index = len(runs)
+        runs.append((results_file, results_obj))
+        frames.append(df)
+        statuses.update(
+            df.select(
+                pl.format("{}/{}/{}", "dataset", pl.lit(file_index), "name"), "status"
+            ).iter_rows()
+        )
 
         results_start = results_obj.get("start_time", None)
         if results_start is not None:
@@ -557,114 +1613,111 @@ def generate_report():
             results_end = datetime.fromisoformat(results_end)
             end_time = max(end_time, results_end) if end_time else results_end
 
-        for dataset, result in results.items():
-            if dataset not in combined_results:
-                combined_results[dataset] = {
-                    "passing": 0,
-                    "total": 0,
-                    "total_duration": 0,
-                    "usage": {
-                        "cached_tokens": 0,
-                        "cached_tokens_cost": 0.0,
-                        "request_tokens": 0,
-                        "request_tokens_cost": 0.0,
-                        "response_tokens": 0,
-                        "response_tokens_cost": 0.0,
-                    },
-                    "failed": [],
-                    "failed_error_counts": {},
-                    "errored": [],
-                    "evals": [],
+        for dataset, result in results_obj["results"].items():
+            dataset_strata = strata.setdefault(dataset, {})
+            if "sample" in result:
+                sampled_datasets.add(dataset)
+                for key, stratum in result["sample"]["strata"].items():
+                    dataset_strata[f"{file_index}/{key}"] = {
+                        "population": stratum["population"],
+                        "evals": [f"{file_index}/{x}" for x in stratum["evals"]],
+                    }
+                continue
+            databases = (
+                df.filter(pl.col("dataset") == dataset)
+                .group_by("database", maintain_order=True)
+                .agg("name")
+            )
+            for database, names in databases.iter_rows():
+                dataset_strata[f"{file_index}/{database}"] = {
+                    "population": len(names),
+                    "evals": [f"{file_index}/{x}" for x in names],
                 }
-            combined_results[dataset]["passing"] += result["passing"]
-            combined_results[dataset]["total"] += result["total"]
-            combined_results[dataset]["failed"] += result["failed"]
-            combined_results[dataset]["total_duration"] += result["total_duration"]
-            if "usage" in result:
-                combined_results[dataset]["usage"]["cached_tokens"] += result["usage"][
-                    "cached_tokens"
-                ]
-                combined_results[dataset]["usage"]["cached_tokens_cost"] += result[
-                    "usage"
-                ]["cached_tokens_cost"]
-                combined_results[dataset]["usage"]["request_tokens"] += result["usage"][
-                    "request_tokens"
-                ]
-                combined_results[dataset]["usage"]["request_tokens_cost"] += result[
-                    "usage"
-                ]["request_tokens_cost"]
-                combined_results[dataset]["usage"]["response_tokens"] += result[
-                    "usage"
-                ]["response_tokens"]
-                combined_results[dataset]["usage"]["response_tokens_cost"] += result[
-                    "usage"
-                ]["response_tokens_cost"]
-            for error, count in result["failed_error_counts"].items():
-                if error not in combined_results[dataset]["failed_error_counts"]:
-                    combined_results[dataset]["failed_error_counts"][error] = 0
-                combined_results[dataset]["failed_error_counts"][error] += count
-            combined_results[dataset]["errored"] += result["errored"]
-            combined_results[dataset]["evals"] += result["evals"]
-
-    passing = 0
-    total = 0
-    for results in combined_results.values():
-        passing += results["passing"]
-        total += results["total"]
-    print(f"Overall: {passing}/{total} ({round(passing/total, 2)})")
-    print(
-        f"  Total duration: {round(sum([x['total_duration'] for x in combined_results.values()]), 3)}"
-    )
-    print("  Usage:")
-    print(
-        f"    Request tokens: {sum([x['usage']['request_tokens'] for x in combined_results.values()])}"
-    )
-    print(
-        f"    Request tokens cost: ${sum([x['usage']['request_tokens_cost'] for x in combined_results.values()]):.8f}"
-    )
-    print(
-        f"    Cached tokens: {sum([x['usage']['cached_tokens'] for x in combined_results.values()])}"
-    )
-    print(
-        f"    Cached tokens cost: ${sum([x['usage']['cached_tokens_cost'] for x in combined_results.values()]):.8f}"
-    )
-    print(
-        f"    Response tokens: {sum([x['usage']['response_tokens'] for x in combined_results.values()])}"
-    )
+
+    if len(frames) == 0:
+        print("No results files found. Please run the eval command first.")
+        return
+    evals = concat_frames(frames)
+
+    overall = get_breakdown(evals.with_columns(pl.lit("").alias("all")), ["all"])
+    overall_row = overall.row(0, named=True)
     print(
-        f"    Response tokens cost: ${sum([x['usage']['response_tokens_cost'] for x in combined_results.values()]):.8f}"
+        f"Overall: {overall_row['passing']}/{overall_row['total']}"
+        f" ({round(overall_row['pass_rate'], 2)})"
     )
+    if len(sampled_datasets) > 0:
+        pass_rate = estimate_pass_rate(
+            {
+                f"{dataset}/{key}": {
+                    "population": stratum["population"],
+                    "evals": [f"{dataset}/{x}" for x in stratum["evals"]],
+                }
+                for dataset, dataset_strata in strata.items()
+                for key, stratum in dataset_strata.items()
+            },
+            statuses,
+        )
+        print(f"  Estimated pass rate: {format_pass_rate(pass_rate)}")
+    print_summary(overall_row, evals, "  ")
+    judge_usages = [
+        x["details"]["judge_usage"] for _, x in runs if "judge_usage" in x["details"]
+    ]
+    if len(judge_usages) > 0:
+        judge_cost = sum(get_usage_cost(x) for x in judge_usages)
+        print(f"  LLM judge cost: ${judge_cost:.8f}")
+        print(f"  Total cost: ${overall_row['cost'] + judge_cost:.8f}")
     print()
 
-    i = 0
-    for dataset in sorted(combined_results.keys()):
+    datasets = get_breakdown(evals, ["dataset"])
+    databases = get_breakdown(evals, ["dataset", "database"])
+    error_counts = get_error_counts(evals, ["dataset"])
+    for i, row in enumerate(datasets.iter_rows(named=True)):
         if i > 0:
             print()
-        results = combined_results[dataset]
+        dataset = row["dataset"]
+        dataset_evals = evals.filter(pl.col("dataset") == dataset)
         print(
-            f"{dataset}: {results['passing']}/{results['total']} ({round(results['passing']/results['total'], 2)})"
+            f"{dataset}: {row['passing']}/{row['total']} ({round(row['pass_rate'], 2)})"
         )
-        print(f"  Total duration: {round(results['total_duration'], 3)}")
-        print("  Usage:")
-        print(f"    Request tokens: {results['usage']['request_tokens']}")
-        print(
-            f"    Request tokens cost: ${results['usage']['request_tokens_cost']:.8f}"
+        if dataset in sampled_datasets:
+            pass_rate = estimate_pass_rate(
+                strata[dataset],
+                {
+                    x.split("/", 1)[1]: y
+                    for x, y in statuses.items()
+                    if x.startswith(f"{dataset}/")
+                },
+            )
+            print(f"  Estimated pass rate: {format_pass_rate(pass_rate)}")
+        print_summary(row, dataset_evals, "  ")
+        print("  Databases:")
+        for database in databases.filter(pl.col("dataset") == dataset).iter_rows(
+            named=True
+        ):
+            print(
+                f"    {database['database']}: {database['passing']}/{database['total']}"
+                f" ({round(database['pass_rate'], 2)}),"
+                f" p50 {database['duration_p50']:.3f} seconds,"
+                f" {format_cost_per_pass(database['cost_per_pass'])}"
+            )
+        failed = sorted(
+            dataset_evals.filter(pl.col("status") == "fail")["name"].to_list()
         )
-        print(f"    Cached tokens: {results['usage']['cached_tokens']}")
-        print(f"    Cached tokens cost: ${results['usage']['cached_tokens_cost']:.8f}")
-        print(f"    Response tokens: {results['usage']['response_tokens']}")
-        print(
-            f"    Response tokens cost: ${results['usage']['response_tokens_cost']:.8f}"
+        errored = sorted(
+            dataset_evals.filter(pl.col("status") == "error")["name"].to_list()
         )
-        if len(results["failed"]) > 0:
-            print("  Failed error type counts:")
-            for error in sorted(results["failed_error_counts"].keys()):
-                print(f"    {error}: {results['failed_error_counts'][error]}")
-            print(f"  Failed evals:\n    {sorted(results['failed'])}")
+        if len(failed) > 0:
+            print(f"  Failed evals:\n    {failed}")
 
-        if len(results["errored"]) > 0:
-            print(f"  Errored evals:\n    {sorted(results['errored'])}")
-        i += 1
+        if len(errored) > 0:
+            print("  Failed error type counts:")
+            for error, count in (
+                error_counts.filter(pl.col("dataset") == dataset)
+                .select("exception_class", "count")
+                .iter_rows()
+            ):
+                print(f"    {error}: {count}")
+            print(f"  Errored evals:\n    {errored}")
 
     # save results if REPORT_POSTGRES_DSN is set
     if os.environ.get("REPORT_POSTGRES_DSN", ""):
@@ -672,12 +1725,10 @@ def generate_report():
         try:
             with psycopg.connect(os.environ["REPORT_POSTGRES_DSN"]) as conn:
                 with conn.cursor() as cursor:
-                    scores = {}
-                    for dataset in combined_results:
-                        scores[dataset] = {
-                            "passing": combined_results[dataset]["passing"],
-                            "total": combined_results[dataset]["total"],
-                        }
+                    scores = {
+                        x["dataset"]: {"passing": x["passing"], "total": x["total"]}
+                        for x in datasets.iter_rows(named=True)
+                    }
                     cursor.execute(
                         """
                         INSERT INTO runs (source, start_time, end_time, scores, task, details)
@@ -694,8 +1745,13 @@ def generate_report():
                         ),
                     )
                     run_id = cursor.fetchone()[0]
-                    for value in combined_results.values():
-                        for eval in value["evals"]:
+                    for results_file, _ in runs:
+                        run_results = load_results(results_file, with_details=True)
+                        for eval in (
+                            x
+                            for y in run_results["results"].values()
+                            for x in y["evals"]
+                        ):
                             cursor.execute(
                                 """
                                 INSERT INTO evals (run_id, dataset, database, name, question, status, duration, details)
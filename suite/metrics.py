@@ -0,0 +1,354 @@
+"""
+Live metrics of an eval run: evals completed and in flight, their rate and the
+ETA of the current dataset, and per provider the latency of the LLM requests,
+the requests rejected with a 429 and the tokens used.
+
+The metrics are collected while a `Metrics` is active (see `use_metrics()`).
+The LLM requests are measured by the spans that have a `gen_ai.operation.name`
+attribute (see `timing.span()`), so agents do not have to report them. The
+metrics can be shown as a live view in the terminal (see `show_progress()`)
+and served in the Prometheus text format (see `serve_metrics()`).
+"""
+
+import sys
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from .stats import percentile
+
+# window over which the rates of the live view are computed, in seconds
+RATE_WINDOW = 60
+# latencies kept per provider for the percentiles of the live view
+LATENCY_SAMPLES = 1000
+LATENCY_BUCKETS = [0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300]
+TOKEN_TYPES = ["request_tokens", "response_tokens", "cached_tokens"]
+
+
+class ProviderMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)  # type: deque[float]
+        self.tokens = {x: 0 for x in TOKEN_TYPES}
+        # (time, tokens) of the evals in the rate window
+        self.recent_tokens = deque()  # type: deque[tuple[float, int]]
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.dataset = None  # type: str | None
+        self.planned = 0
+        self.in_flight = 0
+        self.completed = {}  # type: dict[str, int]
+        self.dataset_completed = 0
+        # completion times of the evals in the rate window
+        self.recent = deque()  # type: deque[float]
+        self.providers = {}  # type: dict[str, ProviderMetrics]
+
+    def get_provider(self, provider: str) -> ProviderMetrics:
+        if provider not in self.providers:
+            self.providers[provider] = ProviderMetrics()
+        return self.providers[provider]
+
+    def start_dataset(self, dataset: str, planned: int) -> None:
+        with self.lock:
+            self.dataset = dataset
+            self.planned = planned
+            self.dataset_completed = 0
+
+    def start_evals(self, count: int) -> None:
+        with self.lock:
+            self.in_flight += count
+
+    def finish_eval(self, provider: str, result: dict[str, Any] | None) -> None:
+        """
+        Record an eval of the provider as finished, or as dropped from the
+        dataset if its result is None (its gold query failed).
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.in_flight -= 1
+            if result is None:
+                self.planned -= 1
+                return
+            status = result["status"]
+            self.completed[status] = self.completed.get(status, 0) + 1
+            self.dataset_completed += 1
+            self.recent.append(now)
+            usage = result["details"].get("usage", {})
+            metrics = self.get_provider(provider)
+            for key in TOKEN_TYPES:
+                metrics.tokens[key] += usage.get(key, 0)
+            metrics.recent_tokens.append(
+                (
+                    now,
+                    usage.get("request_tokens", 0) + usage.get("response_tokens", 0),
+                )
+            )
+
+    def skip_evals(self, count: int) -> None:
+        with self.lock:
+            self.planned -= count
+
+    def observe_request(
+        self, provider: str, elapsed: float, status_code: int | None
+    ) -> None:
+        with self.lock:
+            metrics = self.get_provider(provider)
+            metrics.requests += 1
+            metrics.latency_sum += elapsed
+            metrics.latencies.append(elapsed)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    metrics.latency_buckets[i] += 1
+            if status_code == 429:
+                metrics.rate_limited += 1
+            elif status_code is not None:
+                metrics.errors += 1
+
+    def trim(self, now: float) -> None:
+        while len(self.recent) > 0 and self.recent[0] < now - RATE_WINDOW:
+            self.recent.popleft()
+        for metrics in self.providers.values():
+            recent = metrics.recent_tokens
+            while len(recent) > 0 and recent[0][0] < now - RATE_WINDOW:
+                recent.popleft()
+
+    def get_rate(self, now: float) -> float:
+        """
+        Get the evals completed per second over the rate window.
+        """
+        return len(self.recent) / min(RATE_WINDOW, max(now - self.start, 1.0))
+
+    def get_eta(self, now: float) -> float | None:
+        remaining = self.planned - self.dataset_completed
+        rate = self.get_rate(now)
+        if remaining <= 0:
+            return 0.0
+        if rate == 0:
+            return None
+        return remaining / rate
+
+
+def format_duration(seconds: float | None) -> str:
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02}s"
+    return f"{seconds}s"
+
+
+def render_progress(metrics: Metrics) -> list[str]:
+    now = time.monotonic()
+    with metrics.lock:
+        metrics.trim(now)
+        rate = metrics.get_rate(now)
+        lines = [
+            f"{metrics.dataset}: {metrics.dataset_completed}/{metrics.planned} evals"
+            f" ({metrics.in_flight} in flight), {rate:.2f} evals/s,"
+            f" ETA {format_duration(metrics.get_eta(now))},"
+            f" elapsed {format_duration(now - metrics.start)}",
+            "  "
+            + ", ".join(
+                f"{status} {count}"
+                for status, count in sorted(metrics.completed.items())
+            ),
+        ]
+        for provider, provider_metrics in sorted(metrics.providers.items()):
+            latencies = list(provider_metrics.latencies)
+            tokens = sum(x[1] for x in provider_metrics.recent_tokens)
+            lines.append(
+                f"  {provider}: {provider_metrics.requests} requests,"
+                f" p50 {percentile(latencies, 50):.2f}s,"
+                f" p95 {percentile(latencies, 95):.2f}s,"
+                f" {provider_metrics.rate_limited} rate limited,"
+                f" {tokens / min(RATE_WINDOW, max(now - metrics.start, 1.0)):.0f} tokens/s"
+            )
+    return lines
+
+
+def to_prometheus(metrics: Metrics) -> str:
+    now = time.monotonic()
+    lines = []  # type: list[str]
+
+    def add(name: str, kind: str, help: str, samples: list[tuple[str, Any]]) -> None:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{labels} {value}")
+
+    with metrics.lock:
+        metrics.trim(now)
+        eta = metrics.get_eta(now)
+        add(
+            "eval_evals_completed_total",
+            "counter",
+            "Evals completed, by status.",
+            [(f'{{status="{x}"}}', y) for x, y in sorted(metrics.completed.items())],
+        )
+        add(
+            "eval_evals_in_flight",
+            "gauge",
+            "Evals currently running.",
+            [("", metrics.in_flight)],
+        )
+        add(
+            "eval_evals_remaining",
+            "gauge",
+            "Evals of the current dataset still to complete.",
+            [("", max(metrics.planned - metrics.dataset_completed, 0))],
+        )
+        add(
+            "eval_evals_per_second",
+            "gauge",
+            f"Evals completed per second over the last {RATE_WINDOW} seconds.",
+            [("", round(metrics.get_rate(now), 6))],
+        )
+        add(
+            "eval_eta_seconds",
+            "gauge",
+            "Estimated seconds until the current dataset completes.",
+            [("", "NaN" if eta is None else round(eta, 3))],
+        )
+        providers = sorted(metrics.providers.items())
+        buckets = []  # type: list[tuple[str, Any]]
+        for provider, x in providers:
+            for bound, count in zip(LATENCY_BUCKETS, x.latency_buckets, strict=True):
+                buckets.append(
+                    (f'_bucket{{provider="{provider}",le="{bound}"}}', count)
+                )
+            buckets.append((f'_bucket{{provider="{provider}",le="+Inf"}}', x.requests))
+            buckets.append((f'_sum{{provider="{provider}"}}', round(x.latency_sum, 6)))
+            buckets.append((f'_count{{provider="{provider}"}}', x.requests))
+        add(
+            "eval_llm_request_duration_seconds",
+            "histogram",
+            "Duration of the LLM requests, by provider.",
+            buckets,
+        )
+        add(
+            "eval_llm_rate_limited_total",
+            "counter",
+            "LLM requests that failed with a 429, by provider.",
+            [(f'{{provider="{x}"}}', y.rate_limited) for x, y in providers],
+        )
+        add(
+            "eval_llm_errors_total",
+            "counter",
+            "LLM requests that failed with another HTTP error, by provider.",
+            [(f'{{provider="{x}"}}', y.errors) for x, y in providers],
+        )
+        add(
+            "eval_llm_tokens_total",
+            "counter",
+            "Tokens used by the evals, by provider and type.",
+            [
+                (f'{{provider="{x}",type="{key}"}}', y.tokens[key])
+                for x, y in providers
+                for key in TOKEN_TYPES
+            ],
+        )
+    return "\n".join(lines) + "\n"
+
+
+_metrics = ContextVar("metrics", default=None)  # type: ContextVar[Metrics | None]
+
+
+@contextmanager
+def use_metrics() -> Iterator[Metrics]:
+    metrics = Metrics()
+    token = _metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _metrics.reset(token)
+
+
+def observe_request(provider: str, elapsed: float, status_code: int | None) -> None:
+    metrics = _metrics.get()
+    if metrics is not None:
+        metrics.observe_request(provider, elapsed, status_code)
+
+
+@contextmanager
+def serve_metrics(metrics: Metrics, port: int) -> Iterator[ThreadingHTTPServer]:
+    """
+    Serve the metrics in the Prometheus text format at
+    `http://127.0.0.1:<port>/metrics` while the block runs.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = to_prometheus(metrics).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextmanager
+def show_progress(metrics: Metrics, interval: float = 1.0) -> Iterator[None]:
+    """
+    Redraw the live view of the metrics on stderr every `interval` seconds
+    while the block runs, leaving its final state when it ends. When stderr is
+    not a terminal, e.g. in CI logs, the view is printed every `RATE_WINDOW`
+    seconds instead. Nothing else should print while the view is redrawn.
+    """
+    stop = threading.Event()
+    tty = sys.stderr.isatty()
+    drawn = 0
+
+    def draw() -> None:
+        nonlocal drawn
+        lines = render_progress(metrics)
+        if tty:
+            # move to the start of the previous view and clear it
+            if drawn > 0:
+                sys.stderr.write(f"\x1b[{drawn}F")
+            sys.stderr.write("\x1b[J")
+            drawn = len(lines)
+        sys.stderr.write("\n".join(lines) + "\n")
+        sys.stderr.flush()
+
+    def run() -> None:
+        while not stop.wait(interval if tty else RATE_WINDOW):
+            draw()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+        draw()
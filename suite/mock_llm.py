@@ -0,0 +1,468 @@
+"""
+Deterministic mock LLM provider, for running evals offline.
+
+Selected with `--model mock:<profile>`. The mock answers each request with the
+gold query of the question found in the prompt (or with the query recorded for
+it in a previous results file), after a latency sampled from the profile's
+distribution, and fails a configurable fraction of the requests with 429 or 5xx
+errors, so that the throughput and the retry/backoff behavior of the suite can
+be measured without calling (or paying for) a real provider.
+
+The same responder backs a pydantic-ai `Model` (used by pgai and the LLM judge)
+and an OpenAI client stand-in (used by the baseline and vanna agents). Each
+agent (and the judge) gets a responder of its own per profile, so the outcomes
+of its requests do not depend on the requests of the other agents run
+alongside it.
+
+Additional profiles can be defined in a JSON file mapping profile names to
+(partial) profiles, whose path is given by the `MOCK_LLM_PROFILES` environment
+variable.
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from functools import cache
+from pathlib import Path
+from typing import Any, Literal, TypedDict
+
+import httpx
+import openai
+from openai.types import CompletionUsage
+from openai.types.chat import (
+    ChatCompletion,
+    ChatCompletionMessage,
+    ParsedChatCompletion,
+    ParsedChatCompletionMessage,
+    ParsedChoice,
+)
+from openai.types.chat.chat_completion import Choice
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    ModelResponseStreamEvent,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    UserPromptPart,
+)
+from pydantic_ai.models import Model, ModelRequestParameters, StreamedResponse
+from pydantic_ai.settings import ModelSettings
+from pydantic_ai.usage import Usage
+from sql_metadata import Parser
+
+from .columnar import load_results
+
+datasets_dir = Path(__file__).resolve().parent.parent / "datasets"
+
+LatencyDistribution = Literal["constant", "uniform", "normal", "lognormal"]
+
+
+class MockProfile(TypedDict):
+    # latency of each request in seconds
+    latency_distribution: LatencyDistribution
+    latency_mean: float
+    latency_stddev: float
+    # fraction of the requests that fail with a 429 or a 503 error
+    rate_limit_error_rate: float
+    server_error_rate: float
+    # token counts of each request, estimated from the text length when None
+    request_tokens: int | None
+    response_tokens: int | None
+    # results file of a previous run to replay the generated queries of,
+    # falling back to the gold query for questions that are not in it
+    replay: str | None
+    seed: int
+
+
+DEFAULT_PROFILE = {
+    "latency_distribution": "constant",
+    "latency_mean": 0.0,
+    "latency_stddev": 0.0,
+    "rate_limit_error_rate": 0.0,
+    "server_error_rate": 0.0,
+    "request_tokens": None,
+    "response_tokens": None,
+    "replay": None,
+    "seed": 0,
+}  # type: MockProfile
+
+PROFILES = {
+    "instant": DEFAULT_PROFILE,
+    "fast": {
+        **DEFAULT_PROFILE,
+        "latency_distribution": "lognormal",
+        "latency_mean": 0.5,
+        "latency_stddev": 0.2,
+    },
+    "realistic": {
+        **DEFAULT_PROFILE,
+        "latency_distribution": "lognormal",
+        "latency_mean": 2.5,
+        "latency_stddev": 1.5,
+        "rate_limit_error_rate": 0.02,
+        "server_error_rate": 0.01,
+    },
+    "flaky": {
+        **DEFAULT_PROFILE,
+        "latency_distribution": "normal",
+        "latency_mean": 1.0,
+        "latency_stddev": 0.3,
+        "rate_limit_error_rate": 0.2,
+        "server_error_rate": 0.1,
+    },
+}  # type: dict[str, MockProfile]
+
+
+def get_profile(name: str) -> MockProfile:
+    profiles = dict(PROFILES)
+    profiles_file = os.environ.get("MOCK_LLM_PROFILES", "")
+    if profiles_file:
+        with open(profiles_file) as fp:
+            for key, value in json.load(fp).items():
+                profiles[key] = {**DEFAULT_PROFILE, **value}
+    if name not in profiles:
+        raise ValueError(
+            f"Invalid mock profile: {name} (available: {', '.join(sorted(profiles))})"
+        )
+    return profiles[name]
+
+
+@cache
+def get_gold_answers() -> dict[str, str]:
+    """
+    Map the questions of all evals to their gold query.
+    """
+    answers = {}
+    for eval_file in sorted(datasets_dir.glob("*/evals/*/eval.json")):
+        with eval_file.open() as fp:
+            inp = json.load(fp)
+        answers[inp["question"]] = inp["query"]
+    return answers
+
+
+def get_replay_answers(results_file: str) -> dict[str, str]:
+    results = load_results(Path(results_file), with_details=True)["results"]
+    answers = {}
+    for dataset in results.values():
+        for result in dataset["evals"]:
+            query = result["details"].get("generated_query")
+            if query:
+                answers[result["question"]] = query
+    return answers
+
+
+def sample_latency(profile: MockProfile, rng: random.Random) -> float:
+    mean = profile["latency_mean"]
+    stddev = profile["latency_stddev"]
+    distribution = profile["latency_distribution"]
+    if distribution == "constant" or mean <= 0:
+        return max(mean, 0.0)
+    if distribution == "uniform":
+        return max(rng.uniform(mean - stddev, mean + stddev), 0.0)
+    if distribution == "normal":
+        return max(rng.gauss(mean, stddev), 0.0)
+    if distribution == "lognormal":
+        # parameters of the underlying normal distribution for the given mean/stddev
+        sigma = math.sqrt(math.log(1 + (stddev / mean) ** 2))
+        return rng.lognormvariate(math.log(mean) - sigma**2 / 2, sigma)
+    raise ValueError(f"Invalid latency distribution: {distribution}")
+
+
+class MockResponse(TypedDict):
+    latency: float
+    status_code: int | None
+    question: str | None
+    query: str
+    request_tokens: int
+    response_tokens: int
+
+
+class MockResponder:
+    """
+    Decides the outcome of each mock request. The outcome is sampled from a
+    random generator seeded with the profile seed, the question and the number
+    of previous attempts for it, so a run is reproducible regardless of the
+    order in which concurrent requests are made. Responders are shared by the
+    threads of an agent (e.g. vanna's), so the attempts are counted under a
+    lock.
+    """
+
+    def __init__(self, profile_name: str):
+        self.profile_name = profile_name
+        self.profile = get_profile(profile_name)
+        self.answers = dict(get_gold_answers())
+        if self.profile["replay"]:
+            self.answers.update(get_replay_answers(self.profile["replay"]))
+        # match the longest questions first, as a question can contain another
+        self.questions = sorted(self.answers, key=len, reverse=True)
+        self.attempts = {}  # type: dict[str, int]
+        self.lock = threading.Lock()
+
+    def find_question(self, prompt: str) -> str | None:
+        for question in self.questions:
+            if question in prompt:
+                return question
+        return None
+
+    def respond(self, prompt: str) -> MockResponse:
+        question = self.find_question(prompt)
+        key = question or prompt
+        with self.lock:
+            attempt = self.attempts.get(key, 0)
+            self.attempts[key] = attempt + 1
+        rng = random.Random(f"{self.profile['seed']}:{attempt}:{key}")
+        status_code = None
+        error = rng.random()
+        if error < self.profile["rate_limit_error_rate"]:
+            status_code = 429
+        elif error < (
+            self.profile["rate_limit_error_rate"] + self.profile["server_error_rate"]
+        ):
+            status_code = 503
+        query = self.answers[question] if question is not None else "SELECT 1"
+        return {
+            "latency": sample_latency(self.profile, rng),
+            "status_code": status_code,
+            "question": question,
+            "query": query,
+            "request_tokens": self.profile["request_tokens"] or len(prompt) // 4,
+            "response_tokens": self.profile["response_tokens"] or len(query) // 4,
+        }
+
+
+def get_tool_args(tool_name: str, response: MockResponse) -> dict[str, Any]:
+    if tool_name == "sql_judge":
+        return {"judgement": True, "explanation": "Mock judgement."}
+    return {
+        "sql_statement": response["query"],
+        "command_type": "SELECT",
+        "relevant_object_ids": [],
+        "relevant_sql_example_ids": [],
+        "relevant_fact_ids": [],
+    }
+
+
+class MockModel(Model):
+    """
+    pydantic-ai model backed by a `MockResponder`. Requests with output tools
+    are answered by calling the first output tool (e.g. pgai's
+    `record_sql_answer` or the `sql_judge` tool of the LLM judge), and other
+    requests with the query as text.
+    """
+
+    def __init__(self, profile_name: str):
+        self.responder = MockResponder(profile_name)
+
+    @property
+    def model_name(self) -> str:
+        return self.responder.profile_name
+
+    @property
+    def system(self) -> str:
+        return "mock"
+
+    def get_prompt(self, messages: list[ModelMessage]) -> str:
+        return "\n".join(
+            str(part.content)
+            for message in messages
+            if isinstance(message, ModelRequest)
+            for part in message.parts
+            if isinstance(part, (SystemPromptPart, UserPromptPart))
+        )
+
+    async def respond(
+        self,
+        messages: list[ModelMessage],
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        response = self.responder.respond(self.get_prompt(messages))
+        await asyncio.sleep(response["latency"])
+        if response["status_code"] is not None:
+            raise ModelHTTPError(response["status_code"], self.model_name, "Mock error")
+        if model_request_parameters.output_tools:
+            tool_name = model_request_parameters.output_tools[0].name
+            parts = [ToolCallPart(tool_name, get_tool_args(tool_name, response))]
+        else:
+            parts = [TextPart(response["query"])]
+        return ModelResponse(
+            parts=parts,
+            usage=Usage(
+                requests=1,
+                request_tokens=response["request_tokens"],
+                response_tokens=response["response_tokens"],
+                total_tokens=response["request_tokens"] + response["response_tokens"],
+            ),
+            model_name=self.model_name,
+        )
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        return await self.respond(messages, model_request_parameters)
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> AsyncIterator[StreamedResponse]:
+        # the whole response is streamed as a single event per part
+        response = await self.respond(messages, model_request_parameters)
+        yield MockStreamedResponse(response)
+
+
+@dataclass
+class MockStreamedResponse(StreamedResponse):
+    response: ModelResponse
+    _timestamp: datetime = field(default_factory=lambda: datetime.now(UTC))
+
+    async def _get_event_iterator(self) -> AsyncIterator[ModelResponseStreamEvent]:
+        self._usage = self.response.usage
+        for i, part in enumerate(self.response.parts):
+            if isinstance(part, ToolCallPart):
+                yield self._parts_manager.handle_tool_call_part(
+                    vendor_part_id=i,
+                    tool_name=part.tool_name,
+                    args=part.args,
+                    tool_call_id=part.tool_call_id,
+                )
+            elif isinstance(part, TextPart):
+                yield self._parts_manager.handle_text_delta(
+                    vendor_part_id=i, content=part.content
+                )
+
+    @property
+    def model_name(self) -> str:
+        return self.response.model_name or "mock"
+
+    @property
+    def timestamp(self) -> datetime:
+        return self._timestamp
+
+
+@cache
+def get_mock_model(profile_name: str, agent: str) -> MockModel:
+    """
+    Get the mock model of a profile for an agent (or the judge).
+    """
+    return MockModel(profile_name)
+
+
+class _Namespace:
+    def __init__(self, **kwargs: Any):
+        self.__dict__.update(kwargs)
+
+
+class MockOpenAI:
+    """
+    Stand-in for the `openai.OpenAI` client, supporting the
+    `chat.completions.create` and `beta.chat.completions.parse` calls made by
+    the baseline and vanna agents. Structured outputs with a `query` field get
+    the query, and ones with a `tables` field get the tables of the query.
+    """
+
+    def __init__(self, profile_name: str):
+        self.responder = MockResponder(profile_name)
+        completions = _Namespace(create=self.create, parse=self.parse)
+        self.chat = _Namespace(completions=completions)
+        self.beta = _Namespace(chat=self.chat)
+
+    def with_options(self, **kwargs: Any) -> "MockOpenAI":
+        # the latency of the mock is sampled from its profile, regardless of
+        # the timeout
+        return self
+
+    def _respond(self, messages: list[dict[str, Any]]) -> MockResponse:
+        prompt = "\n".join(str(x.get("content", "")) for x in messages)
+        response = self.responder.respond(prompt)
+        time.sleep(response["latency"])
+        if response["status_code"] is not None:
+            error_response = httpx.Response(
+                response["status_code"],
+                request=httpx.Request("POST", "http://mock/v1/chat/completions"),
+            )
+            error = (
+                openai.RateLimitError
+                if response["status_code"] == 429
+                else openai.InternalServerError
+            )
+            raise error("Mock error", response=error_response, body=None)
+        return response
+
+    def _completion_fields(self, response: MockResponse) -> dict[str, Any]:
+        return {
+            "id": "mock",
+            "created": int(datetime.now(UTC).timestamp()),
+            "model": self.responder.profile_name,
+            "object": "chat.completion",
+            "usage": CompletionUsage(
+                prompt_tokens=response["request_tokens"],
+                completion_tokens=response["response_tokens"],
+                total_tokens=response["request_tokens"] + response["response_tokens"],
+            ),
+        }
+
+    def create(self, messages: list[dict[str, Any]], **kwargs: Any) -> ChatCompletion:
+        response = self._respond(messages)
+        content = f"```sql\n{response['query']}\n```"
+        return ChatCompletion(
+            choices=[
+                Choice(
+                    finish_reason="stop",
+                    index=0,
+                    message=ChatCompletionMessage(role="assistant", content=content),
+                )
+            ],
+            **self._completion_fields(response),
+        )
+
+    def parse(
+        self, messages: list[dict[str, Any]], response_format: Any, **kwargs: Any
+    ) -> ParsedChatCompletion:
+        response = self._respond(messages)
+        fields = response_format.model_fields
+        if "tables" in fields:
+            try:
+                tables = [x.lower() for x in Parser(response["query"]).tables]
+            except Exception:
+                tables = []
+            parsed = response_format(tables=tables)
+        else:
+            parsed = response_format(query=response["query"])
+        return ParsedChatCompletion(
+            choices=[
+                ParsedChoice(
+                    finish_reason="stop",
+                    index=0,
+                    message=ParsedChatCompletionMessage(
+                        role="assistant",
+                        content=parsed.model_dump_json(),
+                        parsed=parsed,
+                    ),
+                )
+            ],
+            **self._completion_fields(response),
+        )
+
+
+@cache
+def get_mock_openai(profile_name: str, agent: str) -> MockOpenAI:
+    """
+    Get the mock OpenAI client of a profile for an agent.
+    """
+    return MockOpenAI(profile_name)
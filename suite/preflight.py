@@ -0,0 +1,288 @@
+"""
+Static checks of generated queries before they are executed, so that queries
+that are bound to fail do not take a round-trip to the database, and queries
+that would write to the database, which is shared by the evals running
+concurrently, are never executed.
+
+The checks use sqlglot and a snapshot of the schema of each database, taken
+once per run (see `get_schema()`). They are deliberately conservative, as a
+query that Postgres would accept must never be rejected:
+
+- statements other than queries (e.g. DML, DDL, `SELECT ... INTO`) and
+  locking clauses are rejected
+- tables that do not exist in a schema of the snapshot are rejected
+- columns that do not exist in the table they are resolved to are rejected,
+  where unqualified columns are only resolved if every source in their scope
+  is a table of the snapshot, and SQL value functions such as `localtime`
+  or `current_role` are not mistaken for columns. Tables whose alias renames
+  their columns (`users AS u(a, b)`) are not resolved
+
+Queries that sqlglot cannot parse are not rejected, as its grammar does not
+cover all of Postgres', and are left to Postgres instead.
+"""
+
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Literal
+
+import psycopg
+import sqlglot
+from sqlglot import exp
+from sqlglot.optimizer.normalize_identifiers import normalize_identifiers
+from sqlglot.optimizer.scope import Scope, traverse_scope
+
+Status = Literal["ok", "unparsed"]
+
+SCHEMA_QUERY = """
+SELECT n.nspname, c.relname, a.attname
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid
+WHERE n.nspname NOT IN ('pg_catalog', 'information_schema')
+AND n.nspname NOT LIKE 'pg_toast%'
+AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+AND a.attnum > 0
+AND NOT a.attisdropped
+"""
+
+# columns that every table has
+SYSTEM_COLUMNS = {"tableoid", "xmin", "cmin", "xmax", "cmax", "ctid"}
+
+# SQL value functions that are called without parentheses, and that sqlglot
+# parses as columns when unquoted
+VALUE_FUNCTIONS = {
+    "current_catalog",
+    "current_date",
+    "current_role",
+    "current_schema",
+    "current_time",
+    "current_timestamp",
+    "current_user",
+    "localtime",
+    "localtimestamp",
+    "session_user",
+    "system_user",
+    "user",
+}
+
+WRITE_EXPRESSIONS = (
+    exp.Insert,
+    exp.Update,
+    exp.Delete,
+    exp.Merge,
+    exp.Create,
+    exp.Drop,
+    exp.Alter,
+    exp.TruncateTable,
+    exp.Into,
+)
+
+
+class PreflightError(Exception):
+    pass
+
+
+class Schema:
+    def __init__(self, tables: dict[tuple[str, str], set[str]], search_path: list[str]):
+        self.tables = tables
+        self.search_path = search_path
+        self.schemas = {x[0] for x in tables}
+
+    def resolve(self, table: exp.Table) -> tuple[str, str] | None | bool:
+        """
+        Resolve a table of a query to its key in the snapshot. Returns None if
+        it does not exist, and False if the snapshot cannot tell (e.g. tables
+        of the system catalogs).
+        """
+        if table.catalog or not isinstance(table.this, exp.Identifier):
+            return False
+        name = table.name
+        if table.db:
+            if table.db not in self.schemas:
+                return False
+            return (table.db, name) if (table.db, name) in self.tables else None
+        if name.startswith("pg_"):
+            return False
+        for schema in self.search_path:
+            if (schema, name) in self.tables:
+                return schema, name
+        return None
+
+
+class SchemaCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.schemas = {}  # type: dict[tuple[str, int, str], Schema]
+        self.checked = 0
+        self.rejected = 0
+
+    def count(self, rejected: bool) -> None:
+        with self.lock:
+            self.checked += 1
+            if rejected:
+                self.rejected += 1
+
+    def get_schema(self, conn: psycopg.Connection) -> Schema:
+        info = (conn.info.host, conn.info.port, conn.info.dbname)
+        with self.lock:
+            if info in self.schemas:
+                return self.schemas[info]
+        schema = get_schema(conn)
+        with self.lock:
+            self.schemas[info] = schema
+        return schema
+
+
+_schema_cache = ContextVar("schema_cache", default=None)  # type: ContextVar[SchemaCache | None]
+
+
+@contextmanager
+def use_preflight() -> Iterator[SchemaCache]:
+    cache = SchemaCache()
+    token = _schema_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _schema_cache.reset(token)
+
+
+def get_schema(conn: psycopg.Connection) -> Schema:
+    tables = {}  # type: dict[tuple[str, str], set[str]]
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_QUERY)
+        for schema, table, column in cur.fetchall():
+            tables.setdefault((schema, table), set()).add(column)
+        cur.execute("SELECT current_schemas(false)")
+        search_path = list(cur.fetchone()[0])
+    return Schema(tables, search_path)
+
+
+def get_table_columns(source: exp.Table, schema: Schema) -> set[str] | None:
+    """
+    Get the columns of a table of a query, or None if they are not known,
+    e.g. when its alias renames them (`users AS u(a, b)`), as the snapshot
+    does not keep the order of the columns.
+    """
+    alias = source.args.get("alias")
+    if alias is not None and alias.columns:
+        return None
+    key = schema.resolve(source)
+    return schema.tables[key] if key else None
+
+
+def get_source_columns(scope: Scope, name: str, schema: Schema) -> set[str] | None:
+    """
+    Get the columns of the source that a qualifier refers to in the scope or
+    the scopes enclosing it, or None if they are not known.
+    """
+    while scope is not None:
+        if name in scope.sources:
+            source = scope.sources[name]
+            if not isinstance(source, exp.Table):
+                return None
+            return get_table_columns(source, schema)
+        scope = scope.parent
+    return None
+
+
+def check_columns(scope: Scope, columns: list[exp.Column], schema: Schema) -> None:
+    # unqualified columns are only resolved if all sources they could refer
+    # to, including those of enclosing scopes, are known tables
+    known = set()  # type: set[str]
+    names = set()  # type: set[str]
+    resolvable = True
+    current = scope  # type: Scope | None
+    while current is not None:
+        names.update(current.sources.keys())
+        if isinstance(current.expression, exp.Select):
+            names.update(
+                x.alias for x in current.expression.selects if isinstance(x, exp.Alias)
+            )
+        for source in current.sources.values():
+            source_columns = (
+                get_table_columns(source, schema)
+                if isinstance(source, exp.Table)
+                else None
+            )
+            if source_columns is None:
+                resolvable = False
+            else:
+                known.update(source_columns)
+        current = current.parent
+    resolvable = resolvable and len(scope.sources) > 0
+
+    for column in columns:
+        name = column.name
+        if not name or name == "*" or name in SYSTEM_COLUMNS:
+            continue
+        if not column.table and not column.this.quoted and name in VALUE_FUNCTIONS:
+            continue
+        if column.table:
+            source_columns = get_source_columns(scope, column.table, schema)
+            if source_columns is not None and name not in source_columns:
+                raise PreflightError(f"column {column.table}.{name} does not exist")
+        elif resolvable and name not in known and name not in names:
+            raise PreflightError(f"column {name} does not exist")
+
+
+def check_statement(statement: exp.Expression, schema: Schema) -> None:
+    if not isinstance(statement, (exp.Query, exp.Values)):
+        # statements that sqlglot does not support are parsed as commands
+        kind = statement.name if isinstance(statement, exp.Command) else statement.key
+        raise PreflightError(f"{kind.upper()} statements are not allowed, only queries")
+    for node in statement.find_all(*WRITE_EXPRESSIONS, exp.Lock):
+        if isinstance(node, exp.Lock):
+            raise PreflightError("locking clauses are not allowed")
+        raise PreflightError(f"{node.key.upper()} is not allowed, only queries")
+    # scopes are traversed innermost first, and the columns of a subquery are
+    # also listed in the scopes enclosing it, so each column is checked in the
+    # innermost scope only
+    checked = set()  # type: set[int]
+    for scope in traverse_scope(statement):
+        for source in scope.sources.values():
+            if isinstance(source, exp.Table) and schema.resolve(source) is None:
+                raise PreflightError(f'relation "{source.sql()}" does not exist')
+        columns = [x for x in scope.columns if id(x) not in checked]
+        checked.update(id(x) for x in columns)
+        check_columns(scope, columns, schema)
+
+
+def check_query(query: str, schema: Schema) -> Status:
+    """
+    Check a query against the schema of its database, raising a
+    `PreflightError` if it would certainly fail or write to the database.
+    """
+    try:
+        statements = sqlglot.parse(query, read="postgres")
+    except sqlglot.errors.SqlglotError:
+        return "unparsed"
+    statements = [x for x in statements if x is not None]
+    if len(statements) == 0:
+        raise PreflightError("query is empty")
+    for statement in statements:
+        try:
+            statement = normalize_identifiers(statement, dialect="postgres")
+            check_statement(statement, schema)
+        except sqlglot.errors.SqlglotError:
+            # e.g. scopes that sqlglot cannot build
+            return "unparsed"
+    return "ok"
+
+
+def preflight(query: str, conn: psycopg.Connection) -> Status | None:
+    """
+    Check a generated query if preflight checks are active, returning None if
+    they are not.
+    """
+    cache = _schema_cache.get()
+    if cache is None:
+        return None
+    try:
+        status = check_query(query, cache.get_schema(conn))
+    except PreflightError:
+        cache.count(rejected=True)
+        raise
+    cache.count(rejected=False)
+    return status
@@ -0,0 +1,206 @@
+"""
+Cache of the results of generated queries, so that a query that was generated
+before (by another agent or model, or in a previous run) is evaluated without
+executing it again.
+
+Queries are keyed by their text as normalized by sqlglot, so that queries that
+only differ in formatting, casing of keywords or quoting share an entry, along
+with a fingerprint of the database (see `get_database_fingerprint()`), so that
+entries are not used after the database was reloaded or written to. Results are
+stored as Parquet files in `results/query_cache/`, and queries that failed with
+an error that does not depend on the load of the database (e.g. a syntax error
+or an unknown column) are cached as such.
+"""
+
+import hashlib
+import json
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+import polars as pl
+import psycopg
+import sqlglot
+from sqlglot import exp
+from sqlglot.optimizer.normalize_identifiers import normalize_identifiers
+
+FINGERPRINT_QUERY = """
+SELECT
+    coalesce(md5(string_agg(
+        c.oid::text || ':' || c.relfilenode::text || ':'
+        || coalesce(s.n_tup_ins + s.n_tup_upd + s.n_tup_del, 0)::text,
+        ',' ORDER BY c.oid
+    )), '')
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE n.nspname NOT IN ('pg_catalog', 'information_schema')
+AND n.nspname NOT LIKE 'pg_toast%'
+AND c.relkind IN ('r', 'p', 'm', 'v')
+"""
+
+
+class CachedQueryError(Exception):
+    pass
+
+
+class QueryCache:
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.key_locks = {}  # type: dict[str, threading.Lock]
+        self.fingerprints = {}  # type: dict[tuple[str, int, str], str]
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, hit: bool) -> None:
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_lock(self, key: str) -> threading.Lock:
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def get_fingerprint(self, conn: psycopg.Connection) -> str:
+        info = (conn.info.host, conn.info.port, conn.info.dbname)
+        with self.lock:
+            if info in self.fingerprints:
+                return self.fingerprints[info]
+        fingerprint = get_database_fingerprint(conn)
+        with self.lock:
+            self.fingerprints[info] = fingerprint
+        return fingerprint
+
+    def read(self, key: str) -> pl.DataFrame | None:
+        """
+        Get the cached result of the query with the given key, raising a
+        `CachedQueryError` if the query failed.
+        """
+        error_file = self.cache_dir / f"{key}.error.json"
+        if error_file.exists():
+            with error_file.open() as fp:
+                raise CachedQueryError(json.load(fp)["error"])
+        result_file = self.cache_dir / f"{key}.parquet"
+        if not result_file.exists():
+            return None
+        try:
+            return pl.read_parquet(result_file)
+        except Exception:
+            return None
+
+    def write(self, key: str, result: pl.DataFrame) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        result_file = self.cache_dir / f"{key}.parquet"
+        tmp_file = result_file.with_suffix(".tmp")
+        try:
+            result.write_parquet(tmp_file)
+        except Exception:
+            # e.g. columns of types that have no Parquet equivalent
+            tmp_file.unlink(missing_ok=True)
+            return
+        tmp_file.replace(result_file)
+
+    def write_error(self, key: str, error: str) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with (self.cache_dir / f"{key}.error.json").open("w") as fp:
+            json.dump({"error": error}, fp)
+
+
+_query_cache = ContextVar("query_cache", default=None)  # type: ContextVar[QueryCache | None]
+
+
+@contextmanager
+def use_query_cache(cache_dir: Path) -> Iterator[QueryCache]:
+    cache = QueryCache(cache_dir)
+    token = _query_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _query_cache.reset(token)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize the formatting, keyword casing and identifier quoting of a query,
+    falling back to collapsing its whitespace if sqlglot cannot parse it.
+    """
+    try:
+        expressions = sqlglot.parse(query, read="postgres")
+    except sqlglot.errors.SqlglotError:
+        return " ".join(query.split())
+    normalized = []
+    for expression in expressions:
+        if expression is None:
+            continue
+        expression = normalize_identifiers(expression, dialect="postgres")
+        # quoting a lowercase identifier does not change what it refers to, the
+        # unquoted text is only used for the key and is never executed
+        for identifier in expression.find_all(exp.Identifier):
+            if identifier.quoted and identifier.this == identifier.this.lower():
+                identifier.set("quoted", False)
+        normalized.append(expression.sql(dialect="postgres"))
+    return ";".join(normalized)
+
+
+def get_database_fingerprint(conn: psycopg.Connection) -> str:
+    """
+    Fingerprint the server, database and the tables in it (by their storage
+    files), along with the number of rows written to them, so that the
+    fingerprint changes when the database is reloaded or its data is modified.
+    """
+    with conn.cursor() as cur:
+        cur.execute(FINGERPRINT_QUERY)
+        tables = cur.fetchone()[0]
+    return hashlib.sha256(
+        f"{conn.info.host}:{conn.info.port}:{conn.info.dbname}:{tables}".encode("utf-8")
+    ).hexdigest()
+
+
+def get_cache_key(fingerprint: str, query: str) -> str:
+    return hashlib.sha256(
+        f"{fingerprint}:{normalize_query(query)}".encode("utf-8")
+    ).hexdigest()
+
+
+def is_cacheable_error(error: psycopg.Error) -> bool:
+    # errors of the query itself, rather than e.g. of a timeout or connection
+    return isinstance(error, (psycopg.ProgrammingError, psycopg.DataError))
+
+
+def get_cached_dataframe(
+    query: str,
+    conn: psycopg.Connection,
+    get_dataframe: Callable[[str, psycopg.Connection], pl.DataFrame],
+) -> tuple[pl.DataFrame, bool]:
+    """
+    Get the result of the query from the active cache, executing it with
+    `get_dataframe` on a miss. Returns the result and whether it was cached.
+    """
+    cache = _query_cache.get()
+    if cache is None:
+        return get_dataframe(query, conn), False
+    key = get_cache_key(cache.get_fingerprint(conn), query)
+    # concurrent runs that generated the same query wait for the first one
+    with cache.get_lock(key):
+        try:
+            cached = cache.read(key)
+        except CachedQueryError:
+            cache.count(hit=True)
+            raise
+        if cached is not None:
+            cache.count(hit=True)
+            return cached, True
+        cache.count(hit=False)
+        try:
+            result = get_dataframe(query, conn)
+        except psycopg.Error as e:
+            if is_cacheable_error(e):
+                cache.write_error(key, str(e))
+            raise
+        cache.write(key, result)
+    return result, False
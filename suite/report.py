@@ -0,0 +1,94 @@
+"""
+Aggregation of the evals of one or more results files for `generate_report`.
+
+The evals of all results files are concatenated into a single polars frame
+(see `columnar.to_frame()`), and every slice of the report (by dataset, by
+database, by error class) is a group-by over it, so that a new slice is a new
+group-by rather than another loop over the evals.
+"""
+
+import polars as pl
+
+from .columnar import TIMING_PREFIX
+from .sharding import USAGE_KEYS
+from .timing import PRECISION, PhaseSummary
+
+COST_KEYS = [x for x in USAGE_KEYS if x.endswith("_cost")]
+
+
+def concat_frames(frames: list[pl.DataFrame]) -> pl.DataFrame:
+    # results files only have timing columns for the phases of their evals
+    return pl.concat(frames, how="diagonal_relaxed")
+
+
+def summarize_usage(df: pl.DataFrame) -> dict[str, float]:
+    return df.select(pl.col(USAGE_KEYS).fill_null(0).sum()).row(0, named=True)
+
+
+def summarize_timings(df: pl.DataFrame) -> dict[str, PhaseSummary]:
+    """
+    Aggregate the per phase timings of the evals into p50/p95/max per phase,
+    like `timing.summarize_phases()`.
+    """
+    columns = sorted(x for x in df.columns if x.startswith(TIMING_PREFIX))
+    if len(columns) == 0:
+        return {}
+    row = df.select(
+        expr
+        for x in columns
+        for expr in [
+            pl.col(x).count().alias(f"{x}:count"),
+            pl.col(x).quantile(0.5, "linear").alias(f"{x}:p50"),
+            pl.col(x).quantile(0.95, "linear").alias(f"{x}:p95"),
+            pl.col(x).max().alias(f"{x}:max"),
+        ]
+    ).row(0, named=True)
+    return {
+        x.removeprefix(TIMING_PREFIX): {
+            "count": row[f"{x}:count"],
+            "p50": round(row[f"{x}:p50"], PRECISION),
+            "p95": round(row[f"{x}:p95"], PRECISION),
+            "max": round(row[f"{x}:max"], PRECISION),
+        }
+        for x in columns
+        if row[f"{x}:count"] > 0
+    }
+
+
+def get_breakdown(df: pl.DataFrame, by: list[str]) -> pl.DataFrame:
+    """
+    Get the pass rate, duration percentiles and cost per passing eval of the
+    evals grouped by the given columns.
+    """
+    return (
+        df.group_by(by)
+        .agg(
+            pl.len().alias("total"),
+            (pl.col("status") == "pass").sum().alias("passing"),
+            (pl.col("status") == "fail").sum().alias("failed"),
+            (pl.col("status") == "error").sum().alias("errored"),
+            pl.col("duration").sum().alias("duration"),
+            pl.col("duration").quantile(0.5, "linear").alias("duration_p50"),
+            pl.col("duration").quantile(0.95, "linear").alias("duration_p95"),
+            pl.sum_horizontal(pl.col(COST_KEYS).fill_null(0)).sum().alias("cost"),
+        )
+        .with_columns(
+            (pl.col("passing") / pl.col("total")).alias("pass_rate"),
+            pl.when(pl.col("passing") > 0)
+            .then(pl.col("cost") / pl.col("passing"))
+            .alias("cost_per_pass"),
+        )
+        .sort(by)
+    )
+
+
+def get_error_counts(df: pl.DataFrame, by: list[str]) -> pl.DataFrame:
+    """
+    Count the errored evals by exception class, within the given columns.
+    """
+    return (
+        df.filter(pl.col("status") == "error")
+        .group_by([*by, "exception_class"])
+        .agg(pl.len().alias("count"))
+        .sort([*by, "exception_class"])
+    )
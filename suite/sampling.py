@@ -0,0 +1,221 @@
+"""
+Stratified, reproducible sampling of the evals of a dataset, along with the
+estimate and confidence interval of the pass rate of the whole dataset from
+the sampled evals.
+
+Evals are stratified by their database, and optionally by the complexity of
+their gold query, and the sample is allocated to the strata in proportion to
+their size so that small databases are not left out. The complexity of the
+gold queries is kept in an index at `results/sampling/<dataset>.json`, so that
+they are only parsed again when they change.
+"""
+
+import hashlib
+import json
+import math
+import random
+from pathlib import Path
+from typing import Any, Literal, TypedDict
+
+import click
+import sqlglot
+from sqlglot import exp
+
+Complexity = Literal["simple", "medium", "complex", "unknown"]
+
+# z score of the two-sided 95% confidence interval
+Z_95 = 1.96
+
+
+class Stratum(TypedDict):
+    population: int
+    evals: list[str]
+
+
+class Sample(TypedDict):
+    seed: int
+    size: int
+    population: int
+    by_complexity: bool
+    strata: dict[str, Stratum]
+
+
+class PassRate(TypedDict):
+    estimate: float
+    low: float
+    high: float
+
+
+class SampleParamType(click.ParamType):
+    """
+    Either a number of evals (e.g. `50`) or a fraction of them (e.g. `0.1`).
+    """
+
+    name = "N|fraction"
+
+    def convert(self, value: Any, param: Any, ctx: Any) -> int | float:
+        if isinstance(value, (int, float)):
+            return value
+        try:
+            if "." not in value:
+                size = int(value)
+                if size >= 1:
+                    return size
+            else:
+                fraction = float(value)
+                if 0 < fraction <= 1:
+                    return fraction
+        except ValueError:
+            pass
+        self.fail(f"{value!r} is not a positive count or a fraction in (0, 1]")
+
+
+def get_complexity(query: str) -> Complexity:
+    """
+    Bucket a gold query by the number of joins, subqueries, set operations,
+    window functions and groupings it uses.
+    """
+    try:
+        ast = sqlglot.parse_one(query, read="postgres")
+    except sqlglot.errors.ParseError:
+        return "unknown"
+    score = (
+        len(list(ast.find_all(exp.Join)))
+        + len(list(ast.find_all(exp.Select)))
+        - 1
+        + len(list(ast.find_all(exp.Union, exp.Intersect, exp.Except)))
+        + len(list(ast.find_all(exp.Window)))
+        + len(list(ast.find_all(exp.Group, exp.Having)))
+    )
+    if score == 0:
+        return "simple"
+    if score <= 2:
+        return "medium"
+    return "complex"
+
+
+def get_complexity_index(
+    results_dir: Path, dataset: str, queries: dict[str, str]
+) -> dict[str, Complexity]:
+    """
+    Get the complexity of the gold queries of a dataset (eval name -> query),
+    re-parsing only the queries that changed since the index was written.
+    """
+    index_file = results_dir / "sampling" / f"{dataset}.json"
+    index = {}  # type: dict[str, dict[str, str]]
+    if index_file.exists():
+        with index_file.open() as fp:
+            index = json.load(fp)
+    changed = False
+    for name, query in queries.items():
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        if name not in index or index[name]["sha1"] != digest:
+            index[name] = {"sha1": digest, "complexity": get_complexity(query)}
+            changed = True
+    if changed:
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        with index_file.open("w") as fp:
+            json.dump(index, fp, indent=2, sort_keys=True)
+    return {name: index[name]["complexity"] for name in queries}
+
+
+def allocate(populations: dict[str, int], size: int) -> dict[str, int]:
+    """
+    Allocate the sample size to the strata in proportion to their population,
+    using the largest remainders for the rounding. Each stratum gets at least
+    one eval if the sample is large enough for that.
+    """
+    total = sum(populations.values())
+    size = min(size, total)
+    allocation = {}  # type: dict[str, int]
+    remainders = {}  # type: dict[str, float]
+    floor = 1 if size >= len(populations) else 0
+    for key, population in populations.items():
+        share = size * population / total
+        allocation[key] = min(population, max(floor, math.floor(share)))
+        remainders[key] = share - math.floor(share)
+    keys = sorted(populations.keys(), key=lambda x: (-remainders[x], x))
+    while sum(allocation.values()) < size:
+        for key in keys:
+            if sum(allocation.values()) == size:
+                break
+            if allocation[key] < populations[key]:
+                allocation[key] += 1
+    while sum(allocation.values()) > size:
+        # the floor of one per stratum can overshoot, take from the largest
+        key = max(keys, key=lambda x: (allocation[x], x))
+        allocation[key] -= 1
+    return allocation
+
+
+def sample_evals(
+    dataset: str,
+    evals: dict[str, str],
+    sample: int | float,
+    seed: int,
+    complexities: dict[str, Complexity] | None = None,
+) -> Sample:
+    """
+    Draw a stratified sample of the evals (eval name -> database). The strata
+    are the databases, split by complexity if `complexities` is given. The same
+    seed always draws the same sample of a dataset.
+    """
+    strata = {}  # type: dict[str, list[str]]
+    for name in sorted(evals.keys()):
+        key = evals[name]
+        if complexities is not None:
+            key = f"{key}/{complexities[name]}"
+        strata.setdefault(key, []).append(name)
+    size = sample if isinstance(sample, int) else math.ceil(sample * len(evals))
+    allocation = allocate({k: len(v) for k, v in strata.items()}, size)
+    rng = random.Random(f"{seed}:{dataset}")
+    return {
+        "seed": seed,
+        "size": sum(allocation.values()),
+        "population": len(evals),
+        "by_complexity": complexities is not None,
+        "strata": {
+            key: {
+                "population": len(strata[key]),
+                "evals": sorted(rng.sample(strata[key], allocation[key])),
+            }
+            for key in sorted(strata.keys())
+        },
+    }
+
+
+def estimate_pass_rate(
+    strata: dict[str, Stratum], statuses: dict[str, str], z: float = Z_95
+) -> PassRate:
+    """
+    Estimate the pass rate of the whole population from the statuses (eval
+    name -> status) of the sampled evals of each stratum, weighting the strata
+    by their population.
+
+    The variance uses the finite population correction, so that a stratum that
+    was run in full adds no error, and a Laplace smoothed pass rate, so that a
+    stratum where every sampled eval passed (or failed) is not taken as certain.
+    """
+    # strata without any eval that ran (e.g. skipped by the budget) are left
+    # out, rather than being counted as failing
+    ran_strata = [
+        (x["population"], [statuses[y] for y in x["evals"] if y in statuses])
+        for x in strata.values()
+    ]
+    ran_strata = [x for x in ran_strata if len(x[1]) > 0]
+    population = sum(x[0] for x in ran_strata)
+    estimate = 0.0
+    variance = 0.0
+    for stratum_population, ran in ran_strata:
+        weight = stratum_population / population
+        passing = sum(1 for x in ran if x == "pass")
+        estimate += weight * passing / len(ran)
+        smoothed = (passing + 1) / (len(ran) + 2)
+        correction = 1 - len(ran) / stratum_population
+        variance += weight**2 * correction * smoothed * (1 - smoothed) / len(ran)
+    margin = z * math.sqrt(variance)
+    return {
+        "estimate": round(estimate, 4),
+        "low": round(max(0.0, estimate - margin), 4),
+        "high": round(min(1.0, estimate + margin), 4),
+    }
@@ -0,0 +1,163 @@
+"""
+Resource governed execution of generated queries, so that a runaway query
+(e.g. an accidental cross join) cannot saturate the database that is shared by
+the evals running concurrently.
+
+Within `use_sandbox()`, generated queries are run in a `READ ONLY` transaction
+of their own, with a `statement_timeout`, `work_mem` and `temp_file_limit`
+that only apply to that transaction. Their rows are fetched in batches from a
+server-side cursor, and the query is cancelled once it returns more than
+`max_rows` rows or runs longer than its timeout.
+"""
+
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, TypedDict
+
+import polars as pl
+import psycopg
+from psycopg.pq import TransactionStatus
+
+FETCH_SIZE = 10000
+
+
+class Limits(TypedDict):
+    statement_timeout: int  # milliseconds
+    work_mem: str
+    temp_file_limit: str
+    max_rows: int
+
+
+class QueryUsage(TypedDict):
+    rows: int
+    bytes: int
+    duration: float
+
+
+DEFAULT_LIMITS = {
+    "statement_timeout": 120000,
+    "work_mem": "64MB",
+    "temp_file_limit": "1GB",
+    "max_rows": 1000000,
+}  # type: Limits
+
+
+class BudgetExceededError(Exception):
+    pass
+
+
+_limits = ContextVar("sandbox_limits", default=None)  # type: ContextVar[Limits | None]
+
+
+@contextmanager
+def use_sandbox(limits: Limits) -> Iterator[None]:
+    token = _limits.set(limits)
+    try:
+        yield
+    finally:
+        _limits.reset(token)
+
+
+def get_limits() -> Limits:
+    """
+    Get the limits of the active sandbox, or the defaults outside of one.
+    """
+    return _limits.get() or DEFAULT_LIMITS
+
+
+def to_dataframe(data: list[tuple[Any, ...]], colnames: list[str]) -> pl.DataFrame:
+    """
+    Build a frame of the rows of a query, appending the index of a column to
+    its name if the name is not unique.
+    """
+    colnames = list(colnames)
+    counter = Counter(colnames)
+    for i, colname in enumerate(colnames):
+        if counter[colname] > 1:
+            colnames[i] = f"{colname}_{i}"
+    return pl.DataFrame(data, schema=colnames, orient="row")
+
+
+def execute_sandboxed(
+    query: str, conn: psycopg.Connection, limits: Limits
+) -> pl.DataFrame:
+    # the settings must not outlive the query, so it gets a transaction of its
+    # own rather than a savepoint of the transaction that is already open
+    status = conn.info.transaction_status
+    if status == TransactionStatus.INTRANS:
+        conn.commit()
+    elif status == TransactionStatus.INERROR:
+        conn.rollback()
+    start = time.perf_counter()
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION READ ONLY")
+            cur.execute(
+                "SELECT set_config('statement_timeout', %s, true),"
+                " set_config('work_mem', %s, true),"
+                " set_config('temp_file_limit', %s, true),"
+                # the whole result is fetched, so plan for that rather than for
+                # the first rows as is the default for cursors
+                " set_config('cursor_tuple_fraction', '1', true)",
+                (
+                    str(int(limits["statement_timeout"])),
+                    limits["work_mem"],
+                    limits["temp_file_limit"],
+                ),
+            )
+        # a server-side cursor can only run a single statement, without the
+        # terminating semicolon
+        with conn.cursor(name="generated_query") as cur:
+            cur.execute(query.strip().rstrip(";").rstrip())
+            data = []  # type: list[tuple[Any, ...]]
+            while True:
+                rows = cur.fetchmany(FETCH_SIZE)
+                if len(rows) == 0:
+                    break
+                data.extend(rows)
+                if len(data) > limits["max_rows"]:
+                    raise BudgetExceededError(
+                        f"Query returned more than {limits['max_rows']} rows"
+                    )
+                # the timeout applies to each fetch, rather than to the query
+                if (time.perf_counter() - start) * 1000 > limits["statement_timeout"]:
+                    raise BudgetExceededError(
+                        f"Query ran longer than {limits['statement_timeout']} ms"
+                    )
+            colnames = [desc.name for desc in cur.description]
+    return to_dataframe(data, colnames)
+
+
+def get_sandboxed_dataframe(
+    query: str,
+    conn: psycopg.Connection,
+    get_dataframe: Callable[[str, psycopg.Connection], pl.DataFrame],
+) -> tuple[pl.DataFrame, QueryUsage]:
+    """
+    Execute a generated query in the active sandbox, or with `get_dataframe`
+    outside of one. Returns its result and resource usage.
+    """
+    limits = _limits.get()
+    start = time.perf_counter()
+    if limits is None:
+        result = get_dataframe(query, conn)
+    else:
+        result = execute_sandboxed(query, conn, limits)
+    return result, {
+        "rows": result.height,
+        "bytes": int(result.estimated_size()),
+        "duration": round(time.perf_counter() - start, 3),
+    }
+
+
+def check_rows(result: pl.DataFrame) -> None:
+    """
+    Check that a result that was not executed in the active sandbox (e.g. a
+    cached one) is within its row limit, as if it had been.
+    """
+    limits = _limits.get()
+    if limits is not None and result.height > limits["max_rows"]:
+        raise BudgetExceededError(f"Query returned more than {limits['max_rows']} rows")
@@ -0,0 +1,139 @@
+"""
+Sharding of an eval run across multiple machines, and merging of the results
+of the shards back into a single results file.
+
+The evals of each dataset are dealt over the shards in the order of a hash of
+their names, so that each shard gets the same number of evals, and a mix of
+slow and fast ones. The partition only depends on the eval names, and not on
+the history of eval durations, which every run (including the run of another
+shard) rewrites, so the shards cover each eval exactly once even when run one
+after another, which `merge_results()` checks.
+"""
+
+import hashlib
+from typing import Any, TypedDict
+
+import click
+
+from .sampling import estimate_pass_rate
+from .timing import summarize_phases
+
+USAGE_KEYS = [
+    "cached_tokens",
+    "cached_tokens_cost",
+    "request_tokens",
+    "request_tokens_cost",
+    "response_tokens",
+    "response_tokens_cost",
+]
+
+
+class Shard(TypedDict):
+    index: int
+    count: int
+    population: int
+
+
+class ShardParamType(click.ParamType):
+    """
+    A shard given as `i/N`, where `i` is 1-based.
+    """
+
+    name = "i/N"
+
+    def convert(self, value: Any, param: Any, ctx: Any) -> tuple[int, int]:
+        if isinstance(value, tuple):
+            return value
+        try:
+            index, count = (int(x) for x in value.split("/"))
+        except ValueError:
+            self.fail(f"{value!r} is not of the form i/N")
+        if count < 1 or index < 1 or index > count:
+            self.fail(f"{value!r} is not a shard between 1/N and N/N")
+        return index, count
+
+
+def get_shard_key(name: str) -> str:
+    return hashlib.sha256(name.encode()).hexdigest()
+
+
+def partition(names: list[str], count: int) -> list[list[str]]:
+    """
+    Partition the evals into `count` shards of equal size (give or take one).
+    """
+    shards = [[] for _ in range(count)]  # type: list[list[str]]
+    for i, name in enumerate(sorted(names, key=lambda x: (get_shard_key(x), x))):
+        shards[i % count].append(name)
+    return [sorted(x) for x in shards]
+
+
+def merge_results(shards: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Merge the results of the shards of a run into the results of the whole
+    run, recomputing the aggregates of each dataset from its evals.
+    """
+    if len(shards) == 0:
+        raise ValueError("No results to merge")
+    tasks = {x["task"] for x in shards}
+    if len(tasks) > 1:
+        raise ValueError(f"Results are of different tasks: {sorted(tasks)}")
+    details = dict(shards[0]["details"])
+    details.pop("shard", None)
+    details["shards"] = [x["details"].get("shard") for x in shards]
+    if any("judge_usage" in x["details"] for x in shards):
+        details["judge_usage"] = {
+            key: sum(x["details"].get("judge_usage", {}).get(key, 0) for x in shards)
+            for key in USAGE_KEYS
+        }
+    merged = {
+        "task": shards[0]["task"],
+        "start_time": min(x["start_time"] for x in shards),
+        "end_time": max((x["end_time"] for x in shards if x["end_time"]), default=None),
+        "details": details,
+        "results": {},
+    }  # type: dict[str, Any]
+
+    for dataset in sorted({y for x in shards for y in x["results"]}):
+        parts = [x["results"][dataset] for x in shards if dataset in x["results"]]
+        evals = sorted((y for x in parts for y in x["evals"]), key=lambda x: x["name"])
+        names = [x["name"] for x in evals]
+        duplicates = sorted({x for x in names if names.count(x) > 1})
+        if len(duplicates) > 0:
+            raise ValueError(f"Evals of {dataset} are in multiple shards: {duplicates}")
+        skipped = sorted(y for x in parts for y in x.get("skipped", []))
+        population = max(
+            (x["shard"]["population"] for x in parts if "shard" in x), default=0
+        )
+        if len(evals) + len(skipped) < population:
+            print(
+                f"Warning: shards of {dataset} are missing evals, were they run"
+                " with different evals or samples?"
+            )
+        failed_error_counts = {}  # type: dict[str, int]
+        for part in parts:
+            for error, count in part["failed_error_counts"].items():
+                failed_error_counts[error] = failed_error_counts.get(error, 0) + count
+        dataset_results = {
+            "passing": sum(1 for x in evals if x["status"] == "pass"),
+            "total": len(evals),
+            "total_duration": round(sum(x["total_duration"] for x in parts), 3),
+            "usage": {
+                key: sum(x["usage"][key] for x in parts if "usage" in x)
+                for key in USAGE_KEYS
+            },
+            "timings": summarize_phases(evals),
+            "failed": sorted(y for x in parts for y in x["failed"]),
+            "failed_error_counts": failed_error_counts,
+            "errored": sorted(y for x in parts for y in x["errored"]),
+            "evals": evals,
+            "skipped": skipped,
+        }  # type: dict[str, Any]
+        samples = [x["sample"] for x in parts if "sample" in x]
+        if len(samples) > 0:
+            # every shard draws the same sample before partitioning it
+            dataset_results["sample"] = samples[0]
+            dataset_results["pass_rate"] = estimate_pass_rate(
+                samples[0]["strata"], {x["name"]: x["status"] for x in evals}
+            )
+        merged["results"][dataset] = dataset_results
+    return merged
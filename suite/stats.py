@@ -0,0 +1,58 @@
+import math
+from collections.abc import Iterable
+from typing import TypedDict
+
+
+class TimingSummary(TypedDict):
+    count: int
+    min: float
+    max: float
+    avg: float
+    p50: float
+    p95: float
+    p99: float
+
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """
+    Get the given percentile (0-100) of the values, using linear interpolation
+    between the closest ranks. Returns 0.0 for an empty input.
+    """
+    ordered = sorted(values)
+    if len(ordered) == 0:
+        return 0.0
+    if pct < 0 or pct > 100:
+        raise ValueError(f"Invalid percentile: {pct}")
+    rank = (len(ordered) - 1) * pct / 100
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return ordered[lower]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(values: Iterable[float], precision: int = 5) -> TimingSummary:
+    """
+    Summarize a list of timings (in seconds) into count/min/max/avg and the
+    p50/p95/p99 percentiles.
+    """
+    values = list(values)
+    if len(values) == 0:
+        return {
+            "count": 0,
+            "min": 0.0,
+            "max": 0.0,
+            "avg": 0.0,
+            "p50": 0.0,
+            "p95": 0.0,
+            "p99": 0.0,
+        }
+    return {
+        "count": len(values),
+        "min": round(min(values), precision),
+        "max": round(max(values), precision),
+        "avg": round(sum(values) / len(values), precision),
+        "p50": round(percentile(values, 50), precision),
+        "p95": round(percentile(values, 95), precision),
+        "p99": round(percentile(values, 99), precision),
+    }
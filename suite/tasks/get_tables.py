@@ -6,6 +6,7 @@ from sql_metadata import Parser
 
 from ..agents import AgentFn
 from ..exceptions import AgentFnError
+from ..timing import span
 from ..types import Provider
 
 
@@ -23,9 +24,11 @@ async def run(
     provider: Provider,
     model: str,
     strict: bool,
+    output_path: str | None = None,
 ) -> bool:
-    if os.path.exists(f"{path}/actual_get_tables.json"):
-        os.unlink(f"{path}/actual_get_tables.json")
+    output_path = output_path or path
+    if os.path.exists(f"{output_path}/actual_get_tables.json"):
+        os.unlink(f"{output_path}/actual_get_tables.json")
     with open(f"{path}/eval.json", "r") as fp:
         query = json.load(fp).get("query")
     try:
@@ -34,7 +37,8 @@ async def run(
         raise AgentFnError(e) from e
     # normalize table names as query uses mix of uppercase/lowercase to reference them
     expected = list(set([table.lower() for table in parser.tables]))
-    actual = agent_fn(conn, inp, provider, model)
-    with open(f"{path}/actual_get_tables.json", "w") as fp:
+    with span("agent", {"gen_ai.system": provider, "gen_ai.request.model": model}):
+        actual = agent_fn(conn, inp, provider, model)
+    with open(f"{output_path}/actual_get_tables.json", "w") as fp:
         json.dump(actual, fp)
     return compare(actual, expected, strict)
@@ -1,21 +1,32 @@
 import os
+import threading
 import time
-from collections import Counter
-from textwrap import dedent
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 
 import polars as pl
 import psycopg
 import simplejson as json
 from polars.testing import assert_frame_equal, assert_series_equal
-from pydantic_ai.direct import model_request
-from pydantic_ai.messages import ModelRequest
-from pydantic_ai.models import ModelRequestParameters
-from pydantic_ai.tools import ToolDefinition
 from sql_metadata import Parser
-from tokencost import TOKEN_COSTS, calculate_cost_by_tokens
 
 from ..agents import AgentFn
+from ..cost_gate import CostCheck, CostExceededError, check_cost
+from ..costs import new_usage
 from ..exceptions import AgentFnError, GetExpectedError, QueryExecutionError
+from ..judge import get_judge_request
+from ..preflight import PreflightError, preflight
+from ..query_cache import CachedQueryError, get_cached_dataframe
+from ..sandbox import (
+    BudgetExceededError,
+    QueryUsage,
+    check_rows,
+    get_sandboxed_dataframe,
+    to_dataframe,
+)
+from ..timing import span
+from ..tracing import set_attributes
 from ..types import ContextMode, Provider
 
 
@@ -33,12 +44,78 @@ def get_dataframe(query: str, conn: psycopg.Connection) -> pl.DataFrame:
     with conn.cursor() as cur:
         cur.execute(query)
         data = cur.fetchall()
-        colnames = [desc.name for desc in cur.description]
-        counter = Counter(colnames)
-        for i, colname in enumerate(colnames):
-            if counter[colname] > 1:
-                colnames[i] = f"{colname}_{i}"
-        return pl.DataFrame(data, schema=colnames, orient="row")
+        return to_dataframe(data, [desc.name for desc in cur.description])
+
+
+def get_actual(
+    query: str, gold_query: str, conn: psycopg.Connection
+) -> tuple[pl.DataFrame, bool, QueryUsage | None, CostCheck | None]:
+    """
+    Get the result of a generated query, from the query cache if it holds it.
+    The cost gate and the row limit also apply to cached results, so that
+    whether a query passes does not depend on the cache. Returns the result,
+    whether it was cached, and the usage (None if cached) and cost check of
+    the query.
+    """
+    # the plan is estimated before the cache is read, as EXPLAIN is cheap
+    with span("cost_gate"):
+        cost_check = check_cost(query, gold_query, conn)
+    query_usage: QueryUsage | None = None
+
+    def execute(query: str, conn: psycopg.Connection) -> pl.DataFrame:
+        nonlocal query_usage
+        actual, query_usage = get_sandboxed_dataframe(query, conn, get_dataframe)
+        return actual
+
+    with span("generated_query", {"db.query.text": query}):
+        actual, cached = get_cached_dataframe(query, conn, execute)
+        # a result cached under a higher limit is not executed again
+        if cached:
+            check_rows(actual)
+        set_attributes(
+            {"db.response.returned_rows": actual.height, "db.query.cached": cached}
+        )
+    return actual, cached, query_usage, cost_check
+
+
+class GoldResults:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}  # type: dict[tuple[str, str], pl.DataFrame | Exception]
+
+
+_gold_results = ContextVar("gold_results", default=None)  # type: ContextVar[GoldResults | None]
+
+
+@contextmanager
+def share_gold_results() -> Iterator[None]:
+    """
+    Execute each gold query only once within the block, sharing its results
+    between the runs of an eval for multiple agents and models, including runs
+    in other threads started from the block.
+    """
+    token = _gold_results.set(GoldResults())
+    try:
+        yield
+    finally:
+        _gold_results.reset(token)
+
+
+def get_expected(gold_query: str, conn: psycopg.Connection) -> pl.DataFrame:
+    shared = _gold_results.get()
+    if shared is None:
+        return get_dataframe(gold_query, conn)
+    key = (conn.info.dbname, gold_query)
+    with shared.lock:
+        if key not in shared.results:
+            try:
+                shared.results[key] = get_dataframe(gold_query, conn)
+            except (psycopg.DatabaseError, psycopg.errors.QueryCanceled) as e:
+                shared.results[key] = e
+        expected = shared.results[key]
+    if isinstance(expected, Exception):
+        raise expected
+    return expected
 
 
 def compare(actual: pl.DataFrame, expected: pl.DataFrame) -> bool:
@@ -82,13 +159,17 @@ async def run(
     context_mode: ContextMode,
     llm_judge: str,
     *args,
+    output_path: str | None = None,
 ) -> bool:
-    if os.path.exists(f"{path}/actual_query.sql"):
-        os.unlink(f"{path}/actual_query.sql")
-    if os.path.exists(f"{path}/actual_messages.txt"):
-        os.unlink(f"{path}/actual_messages.txt")
-    if os.path.exists(f"{path}/details.json"):
-        os.unlink(f"{path}/details.json")
+    # the eval artifacts are written next to eval.json, unless the eval is run
+    # for multiple agents/models at once
+    output_path = output_path or path
+    if os.path.exists(f"{output_path}/actual_query.sql"):
+        os.unlink(f"{output_path}/actual_query.sql")
+    if os.path.exists(f"{output_path}/actual_messages.txt"):
+        os.unlink(f"{output_path}/actual_messages.txt")
+    if os.path.exists(f"{output_path}/details.json"):
+        os.unlink(f"{output_path}/details.json")
     with open(f"{path}/eval.json", "r") as fp:
         gold_query = json.load(fp).get("query")
     gold_tables_list = []
@@ -97,13 +178,23 @@ async def run(
         gold_tables_list = [table.lower() for table in parser.tables]
     start = time.time()
     try:
-        result = await agent_fn(
-            conn, inp, provider, model, context_mode, gold_tables_list
-        )
+        with span("agent", {"gen_ai.system": provider, "gen_ai.request.model": model}):
+            result = await agent_fn(
+                conn, inp, provider, model, context_mode, gold_tables_list
+            )
+            if "usage" in result:
+                set_attributes(
+                    {
+                        "gen_ai.usage.input_tokens": result["usage"]["request_tokens"],
+                        "gen_ai.usage.output_tokens": result["usage"][
+                            "response_tokens"
+                        ],
+                    }
+                )
     except Exception as e:
         raise AgentFnError(e) from e
     duration = round(time.time() - start, 3)
-    with open(f"{path}/actual_messages.txt", "w") as fp:
+    with open(f"{output_path}/actual_messages.txt", "w") as fp:
         for i in range(len(result["messages"])):
             if i > 0:
                 fp.write("\n")
@@ -116,142 +207,44 @@ async def run(
             else AgentFnError(str(result["error"]))
         )
     query = result["query"]
-    with open(f"{path}/actual_query.sql", "w") as fp:
+    with open(f"{output_path}/actual_query.sql", "w") as fp:
         fp.write(query)
 
     try:
-        expected = get_dataframe(gold_query, conn)
+        with span("gold_query", {"db.query.text": gold_query}):
+            expected = get_expected(gold_query, conn)
+            set_attributes({"db.response.returned_rows": expected.height})
     except (psycopg.DatabaseError, psycopg.errors.QueryCanceled) as e:
         raise GetExpectedError(e) from e
 
+    # doomed or writing queries are rejected without executing them
     try:
-        actual = get_dataframe(query, conn)
-    except (psycopg.DatabaseError, psycopg.errors.QueryCanceled) as e:
+        with span("preflight"):
+            preflight_status = preflight(query, conn)
+    except PreflightError as e:
         raise QueryExecutionError(e) from e
 
-    usage = result.get(
-        "usage",
-        {
-            "cached_tokens": 0,
-            "cached_tokens_cost": 0.0,
-            "request_tokens": 0,
-            "request_tokens_cost": 0.0,
-            "response_tokens": 0,
-            "response_tokens_cost": 0.0,
-        },
-    )
-
-    cost_model = model
-    if cost_model not in TOKEN_COSTS:
-        cost_model = f"{provider}/{model}"
-
     try:
-        usage["cached_tokens_cost"] = float(
-            calculate_cost_by_tokens(usage["cached_tokens"], cost_model, "cached")
-        )
-    except KeyError:
-        usage["cached_tokens_cost"] = 0.0
+        actual, cached, query_usage, cost_check = get_actual(query, gold_query, conn)
+    except (
+        psycopg.DatabaseError,
+        psycopg.errors.QueryCanceled,
+        CachedQueryError,
+        BudgetExceededError,
+        CostExceededError,
+    ) as e:
+        raise QueryExecutionError(e) from e
 
-    try:
-        usage["request_tokens_cost"] = float(
-            calculate_cost_by_tokens(usage["request_tokens"], cost_model, "input")
-        )
-    except KeyError:
-        usage["request_tokens_cost"] = 0.0
+    # the costs are computed from the token counts when the results are
+    # aggregated, see `costs.price_evals()`
+    usage = result.get("usage", new_usage())
 
-    try:
-        usage["response_tokens_cost"] = float(
-            calculate_cost_by_tokens(usage["response_tokens"], cost_model, "output")
-        )
-    except KeyError:
-        usage["response_tokens_cost"] = 0.0
-
-    status = "pass" if compare(actual, expected) else "fail"
-    llm_judgement = None
-    if llm_judge != "none":
-        if status == "fail" or llm_judge == "all":
-            from tabulate import tabulate
-
-            parts = [
-                dedent(f"""
-                    Is the following query equivalent to the expected query for the given question?
-                    You MUST answer using the `sql_judge` tool call.
-
-                    Question: {inp}
-
-                    Expected Query:
-                    ```sql
-                    {gold_query}
-                    ```
-
-                    Subset of expected results:
-                """),
-                tabulate(
-                    expected.head(10).to_pandas(),
-                    headers="keys",
-                    tablefmt="github",
-                    showindex=False,
-                ),
-                dedent(f"""
-
-                    Actual Query:
-                    ```sql
-                    {query}
-                    ```
-
-                    Subset of actual results:
-                """),
-                tabulate(
-                    actual.head(10).to_pandas(),
-                    headers="keys",
-                    tablefmt="github",
-                    showindex=False,
-                ),
-            ]
-            messages = [
-                ModelRequest.user_text_prompt("".join(parts)),
-            ]
-            # print(messages[0].parts[0].content)
-            model_response = await model_request(
-                "openai:gpt-4.1-nano",
-                messages,
-                model_request_parameters=ModelRequestParameters(
-                    output_tools=[
-                        ToolDefinition(
-                            name="sql_judge",
-                            description="Provide a yes or no answer to whether the actual query is equivalent to the expected query for the given question along with reasoning on why.",
-                            parameters_json_schema={
-                                "type": "object",
-                                "properties": {
-                                    "judgement": {
-                                        "type": "boolean",
-                                        "description": (
-                                            "Indicate whether the actual query is equivalent to the expected query"
-                                        ),
-                                    },
-                                    "explanation": {
-                                        "type": "string",
-                                        "description": (
-                                            "Concise explanation of the judgement if queries were equivalent or not"
-                                        ),
-                                    },
-                                },
-                                "required": [
-                                    "judgement",
-                                    "explanation",
-                                ],
-                            },
-                        )
-                    ]
-                ),
-            )
-            part = model_response.parts[0]
-            if part.part_kind != "tool-call":
-                print("    Unexpected response from LLM judge, expected tool call")
-            else:
-                args = part.args_as_dict()
-                llm_judgement = args.get("judgement", None)
-                llm_explanation = args.get("explanation", "")
+    with span("compare"):
+        status = "pass" if compare(actual, expected) else "fail"
+    judge_request = None
+    if llm_judge != "none" and (status == "fail" or llm_judge == "all"):
+        # the judge runs after all evals, see `judge.py`
+        judge_request = get_judge_request(inp, gold_query, query, expected, actual)
 
     details = {
         "generated_query": query,
@@ -259,20 +252,25 @@ async def run(
         "duration": duration,
         "usage": usage,
         "messages": result["messages"],
+        "generated_query_cached": cached,
+        # None if the result was cached
+        "generated_query_usage": query_usage,
+        "generated_query_cost": cost_check,
+        "preflight": preflight_status,
     }
 
     if context_mode == "specific_ids":
         details["gold_tables"] = gold_tables_list
-    if llm_judgement is not None:
-        details["llm_judge"] = llm_judgement
-        details["llm_explanation"] = llm_explanation
 
     return_obj = {
         "status": status,
         "details": details,
     }
 
-    with open(f"{path}/details.json", "w") as fp:
+    details_path = f"{output_path}/details.json"
+    with open(details_path, "w") as fp:
         json.dump(return_obj, fp, indent=2, ignore_nan=True, use_decimal=True)
 
+    if judge_request is not None:
+        return_obj["judge"] = {"request": judge_request, "details_path": details_path}
     return return_obj
@@ -0,0 +1,94 @@
+"""
+Lightweight timers for recording how long each phase of an eval takes.
+
+An eval is wrapped in `record_timings()`, and any code that it calls (the task,
+the agent, ...) can wrap a phase in `span("name")`. The elapsed time of each
+phase is accumulated, in seconds, into the dict yielded by `record_timings()`,
+which is stored under `timings` in the details of the eval. Spans outside of
+`record_timings()` are no-ops, so agents can be used on their own as well.
+
+Each phase is also recorded as a trace span when tracing is active (see
+`suite/tracing.py`), and phases with a `gen_ai.operation.name` attribute as
+LLM requests of their `gen_ai.system` in the live metrics (see
+`suite/metrics.py`).
+"""
+
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, TypedDict
+
+from .metrics import observe_request
+from .stats import percentile
+from .tracing import AttributeValue, trace_span
+
+PRECISION = 6
+
+_timings = ContextVar("timings", default=None)  # type: ContextVar[dict[str, float] | None]
+
+
+class PhaseSummary(TypedDict):
+    count: int
+    p50: float
+    p95: float
+    max: float
+
+
+@contextmanager
+def record_timings() -> Iterator[dict[str, float]]:
+    timings = {}  # type: dict[str, float]
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def span(
+    name: str, attributes: dict[str, AttributeValue | None] | None = None
+) -> Iterator[None]:
+    """
+    Time the wrapped block as the phase `name`. A phase that is entered more
+    than once (e.g. retried LLM requests) accumulates its total time.
+    """
+    timings = _timings.get()
+    start = time.perf_counter()
+    status_code = None  # type: int | None
+    try:
+        with trace_span(name, attributes):
+            yield
+    except BaseException as e:
+        # HTTP errors of the LLM clients (pydantic_ai, openai) have a status code
+        status_code = getattr(e, "status_code", None)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        if timings is not None:
+            timings[name] = round(timings.get(name, 0.0) + elapsed, PRECISION)
+        attributes = attributes or {}
+        if "gen_ai.operation.name" in attributes:
+            provider = str(attributes.get("gen_ai.system") or "unknown")
+            observe_request(provider, elapsed, status_code)
+
+
+def summarize_phases(evals: Iterable[dict[str, Any]]) -> dict[str, PhaseSummary]:
+    """
+    Aggregate the per phase timings of the evals into p50/p95/max per phase.
+    """
+    phases = {}  # type: dict[str, list[float]]
+    for result in evals:
+        for name, elapsed in result.get("details", {}).get("timings", {}).items():
+            if name not in phases:
+                phases[name] = []
+            phases[name].append(elapsed)
+    return {
+        name: {
+            "count": len(values),
+            "p50": round(percentile(values, 50), PRECISION),
+            "p95": round(percentile(values, 95), PRECISION),
+            "max": round(max(values), PRECISION),
+        }
+        for name, values in sorted(phases.items())
+    }
@@ -0,0 +1,197 @@
+"""
+Minimal tracing of eval runs, exported in the OTLP/JSON format so that a run can
+be inspected in any OpenTelemetry compatible trace viewer.
+
+Spans are only recorded while a `Tracer` is active (see `start_tracing()`), so
+the instrumentation is free when tracing is disabled. The finished trace is sent
+to the OTLP/HTTP collector at `OTEL_EXPORTER_OTLP_TRACES_ENDPOINT` or
+`OTEL_EXPORTER_OTLP_ENDPOINT` if one is configured, and otherwise (or if the
+collector cannot be reached) written to a local JSON file.
+"""
+
+import json
+import os
+import secrets
+import time
+import urllib.error
+import urllib.request
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+AttributeValue = str | bool | int | float
+
+SERVICE_NAME = "text-to-sql-eval"
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: str | None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start = time.time_ns()
+        self.end = None  # type: int | None
+        self.attributes = {}  # type: dict[str, AttributeValue]
+        self.status = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attributes(self, attributes: dict[str, AttributeValue | None]) -> None:
+        for key, value in attributes.items():
+            if value is not None:
+                self.attributes[key] = value
+
+    def set_error(self, error: BaseException | str) -> None:
+        self.status = STATUS_ERROR
+        if isinstance(error, BaseException):
+            error = f"{type(error).__name__}: {error}"
+        self.status_message = error
+
+    def to_otlp(self) -> dict[str, Any]:
+        otlp = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            # SPAN_KIND_INTERNAL
+            "kind": 1,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end or time.time_ns()),
+            "attributes": [
+                {"key": key, "value": _to_otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": {"code": self.status},
+        }  # type: dict[str, Any]
+        if self.parent_id is not None:
+            otlp["parentSpanId"] = self.parent_id
+        if self.status_message:
+            otlp["status"]["message"] = self.status_message
+        return otlp
+
+
+def _to_otlp_value(value: AttributeValue) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # 64 bit integers are encoded as strings in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    def __init__(self, attributes: dict[str, AttributeValue]):
+        self.trace_id = secrets.token_hex(16)
+        self.attributes = attributes
+        self.spans = []  # type: list[Span]
+
+    def to_otlp(self) -> dict[str, Any]:
+        resource_attributes = {"service.name": SERVICE_NAME, **self.attributes}
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": key, "value": _to_otlp_value(value)}
+                            for key, value in resource_attributes.items()
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "suite"},
+                            "spans": [x.to_otlp() for x in self.spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def export(self, output_file: Path) -> str:
+        """
+        Export the trace to the configured OTLP collector, falling back to
+        writing it to `output_file`. Returns where the trace was exported to.
+        """
+        payload = json.dumps(self.to_otlp()).encode("utf-8")
+        endpoint = get_otlp_endpoint()
+        if endpoint is not None:
+            request = urllib.request.Request(
+                endpoint,
+                data=payload,
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=10):
+                    return endpoint
+            except (urllib.error.URLError, OSError) as e:
+                print(f"Failed to export trace to {endpoint}: {e}")
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        with output_file.open("wb") as fp:
+            fp.write(payload)
+        return str(output_file)
+
+
+_tracer = ContextVar("tracer", default=None)  # type: ContextVar[Tracer | None]
+_span = ContextVar("span", default=None)  # type: ContextVar[Span | None]
+
+
+def get_otlp_endpoint() -> str | None:
+    endpoint = os.environ.get("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", "")
+    if endpoint:
+        return endpoint
+    endpoint = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+    if endpoint:
+        return endpoint.rstrip("/") + "/v1/traces"
+    return None
+
+
+@contextmanager
+def start_tracing(attributes: dict[str, AttributeValue]) -> Iterator[Tracer]:
+    tracer = Tracer(attributes)
+    token = _tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _tracer.reset(token)
+
+
+@contextmanager
+def trace_span(
+    name: str, attributes: dict[str, AttributeValue | None] | None = None
+) -> Iterator[Span | None]:
+    """
+    Record the wrapped block as a span, as a child of the current span. Yields
+    None when tracing is not active.
+    """
+    tracer = _tracer.get()
+    if tracer is None:
+        yield None
+        return
+    parent = _span.get()
+    span = Span(name, tracer.trace_id, parent.span_id if parent else None)
+    span.set_attributes(attributes or {})
+    tracer.spans.append(span)
+    token = _span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.set_error(e)
+        raise
+    finally:
+        span.end = time.time_ns()
+        _span.reset(token)
+
+
+def set_attributes(attributes: dict[str, AttributeValue | None]) -> None:
+    """
+    Set attributes on the current span, if any.
+    """
+    span = _span.get()
+    if span is not None:
+        span.set_attributes(attributes)
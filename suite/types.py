@@ -1,6 +1,6 @@
 from typing import Any, Literal, TypedDict
 
-Provider = Literal["anthropic", "ollama", "openai"]
+Provider = Literal["anthropic", "mock", "ollama", "openai"]
 
 
 class PromptMessage(TypedDict):
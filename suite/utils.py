@@ -81,6 +81,8 @@ def expand_task_model(model: str) -> str:
         model = f"mistral:{model}"
     elif model in OPENAI_TASK_MODELS:
         model = f"openai:{model}"
+    elif model == "mock":
+        model = "mock:instant"
     return model
 
 
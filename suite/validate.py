@@ -0,0 +1,195 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Literal, NotRequired, TypedDict
+
+import psycopg
+
+from .stats import TimingSummary, summarize
+from .utils import get_psycopg_str
+
+
+class GoldQuery(TypedDict):
+    dataset: str
+    database: str
+    name: str
+    query: str
+
+
+class GoldQueryResult(TypedDict):
+    dataset: str
+    database: str
+    name: str
+    status: Literal["pass", "empty", "error"]
+    error: str
+    rows: int
+    timing: TimingSummary
+    explain: NotRequired[str]
+
+
+def collect_gold_queries(
+    datasets_dir: Path, datasets: list[str], database: str | None = None
+) -> dict[tuple[str, str], list[GoldQuery]]:
+    """
+    Collect the gold queries for the given datasets, grouped by their
+    (dataset, database) pair.
+    """
+    queries = {}  # type: dict[tuple[str, str], list[GoldQuery]]
+    for dataset in datasets:
+        evals_path = datasets_dir / dataset / "evals"
+        if not evals_path.is_dir():
+            continue
+        for eval_path in sorted(evals_path.iterdir()):
+            with (eval_path / "eval.json").open() as fp:
+                inp = json.load(fp)
+            if database and inp["database"] != database:
+                continue
+            key = (dataset, inp["database"])
+            if key not in queries:
+                queries[key] = []
+            queries[key].append(
+                {
+                    "dataset": dataset,
+                    "database": inp["database"],
+                    "name": eval_path.name,
+                    "query": inp["query"],
+                }
+            )
+    return queries
+
+
+async def validate_database(
+    queries: list[GoldQuery],
+    repeat: int,
+    statement_timeout: int,
+) -> list[GoldQueryResult]:
+    """
+    Execute each gold query of a database `repeat` times on a single connection,
+    recording the execution time of every run.
+    """
+    results = []  # type: list[GoldQueryResult]
+    dbname = f"{queries[0]['dataset']}_{queries[0]['database']}"
+    async with await psycopg.AsyncConnection.connect(
+        get_psycopg_str(dbname), autocommit=True
+    ) as conn:
+        await conn.execute(f"SET statement_timeout = {int(statement_timeout)}")
+        for gold in queries:
+            times = []
+            error = ""
+            rows = 0
+            for _ in range(repeat):
+                start = time.perf_counter()
+                try:
+                    async with conn.cursor() as cur:
+                        await cur.execute(gold["query"])
+                        rows = len(await cur.fetchall())
+                except psycopg.DatabaseError as e:
+                    error = f"Failed to execute query: {e}"
+                    break
+                times.append(time.perf_counter() - start)
+            if error:
+                status = "error"
+            elif rows == 0:
+                status = "empty"
+                error = "No results"
+            else:
+                status = "pass"
+            results.append(
+                {
+                    "dataset": gold["dataset"],
+                    "database": gold["database"],
+                    "name": gold["name"],
+                    "status": status,
+                    "error": error,
+                    "rows": rows,
+                    "timing": summarize(times),
+                }
+            )
+    return results
+
+
+async def explain_queries(
+    dataset: str,
+    database: str,
+    queries: list[str],
+    statement_timeout: int,
+) -> list[str]:
+    """
+    Capture the `EXPLAIN (ANALYZE, BUFFERS)` output for the given queries. The
+    queries are run inside a transaction that is rolled back.
+    """
+    plans = []
+    async with await psycopg.AsyncConnection.connect(
+        get_psycopg_str(f"{dataset}_{database}")
+    ) as conn:
+        for query in queries:
+            try:
+                async with conn.transaction(force_rollback=True):
+                    await conn.execute(
+                        f"SET LOCAL statement_timeout = {int(statement_timeout)}"
+                    )
+                    async with conn.cursor() as cur:
+                        await cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}")
+                        plans.append("\n".join(row[0] for row in await cur.fetchall()))
+            except psycopg.DatabaseError as e:
+                plans.append(f"Failed to explain query: {e}")
+    return plans
+
+
+async def validate_gold_queries(
+    queries: dict[tuple[str, str], list[GoldQuery]],
+    repeat: int,
+    explain: int,
+    concurrency: int,
+    statement_timeout: int,
+) -> list[GoldQueryResult]:
+    """
+    Validate the gold queries, running up to `concurrency` databases at a time,
+    and capture the plans of the `explain` slowest queries by median time.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_database(database_queries: list[GoldQuery]):
+        async with semaphore:
+            return await validate_database(database_queries, repeat, statement_timeout)
+
+    results = []  # type: list[GoldQueryResult]
+    for database_results in await asyncio.gather(
+        *[run_database(x) for x in queries.values()]
+    ):
+        results += database_results
+
+    if explain <= 0:
+        return results
+
+    gold_queries = {
+        (x["dataset"], x["database"], x["name"]): x["query"]
+        for database_queries in queries.values()
+        for x in database_queries
+    }
+    slowest = sorted(
+        [x for x in results if x["status"] != "error"],
+        key=lambda x: x["timing"]["p50"],
+        reverse=True,
+    )[:explain]
+    to_explain = {}  # type: dict[tuple[str, str], list[GoldQueryResult]]
+    for result in slowest:
+        key = (result["dataset"], result["database"])
+        if key not in to_explain:
+            to_explain[key] = []
+        to_explain[key].append(result)
+
+    async def explain_database(key: tuple[str, str]):
+        async with semaphore:
+            plans = await explain_queries(
+                key[0],
+                key[1],
+                [gold_queries[(*key, x["name"])] for x in to_explain[key]],
+                statement_timeout,
+            )
+        for result, plan in zip(to_explain[key], plans, strict=True):
+            result["explain"] = plan
+
+    await asyncio.gather(*[explain_database(key) for key in to_explain])
+    return results
@@ -1,7 +1,70 @@
+from types import SimpleNamespace
+
 import polars as pl
 import pytest
 
-from suite.tasks.text_to_sql import compare
+from suite.cost_gate import CostExceededError, use_cost_gate
+from suite.query_cache import use_query_cache
+from suite.sandbox import DEFAULT_LIMITS, BudgetExceededError, use_sandbox
+from suite.tasks.text_to_sql import compare, get_actual
+
+GOLD_QUERY = "SELECT name FROM users WHERE id = 1"
+QUERY = "SELECT name FROM users, orders"
+
+
+class FakeConnection:
+    def __init__(self, plans: dict[str, tuple[float, float]]):
+        self.info = SimpleNamespace(host="localhost", port=5432, dbname="bird_db")
+        self.plans = plans
+        self.executed = []  # type: list[str]
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            description = [SimpleNamespace(name="name")]
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, query, params=None):
+                self.query = query
+                if not query.startswith("EXPLAIN"):
+                    conn.executed.append(query)
+
+            def fetchone(self):
+                if self.query.startswith("EXPLAIN"):
+                    query = self.query.removeprefix("EXPLAIN (FORMAT JSON) ")
+                    cost, rows = conn.plans[query]
+                    return ([{"Plan": {"Total Cost": cost, "Plan Rows": rows}}],)
+                # the fingerprint of the database for the query cache
+                return ("v1",)
+
+            def fetchall(self):
+                return [("a",), ("b",)]
+
+        return Cursor()
+
+
+def test_get_actual_cached(tmp_path):
+    conn = FakeConnection({GOLD_QUERY: (8.0, 1.0), QUERY: (1e9, 1e9)})
+    with use_query_cache(tmp_path):
+        actual, cached, usage, cost_check = get_actual(QUERY, GOLD_QUERY, conn)
+        assert (actual.height, cached, usage["rows"], cost_check) == (2, False, 2, None)
+        # a cache hit is gated and limited like a miss
+        with use_cost_gate(100), pytest.raises(CostExceededError):
+            get_actual(QUERY, GOLD_QUERY, conn)
+        with (
+            use_sandbox({**DEFAULT_LIMITS, "max_rows": 1}),
+            pytest.raises(BudgetExceededError),
+        ):
+            get_actual(QUERY, GOLD_QUERY, conn)
+        actual, cached, usage, _ = get_actual(QUERY, GOLD_QUERY, conn)
+        assert (actual.height, cached, usage) == (2, True, None)
+    assert conn.executed.count(QUERY) == 1
 
 
 @pytest.mark.parametrize(
@@ -46,3 +109,36 @@ from suite.tasks.text_to_sql import compare
 )
 def test_compare(actual, expected, expected_result):
     assert compare(actual, expected) == expected_result
+
+
+def test_share_gold_results(monkeypatch):
+    import contextvars
+    import threading
+    from types import SimpleNamespace
+
+    from suite.tasks import text_to_sql
+
+    calls = []
+
+    def get_dataframe(query, conn):
+        calls.append(query)
+        return pl.DataFrame({"a": [1]})
+
+    monkeypatch.setattr(text_to_sql, "get_dataframe", get_dataframe)
+    conn = SimpleNamespace(info=SimpleNamespace(dbname="bird_financial"))
+    text_to_sql.get_expected("SELECT 1", conn)
+    assert len(calls) == 1
+    with text_to_sql.share_gold_results():
+        # like asyncio.to_thread(), run the threads in a copy of the context
+        threads = [
+            threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(text_to_sql.get_expected, "SELECT 1", conn),
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(calls) == 2
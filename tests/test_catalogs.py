@@ -0,0 +1,122 @@
+import pytest
+import yaml
+
+from suite.catalogs import (
+    Loader,
+    apply_comments,
+    compile_catalog,
+    diff_catalogs,
+    get_catalog_file,
+    get_comments,
+)
+
+CATALOG = """---
+type: header
+schema_version: '1'
+...
+---
+schema: public
+name: city
+type: table
+description: Cities.
+columns:
+- name: id
+  description: Identifier of the city.
+- name: name
+  description: Name of the city.
+...
+"""
+
+
+def test_loader():
+    if yaml.__with_libyaml__:
+        assert Loader is yaml.CSafeLoader
+
+
+def test_compile_catalog(tmp_path):
+    catalog_file = tmp_path / "world.yaml"
+    catalog_file.write_text(CATALOG)
+    compiled = compile_catalog(catalog_file, tmp_path / "cache")
+    assert [x["name"] for x in compiled["docs"]] == ["city"]
+    assert (tmp_path / "cache" / f"{compiled['hash']}.json").exists()
+    # compiled again from the cache
+    assert compile_catalog(catalog_file, tmp_path / "cache") == compiled
+    catalog_file.write_text(CATALOG.replace("Cities.", "The cities."))
+    changed = compile_catalog(catalog_file, tmp_path / "cache")
+    assert changed["hash"] != compiled["hash"]
+    assert get_comments(changed)[("public", "city", None)] == "The cities."
+
+
+@pytest.mark.parametrize("database", ["california_schools", "financial"])
+def test_diff_catalogs(tmp_path, database):
+    default = compile_catalog(get_catalog_file("bird", "default", database), tmp_path)
+    improved = compile_catalog(
+        get_catalog_file("bird", "llm_improved", database), tmp_path
+    )
+    assert diff_catalogs(default, default) == ([], [])
+    added, removed = diff_catalogs(default, improved)
+    assert {x["type"] for x in added} >= {"sql_example", "fact"}
+    assert all(x["type"] == "table" for x in removed)
+    assert diff_catalogs(None, default) == (default["docs"], [])
+
+
+class FakeConnection:
+    def __init__(self, comments):
+        self.comments = comments
+        self.statements = []
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, query, params=None):
+                if params is None:
+                    conn.statements.append(query)
+
+            def fetchall(self):
+                return conn.comments
+
+        return Cursor()
+
+
+def test_apply_comments(tmp_path):
+    catalog_file = tmp_path / "world.yaml"
+    catalog_file.write_text(CATALOG)
+    compiled = compile_catalog(catalog_file, tmp_path)
+    conn = FakeConnection(
+        [
+            ("public", "city", None, "Cities."),
+            ("public", "city", "id", "Identifier."),
+        ]
+    )
+    # only the comments that differ are changed
+    assert apply_comments(conn, compiled) == 2
+    assert len(conn.statements) == 2
+
+
+def test_apply_comments_removed(tmp_path):
+    catalog_file = tmp_path / "world.yaml"
+    catalog_file.write_text(CATALOG)
+    compiled = compile_catalog(catalog_file, tmp_path)
+    conn = FakeConnection(
+        [
+            ("public", "city", None, "Cities."),
+            ("public", "city", "id", "Identifier of the city."),
+            ("public", "city", "name", "Name of the city."),
+            # described by another catalog only
+            ("public", "city", "population", "Population of the city."),
+            ("public", "country", None, "Countries."),
+        ]
+    )
+    assert apply_comments(conn, compiled) == 2
+    statements = [x.as_string(None) for x in conn.statements]
+    assert statements == [
+        'COMMENT ON COLUMN "public"."city"."population" IS NULL',
+        'COMMENT ON TABLE "public"."country" IS NULL',
+    ]
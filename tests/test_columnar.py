@@ -0,0 +1,119 @@
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+from suite.columnar import is_results_file, load_results, write_results
+
+
+def get_eval(name: str, status: str, timings: dict[str, float]) -> dict:
+    details = {
+        "messages": [{"role": "user", "content": "question"}],
+        "usage": {
+            "cached_tokens": 0,
+            "cached_tokens_cost": 0.0,
+            "request_tokens": 100,
+            "request_tokens_cost": 0.01,
+            "response_tokens": 10,
+            "response_tokens_cost": 0.002,
+        },
+        "timings": timings,
+    }
+    if status == "error":
+        details = {"exception_class": "AgentFnError", "timings": timings}
+    return {
+        "status": status,
+        "dataset": "bird",
+        "database": "financial",
+        "name": name,
+        "question": "question",
+        "duration": 1.5,
+        "details": details,
+    }
+
+
+RESULTS = {
+    "task": "text_to_sql",
+    "start_time": "2025-01-01T00:00:00+00:00",
+    "end_time": "2025-01-01T00:01:00+00:00",
+    "details": {"model": "gpt-4.1"},
+    "results": {
+        "bird": {
+            "passing": 1,
+            "total": 2,
+            "failed": [],
+            "failed_error_counts": {"AgentFnError": 1},
+            "errored": ["002"],
+            "evals": [
+                get_eval("001", "pass", {"agent": 1.0, "gold_query": 0.5}),
+                get_eval("002", "error", {"agent": 2.0}),
+            ],
+        }
+    },
+}
+
+
+@pytest.mark.parametrize("suffix", [".json", ".parquet"])
+def test_round_trip(tmp_path: Path, suffix: str):
+    results_file = tmp_path / f"results{suffix}"
+    write_results(RESULTS, results_file)
+    assert load_results(results_file, with_details=True) == RESULTS
+
+
+def test_load_results_without_details(tmp_path: Path):
+    results_file = tmp_path / "results.parquet"
+    write_results(RESULTS, results_file)
+    df = pl.read_parquet(results_file)
+    assert df["status"].to_list() == ["pass", "error"]
+    assert df["timing_gold_query"].to_list() == [0.5, None]
+    evals = load_results(results_file)["results"]["bird"]["evals"]
+    assert evals[0]["details"]["timings"] == {"agent": 1.0, "gold_query": 0.5}
+    assert evals[0]["details"]["usage"]["request_tokens"] == 100
+    assert evals[1]["details"]["exception_class"] == "AgentFnError"
+    assert "messages" not in evals[0]["details"]
+
+
+def test_write_results_other_format(tmp_path: Path):
+    write_results(RESULTS, tmp_path / "results.parquet")
+    assert len(list(tmp_path.glob("blobs/*/*.json.zst"))) == 2
+    write_results(RESULTS, tmp_path / "results.json")
+    assert sorted(x.name for x in tmp_path.glob("results*")) == ["results.json"]
+    # the blobs of the removed Parquet file are deleted
+    assert list(tmp_path.glob("blobs/*/*.json.zst")) == []
+    write_results(RESULTS, tmp_path / "results.parquet")
+    assert sorted(x.name for x in tmp_path.glob("results*")) == [
+        "results.parquet",
+        "results.run.json",
+    ]
+
+
+def test_collect_blobs(tmp_path: Path):
+    write_results(RESULTS, tmp_path / "a.parquet")
+    other = {
+        **RESULTS,
+        "results": {
+            "bird": {
+                **RESULTS["results"]["bird"],
+                "evals": [get_eval("003", "pass", {"agent": 3.0})],
+            }
+        },
+    }
+    write_results(other, tmp_path / "b.parquet")
+    assert len(list(tmp_path.glob("blobs/*/*.json.zst"))) == 3
+    # the blobs of a.parquet are kept when b.parquet is rewritten
+    write_results(RESULTS, tmp_path / "b.parquet")
+    assert len(list(tmp_path.glob("blobs/*/*.json.zst"))) == 2
+    assert load_results(tmp_path / "a.parquet", with_details=True) == RESULTS
+
+
+@pytest.mark.parametrize(
+    "name,expected",
+    [
+        ("results.json", True),
+        ("results.parquet", True),
+        ("results.run.json", False),
+        ("results.txt", False),
+    ],
+)
+def test_is_results_file(name: str, expected: bool):
+    assert is_results_file(Path(name)) == expected
@@ -0,0 +1,90 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+from suite.concurrency import Controller, admit, get_backoff, use_adaptive_concurrency
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_controller():
+    controller = Controller(8)
+    # slow start doubles the limit every round trip
+    for _ in range(5):
+        controller.acquire()
+        controller.release(1.0, None)
+    assert controller.limit == 6
+    # a burst of 429s within a round trip is a single decrease
+    for _ in range(3):
+        controller.acquire()
+        controller.release(1.0, 429)
+    assert controller.limit == 3
+    assert controller.decreases == 1
+    # errors without a status code change nothing
+    controller.acquire()
+    controller.release(1.0, 0)
+    assert controller.limit == 3
+    # after the first decrease, the limit grows by one per round trip
+    for _ in range(3):
+        controller.acquire()
+        controller.release(1.0, None)
+    assert controller.limit == pytest.approx(4, abs=0.1)
+    assert controller.peak == 6
+
+
+def test_latency_spike():
+    controller = Controller(8)
+    controller.limit = 4
+    controller.acquire()
+    controller.release(1.0, None)
+    controller.acquire()
+    controller.release(10.0, None)
+    assert controller.limit == 2.5
+
+
+def test_admit():
+    peak = 0
+    in_flight = 0
+    lock = threading.Lock()
+
+    def request(fail: bool) -> None:
+        nonlocal peak, in_flight
+        try:
+            with admit("openai"):
+                with lock:
+                    in_flight += 1
+                    peak = max(peak, in_flight)
+                time.sleep(0.01)
+                with lock:
+                    in_flight -= 1
+                if fail:
+                    raise RateLimitError()
+        except RateLimitError:
+            pass
+
+    with use_adaptive_concurrency(4) as controllers:
+        # like asyncio.to_thread, so that the threads see the controllers
+        threads = [
+            threading.Thread(
+                target=contextvars.copy_context().run, args=(request, i == 10)
+            )
+            for i in range(40)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    controller = controllers.providers["openai"]
+    assert controller.requests == 40
+    assert controller.peak == 4
+    assert peak <= 4
+    assert controller.in_flight == 0
+
+
+@pytest.mark.parametrize("attempt,low,high", [(0, 0.5, 1), (3, 4, 8), (10, 30, 60)])
+def test_get_backoff(attempt, low, high):
+    assert low <= get_backoff(attempt) <= high
@@ -0,0 +1,126 @@
+import os
+import uuid
+
+import psycopg
+import pytest
+
+from suite import copy_loader
+from suite.copy_loader import load_dump, parse_insert_values, split_identifier
+
+
+@pytest.mark.parametrize(
+    "values,expected",
+    [
+        ("(1, 'a''b', NULL);", [[b"1", b"a'b", None]]),
+        ("(-2.5e3, true),\n(.5, false);", [[b"-2.5e3", b"t"], [b".5", b"f"]]),
+        ("('x;y', 'z');", [[b"x;y", b"z"]]),
+        ("(now(), 1);", None),
+        ("(1, 2)", None),
+    ],
+)
+def test_parse_insert_values(values, expected):
+    assert parse_insert_values(values) == expected
+
+
+def test_split_identifier():
+    assert split_identifier('Public."Foo Bar"') == ["public", "Foo Bar"]
+
+
+# values that do not survive a round-trip through python types
+DUMP = """CREATE TABLE public.t (
+    d date,
+    ts timestamp,
+    i interval,
+    s text
+);
+
+COPY public.t (d, ts, i, s) FROM stdin;
+infinity\t-infinity\t1 mon\ta\\tb
+2000-01-01 BC\t0044-03-15 12:00:00 BC\t1 year 2 mons\t\\N
+\\.
+
+INSERT INTO public.t (s) VALUES ('it''s');
+"""
+ROWS = [
+    ("infinity", "-infinity", "1 mon", "a\tb"),
+    ("2000-01-01 BC", "0044-03-15 12:00:00 BC", "1 year 2 mons", None),
+    (None, None, None, "it's"),
+]
+
+
+class FakeConnection:
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, statement):
+        self.log.append(statement)
+
+    def cursor(self):
+        log = self.log
+
+        class Copy:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def write(self, data):
+                log.append(data)
+
+            def write_row(self, row):
+                log.append(row)
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def copy(self, query):
+                return Copy()
+
+        return Cursor()
+
+
+def test_load_dump_copy_rows(tmp_path, monkeypatch):
+    dump = tmp_path / "dump.sql"
+    dump.write_text(DUMP)
+    log = []
+    monkeypatch.setattr(
+        copy_loader.psycopg, "connect", lambda *args, **kwargs: FakeConnection(log)
+    )
+    assert load_dump("postgresql://db", [dump], 2) == 3
+    # the rows of the COPY block are sent unchanged
+    assert b"infinity\t-infinity\t1 mon\ta\\tb\n" in log
+    assert b"2000-01-01 BC\t0044-03-15 12:00:00 BC\t1 year 2 mons\t\\N\n" in log
+    assert ["it's"] in log
+
+
+@pytest.mark.skipif(
+    "POSTGRES_DSN" not in os.environ, reason="needs a database at POSTGRES_DSN"
+)
+def test_load_dump(tmp_path):
+    dump = tmp_path / "dump.sql"
+    dump.write_text(DUMP)
+    name = f"test_copy_loader_{uuid.uuid4().hex[:8]}"
+    dsn = os.environ["POSTGRES_DSN"]
+    with psycopg.connect(f"{dsn}/postgres", autocommit=True) as root:
+        root.execute(f"CREATE DATABASE {name}")
+    try:
+        assert load_dump(f"{dsn}/{name}", [dump], 2) == 3
+        with psycopg.connect(f"{dsn}/{name}") as conn:
+            rows = conn.execute(
+                "SELECT d::text, ts::text, i::text, s FROM public.t ORDER BY s"
+            ).fetchall()
+        assert sorted(rows, key=str) == sorted(ROWS, key=str)
+    finally:
+        with psycopg.connect(f"{dsn}/postgres", autocommit=True) as root:
+            root.execute(f"DROP DATABASE {name}")
@@ -0,0 +1,64 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+
+from suite.cost_gate import CostExceededError, check_cost, use_cost_gate
+
+GOLD_QUERY = "SELECT name FROM users WHERE id = 1"
+
+
+class FakeConnection:
+    def __init__(self, plans: dict[str, tuple[float, float]]):
+        self.info = SimpleNamespace(host="localhost", port=5432, dbname="bird_db")
+        self.plans = plans
+        self.explained = []  # type: list[str]
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, query):
+                self.query = query.removeprefix("EXPLAIN (FORMAT JSON) ")
+                conn.explained.append(self.query)
+
+            def fetchone(self):
+                cost, rows = conn.plans[self.query]
+                return ([{"Plan": {"Total Cost": cost, "Plan Rows": rows}}],)
+
+        return Cursor()
+
+
+@pytest.mark.parametrize(
+    "plan,gated",
+    [
+        ((8.0, 1.0), False),
+        # below the floors of the gold plan
+        ((5000.0, 5000.0), False),
+        ((2e6, 1.0), True),
+        ((100.0, 1e9), True),
+    ],
+)
+def test_check_cost(plan, gated):
+    conn = FakeConnection({GOLD_QUERY: (8.0, 1.0), "SELECT * FROM users": plan})
+    assert check_cost("SELECT * FROM users", GOLD_QUERY, conn) is None
+    assert conn.explained == []
+    with use_cost_gate(100) as gate:
+        if gated:
+            with pytest.raises(CostExceededError):
+                check_cost("SELECT * FROM users;", GOLD_QUERY, conn)
+        else:
+            check = check_cost("SELECT * FROM users;", GOLD_QUERY, conn)
+            assert check["gold_plan"] == {"cost": 8.0, "rows": 1.0}
+        # the plan of the gold query is cached
+        with pytest.raises(CostExceededError) if gated else nullcontext():
+            check_cost("SELECT * FROM users", GOLD_QUERY, conn)
+    assert conn.explained.count(GOLD_QUERY) == 1
+    assert gate.checked == 2
+    assert gate.gated == (2 if gated else 0)
@@ -0,0 +1,79 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import suite.costs
+from suite.costs import get_pricing, price_evals
+
+
+@pytest.fixture
+def pricing_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    pricing_file = tmp_path / "pricing.json"
+    pricing_file.write_text(
+        json.dumps(
+            {
+                "ollama/llama3.3": {
+                    "input_cost_per_token": 1e-06,
+                    "output_cost_per_token": 2e-06,
+                },
+                "gpt-4.1": {
+                    "input_cost_per_token": 1.0,
+                    "output_cost_per_token": 1.0,
+                },
+            }
+        )
+    )
+    monkeypatch.setattr(suite.costs, "PRICING_FILE", pricing_file)
+    get_pricing.cache_clear()
+    yield
+    get_pricing.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "provider,model,expected",
+    [
+        ("openai", "gpt-4.1-nano", {"input": 1e-07, "output": 4e-07}),
+        ("anthropic", "claude-3-5-sonnet-latest", {"input": 3e-06, "output": 1.5e-05}),
+        # the override file takes precedence over tokencost
+        ("openai", "gpt-4.1", {"input": 1.0, "output": 1.0}),
+        ("ollama", "llama3.3", {"input": 1e-06, "output": 2e-06}),
+        ("ollama", "unknown", None),
+    ],
+)
+def test_get_pricing(pricing_file, provider, model, expected):
+    pricing = get_pricing(provider, model)
+    if expected is None:
+        assert pricing is None
+    else:
+        assert pricing["request_tokens"] == expected["input"]
+        assert pricing["response_tokens"] == expected["output"]
+
+
+def test_price_evals():
+    evals = [
+        {"details": {"usage": {"request_tokens": 100, "response_tokens": 10}}},
+        {"details": {"exception_class": "AgentFnError"}},
+        {
+            "details": {
+                "usage": {
+                    "cached_tokens": 50,
+                    "request_tokens": 200,
+                    "response_tokens": 20,
+                }
+            }
+        },
+    ]
+    pricing = {"cached_tokens": 0.5, "request_tokens": 1.0, "response_tokens": 2.0}
+    usage = price_evals(evals, pricing)
+    assert evals[0]["details"]["usage"]["request_tokens_cost"] == 100.0
+    assert evals[2]["details"]["usage"]["cached_tokens_cost"] == 25.0
+    assert usage == {
+        "cached_tokens": 50,
+        "cached_tokens_cost": 25.0,
+        "request_tokens": 300,
+        "request_tokens_cost": 300.0,
+        "response_tokens": 30,
+        "response_tokens_cost": 60.0,
+    }
+    assert price_evals(evals, None)["request_tokens_cost"] == 0.0
@@ -0,0 +1,44 @@
+import gzip
+
+import zstandard
+
+from suite.dumps import list_databases, open_dump
+
+
+def test_list_databases(tmp_path):
+    for name in [
+        "single.sql",
+        "compressed.sql.zst",
+        "split.part000.sql.gz",
+        "split.part001.sql.gz",
+        "split.part002.sql.gz",
+        "orphan.part001.sql",
+        "notes.txt",
+    ]:
+        (tmp_path / name).write_bytes(b"")
+    assert list_databases(tmp_path) == {
+        "compressed": [tmp_path / "compressed.sql.zst"],
+        "single": [tmp_path / "single.sql"],
+        "split": [
+            tmp_path / "split.part000.sql.gz",
+            tmp_path / "split.part001.sql.gz",
+            tmp_path / "split.part002.sql.gz",
+        ],
+    }
+
+
+def test_list_databases_missing(tmp_path):
+    assert list_databases(tmp_path / "missing") == {}
+
+
+def test_open_dump(tmp_path):
+    content = b"CREATE TABLE t (id int);\n"
+    (tmp_path / "plain.sql").write_bytes(content)
+    with gzip.open(tmp_path / "gzip.sql.gz", "wb") as fp:
+        fp.write(content)
+    (tmp_path / "zstd.sql.zst").write_bytes(
+        zstandard.ZstdCompressor().compress(content)
+    )
+    for name in ["plain.sql", "gzip.sql.gz", "zstd.sql.zst"]:
+        with open_dump(tmp_path / name) as fp:
+            assert fp.read() == content
@@ -0,0 +1,14 @@
+import pytest
+
+from suite.agents.gold import get_dataset_database
+
+
+@pytest.mark.parametrize(
+    "dbname, expected",
+    [
+        ("bird_debit_card_specializing", ("bird", "debit_card_specializing")),
+        ("postgres_air_postgres_air", ("postgres_air", "postgres_air")),
+    ],
+)
+def test_get_dataset_database(dbname, expected):
+    assert get_dataset_database(dbname) == expected
@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import click
+import pytest
+
+from suite.hedging import (
+    MIN_SAMPLES,
+    Latencies,
+    PerAgentParamType,
+    RequestPolicy,
+    RequestTimeoutError,
+    get_agent_value,
+    get_request_timeout,
+    make_request,
+    make_request_sync,
+    parse_hedge,
+    parse_timeout,
+    use_request_policy,
+)
+
+
+def test_timeout():
+    async def slow():
+        await asyncio.sleep(10)
+
+    policy = RequestPolicy(0.05, False, Latencies())
+    with use_request_policy(policy), pytest.raises(RequestTimeoutError):
+        asyncio.run(make_request("mock:slow", slow))
+    assert policy.timeouts == 1
+
+
+def test_timeout_sync():
+    policy = RequestPolicy(0.05, False, Latencies())
+    with use_request_policy(policy), pytest.raises(RequestTimeoutError):
+        make_request_sync("mock:slow", lambda: time.sleep(0.5))
+    assert policy.timeouts == 1
+
+
+def test_hedge():
+    latencies = Latencies()
+    for _ in range(MIN_SAMPLES):
+        latencies.add("mock:model", 0.01)
+    calls = 0
+
+    async def request():
+        nonlocal calls
+        calls += 1
+        # the first copy is stuck, the hedge answers quickly
+        await asyncio.sleep(10 if calls == 1 else 0.01)
+        return calls
+
+    policy = RequestPolicy(5, True, latencies)
+    with use_request_policy(policy):
+        result, copies = asyncio.run(make_request("mock:model", request))
+    assert (result, copies) == (2, 2)
+    assert (policy.hedged, policy.hedges_won) == (1, 1)
+
+
+@pytest.mark.parametrize("hedge,expected", [(True, 2), (False, 1)])
+def test_hedge_sync(hedge, expected):
+    latencies = Latencies()
+    for _ in range(MIN_SAMPLES):
+        latencies.add("mock:model", 0.01)
+    calls = []
+
+    def request():
+        calls.append(None)
+        # the first copy is stuck, the hedge answers quickly
+        time.sleep(0.5 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    with use_request_policy(RequestPolicy(5, True, latencies)):
+        _, copies = make_request_sync("mock:model", request, hedge=hedge)
+    assert copies == expected
+
+
+def test_get_request_timeout():
+    assert get_request_timeout() is None
+    with use_request_policy(RequestPolicy(30, False, Latencies())):
+        assert get_request_timeout() == 30
+
+
+def test_no_hedge_without_latencies():
+    async def request():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    policy = RequestPolicy(5, True, Latencies())
+    with use_request_policy(policy):
+        assert asyncio.run(make_request("mock:model", request)) == ("ok", 1)
+    assert policy.hedged == 0
+
+
+def test_failed_copies():
+    async def request():
+        raise ValueError("failed")
+
+    with use_request_policy(RequestPolicy(5, False, Latencies())):
+        with pytest.raises(ValueError):
+            asyncio.run(make_request("mock:model", request))
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("120", {"*": 120.0}),
+        ("0", {"*": None}),
+        ("60,pgai=120, judge = 30", {"*": 60.0, "pgai": 120.0, "judge": 30.0}),
+    ],
+)
+def test_per_agent_timeout(value, expected):
+    values = PerAgentParamType(parse_timeout).convert(value, None, None)
+    assert values == expected
+    assert get_agent_value(values, "vanna", 300.0) == expected.get("*", 300.0)
+
+
+@pytest.mark.parametrize("value", ["fast", "pgai=-1"])
+def test_per_agent_timeout_invalid(value):
+    with pytest.raises(click.BadParameter):
+        PerAgentParamType(parse_timeout).convert(value, None, None)
+
+
+def test_per_agent_hedge():
+    values = PerAgentParamType(parse_hedge).convert("pgai=on,judge=off", None, None)
+    assert get_agent_value(values, "pgai", False) is True
+    assert get_agent_value(values, "judge", False) is False
+    assert get_agent_value(values, "vanna", False) is False
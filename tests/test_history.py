@@ -0,0 +1,80 @@
+import json
+
+from suite.history import (
+    get_expected_stats,
+    load_history,
+    save_history,
+    update_history,
+)
+
+
+def make_results(duration: float, cost: float) -> dict:
+    return {
+        "bird": {
+            "evals": [
+                {
+                    "name": "001",
+                    "duration": duration,
+                    "details": {
+                        "usage": {
+                            "request_tokens": 100,
+                            "request_tokens_cost": cost,
+                            "response_tokens": 10,
+                            "response_tokens_cost": 0.0,
+                        },
+                        "timings": {"gold_query": 0.5},
+                    },
+                }
+            ]
+        }
+    }
+
+
+def test_update_history():
+    history = {}
+    update_history(history, "pgai/openai:gpt-4.1", make_results(2.0, 0.01))
+    update_history(history, "pgai/openai:gpt-4.1", make_results(4.0, 0.03))
+    assert history["pgai/openai:gpt-4.1"]["bird/001"] == {
+        "runs": 2,
+        "duration": 3.0,
+        "gold_query": 0.5,
+        "tokens": 110.0,
+        "cost": 0.02,
+    }
+
+
+def test_get_expected_stats():
+    history = {}
+    update_history(history, "pgai/openai:gpt-4.1", make_results(2.0, 0.01))
+    update_history(history, "vanna/openai:gpt-4.1", make_results(6.0, 0.05))
+    expected = get_expected_stats(history, "vanna/openai:o3", ["bird/001", "bird/002"])
+    # known evals use the history of other configs for their duration only
+    assert expected["bird/001"]["duration"] == 4.0
+    assert expected["bird/001"]["cost"] == 0.0
+    assert expected["bird/002"]["duration"] == 0.0
+    expected = get_expected_stats(
+        history, "pgai/openai:gpt-4.1", ["bird/001", "bird/002"]
+    )
+    assert expected["bird/001"]["cost"] == 0.01
+    assert expected["bird/002"]["cost"] == 0.01
+
+
+def test_load_history(tmp_path):
+    assert load_history(tmp_path) == {}
+    with (tmp_path / "results.json").open("w") as fp:
+        json.dump(
+            {
+                "details": {
+                    "agent": {"name": "pgai"},
+                    "provider": "openai",
+                    "model": "gpt-4.1",
+                },
+                "results": make_results(2.0, 0.01),
+            },
+            fp,
+        )
+    history = load_history(tmp_path)
+    assert history["pgai/openai:gpt-4.1"]["bird/001"]["duration"] == 2.0
+    history["pgai/openai:gpt-4.1"]["bird/001"]["duration"] = 5.0
+    save_history(tmp_path, history)
+    assert load_history(tmp_path) == history
@@ -0,0 +1,67 @@
+from suite.index_advisor import extract_index_candidates, get_index_name
+
+SCHEMA = {
+    ("public", "customers"): {"customerid", "segment", "currency"},
+    ("public", "yearmonth"): {"customerid", "date", "consumption"},
+    ("postgres_air", "flight"): {"flight_id", "departure_airport"},
+    ("postgres_air", "airport"): {"airport_code", "city"},
+}
+
+
+def test_extract_index_candidates():
+    candidates = extract_index_candidates(
+        "SELECT T1.CustomerID FROM customers AS T1 "
+        "INNER JOIN yearmonth AS T2 ON T1.CustomerID = T2.CustomerID "
+        "WHERE T1.Segment = 'LAM' AND SUBSTR(T2.Date, 1, 4) = '2012'",
+        SCHEMA,
+    )
+    assert candidates == [
+        {
+            "schema": "public",
+            "table": "customers",
+            "column": "customerid",
+            "kind": "join",
+        },
+        {
+            "schema": "public",
+            "table": "customers",
+            "column": "segment",
+            "kind": "filter",
+        },
+        {
+            "schema": "public",
+            "table": "yearmonth",
+            "column": "customerid",
+            "kind": "join",
+        },
+    ]
+
+
+def test_extract_index_candidates_subquery_and_schema():
+    candidates = extract_index_candidates(
+        "SELECT count(*) FROM postgres_air.flight f "
+        "WHERE f.departure_airport IN "
+        "(SELECT airport_code FROM postgres_air.airport WHERE city = 'Chicago')",
+        SCHEMA,
+    )
+    assert [(x["table"], x["column"], x["kind"]) for x in candidates] == [
+        ("airport", "city", "filter"),
+        ("flight", "departure_airport", "filter"),
+    ]
+
+
+def test_extract_index_candidates_unknown():
+    assert extract_index_candidates("SELECT * FROM missing WHERE id = 1", SCHEMA) == []
+    assert extract_index_candidates("SELEC bad", SCHEMA) == []
+
+
+def test_get_index_name():
+    assert get_index_name("customers", "segment") == "customers_segment_t2s_idx"
+    assert len(get_index_name("a" * 60, "b" * 60)) == 63
+
+
+def test_get_index_name_distinct():
+    a = get_index_name("a" * 50, "first_column")
+    b = get_index_name("a" * 50, "second_column")
+    assert a != b
+    assert len(a) == len(b) == 63
@@ -0,0 +1,33 @@
+import asyncio
+
+import polars as pl
+
+from suite.judge import format_preview, get_cache_key, get_judge_request, judge_all
+
+
+def test_format_preview():
+    df = pl.DataFrame({"a": list(range(20)), "b": ["x|y", None] + ["z" * 80] * 18})
+    lines = format_preview(df).split("\n")
+    assert len(lines) == 12
+    assert lines[0] == "| a | b |"
+    assert lines[2] == "| 0 | x\\|y |"
+    assert lines[3] == "| 1 |  |"
+    assert lines[4].endswith("... |")
+
+
+def test_judge_all():
+    df = pl.DataFrame({"a": [1]})
+    requests = [
+        get_judge_request("How many?", "SELECT 1", "SELECT 1 AS a", df, df),
+        get_judge_request("How many?", "SELECT 1", "SELECT 2", df, df),
+        get_judge_request("How many?", "SELECT 1", "SELECT 1 AS a", df, df),
+    ]
+    cached = {"judgement": False, "explanation": "Cached."}
+    verdicts = {get_cache_key("mock:instant", requests[1]): cached}
+    judged = asyncio.run(judge_all(requests, "mock:instant", 2, verdicts))
+    assert judged == [
+        {"judgement": True, "explanation": "Mock judgement."},
+        cached,
+        {"judgement": True, "explanation": "Mock judgement."},
+    ]
+    assert len(verdicts) == 2
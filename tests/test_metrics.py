@@ -0,0 +1,60 @@
+import urllib.request
+
+import pytest
+
+from suite.metrics import serve_metrics, to_prometheus, use_metrics
+from suite.timing import span
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def get_result(status: str) -> dict:
+    return {
+        "status": status,
+        "details": {"usage": {"request_tokens": 100, "response_tokens": 10}},
+    }
+
+
+@pytest.mark.parametrize(
+    "attributes,requests",
+    [
+        ({"gen_ai.operation.name": "chat", "gen_ai.system": "openai"}, 2),
+        # spans around a whole agent are not LLM requests
+        ({"gen_ai.system": "openai"}, 0),
+    ],
+)
+def test_metrics(attributes, requests):
+    with use_metrics() as metrics:
+        metrics.start_dataset("bird", 3)
+        metrics.start_evals(3)
+        with span("llm", attributes):
+            pass
+        with pytest.raises(RateLimitError), span("llm", attributes):
+            raise RateLimitError()
+        metrics.finish_eval("openai", get_result("pass"))
+        metrics.finish_eval("openai", get_result("fail"))
+        metrics.finish_eval("openai", None)
+    # outside of `use_metrics()`, nothing is recorded
+    with span("llm", attributes):
+        pass
+    text = to_prometheus(metrics)
+    assert 'eval_evals_completed_total{status="pass"} 1' in text
+    assert "eval_evals_in_flight 0" in text
+    assert "eval_evals_remaining 0" in text
+    assert 'eval_llm_tokens_total{provider="openai",type="request_tokens"} 200' in text
+    assert (
+        f'eval_llm_request_duration_seconds_count{{provider="openai"}} {requests}'
+        in text
+    )
+    assert f'eval_llm_rate_limited_total{{provider="openai"}} {requests // 2}' in text
+
+
+def test_serve_metrics():
+    with use_metrics() as metrics, serve_metrics(metrics, 0) as server:
+        metrics.start_dataset("bird", 10)
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "eval_evals_remaining 10" in response.read().decode("utf-8")
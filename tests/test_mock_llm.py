@@ -0,0 +1,144 @@
+import asyncio
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import pytest
+from pydantic import BaseModel
+from pydantic_ai.direct import model_request, model_request_stream
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import ModelRequest
+from pydantic_ai.models import ModelRequestParameters
+from pydantic_ai.tools import ToolDefinition
+
+from suite.mock_llm import (
+    PROFILES,
+    MockModel,
+    MockOpenAI,
+    MockResponder,
+    get_gold_answers,
+    get_mock_model,
+    sample_latency,
+)
+from suite.utils import expand_task_model
+
+
+class SQLQuery(BaseModel):
+    query: str
+
+
+class Tables(BaseModel):
+    tables: list[str]
+
+
+def get_question() -> tuple[str, str]:
+    return next(iter(get_gold_answers().items()))
+
+
+def test_expand_task_model():
+    assert expand_task_model("mock") == "mock:instant"
+    assert expand_task_model("mock:flaky") == "mock:flaky"
+
+
+def test_mock_model_output_tool():
+    question, query = get_question()
+    response = asyncio.run(
+        model_request(
+            MockModel("instant"),
+            [ModelRequest.user_text_prompt(f"Question: {question}")],
+            model_request_parameters=ModelRequestParameters(
+                output_tools=[
+                    ToolDefinition(
+                        name="record_sql_answer",
+                        description="",
+                        parameters_json_schema={},
+                    )
+                ]
+            ),
+        )
+    )
+    part = response.parts[0]
+    assert part.part_kind == "tool-call"
+    assert part.args_as_dict()["sql_statement"] == query
+    assert response.usage.request_tokens > 0
+
+
+def test_mock_openai_parse():
+    question, query = get_question()
+    client = MockOpenAI("instant")
+    messages = [{"role": "user", "content": question}]
+    chat = client.beta.chat.completions.parse(
+        messages=messages, model="x", response_format=SQLQuery
+    )
+    assert chat.choices[0].message.parsed.query == query
+    chat = client.beta.chat.completions.parse(
+        messages=messages, model="x", response_format=Tables
+    )
+    assert len(chat.choices[0].message.parsed.tables) > 0
+    chat = client.chat.completions.create(messages=messages, model="x")
+    assert query in chat.choices[0].message.content
+
+
+def test_mock_model_stream():
+    question, query = get_question()
+
+    async def stream():
+        async with model_request_stream(
+            MockModel("instant"), [ModelRequest.user_text_prompt(question)]
+        ) as response:
+            async for _ in response:
+                pass
+            return response.get()
+
+    response = asyncio.run(stream())
+    assert response.parts[0].content == query
+    assert response.usage.response_tokens > 0
+
+
+def test_mock_responder_attempts():
+    question, _ = get_question()
+    sequential = MockResponder("flaky")
+    expected = [sequential.respond(question) for _ in range(50)]
+    responder = MockResponder("flaky")
+    with ThreadPoolExecutor(8) as pool:
+        responses = list(pool.map(lambda _: responder.respond(question), range(50)))
+    # the same outcomes, in whichever order the threads got them
+    assert sorted(x["latency"] for x in responses) == sorted(
+        x["latency"] for x in expected
+    )
+    assert responder.attempts[question] == 50
+
+
+def test_mock_model_per_agent():
+    assert get_mock_model("instant", "pgai") is get_mock_model("instant", "pgai")
+    assert get_mock_model("instant", "pgai") is not get_mock_model("instant", "judge")
+
+
+def test_mock_errors(monkeypatch, tmp_path):
+    profiles_file = tmp_path / "profiles.json"
+    profiles_file.write_text('{"broken": {"rate_limit_error_rate": 1.0}}')
+    monkeypatch.setenv("MOCK_LLM_PROFILES", str(profiles_file))
+    question, _ = get_question()
+    with pytest.raises(openai.RateLimitError):
+        MockOpenAI("broken").chat.completions.create(
+            messages=[{"role": "user", "content": question}], model="x"
+        )
+    with pytest.raises(ModelHTTPError) as e:
+        asyncio.run(
+            model_request(
+                MockModel("broken"), [ModelRequest.user_text_prompt(question)]
+            )
+        )
+    assert e.value.status_code == 429
+    with pytest.raises(ValueError):
+        MockModel("missing")
+
+
+@pytest.mark.parametrize("profile", ["instant", "fast", "realistic", "flaky"])
+def test_sample_latency(profile):
+    rng = random.Random(0)
+    latencies = [sample_latency(PROFILES[profile], rng) for _ in range(2000)]
+    assert min(latencies) >= 0
+    assert sum(latencies) / len(latencies) == pytest.approx(
+        PROFILES[profile]["latency_mean"], abs=0.1
+    )
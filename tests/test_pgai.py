@@ -0,0 +1,101 @@
+import asyncio
+
+from pgai.semantic_catalog.models import Fact, SQLExample
+
+from suite.agents.pgai import drop_removed
+from suite.catalogs import compile_catalog, diff_catalogs
+
+BEFORE = """---
+schema: public
+name: city
+type: table
+description: Cities.
+...
+---
+type: sql_example
+sql: SELECT count(*) FROM city
+description: Count the cities.
+...
+---
+type: sql_example
+sql: SELECT name FROM city
+description: List the cities.
+...
+---
+type: fact
+description: Cities are never deleted.
+...
+---
+type: fact
+description: Names are in English.
+...
+"""
+
+AFTER = """---
+schema: public
+name: city
+type: table
+description: The cities of the world.
+...
+---
+type: sql_example
+sql: SELECT count(*) FROM city
+description: Count all cities.
+...
+---
+type: sql_example
+sql: SELECT max(id) FROM city
+description: Get the last city.
+...
+---
+type: fact
+description: Cities are never deleted, only renamed.
+...
+---
+type: fact
+description: Identifiers are sequential.
+...
+"""
+
+
+class FakeSemanticCatalog:
+    def __init__(self, docs):
+        self.sql_examples = [
+            SQLExample(id=i, sql=x["sql"], description=x["description"])
+            for i, x in enumerate(docs)
+            if x["type"] == "sql_example"
+        ]
+        self.facts = [
+            Fact(id=i, description=x["description"])
+            for i, x in enumerate(docs)
+            if x["type"] == "fact"
+        ]
+        self.dropped = []
+
+    async def list_sql_examples(self, con):
+        return self.sql_examples
+
+    async def list_facts(self, con):
+        return self.facts
+
+    async def drop_sql_example(self, con, id):
+        self.dropped.append(id)
+
+    async def drop_fact(self, con, id):
+        self.dropped.append(id)
+
+
+def test_drop_removed(tmp_path):
+    (tmp_path / "before.yaml").write_text(BEFORE)
+    (tmp_path / "after.yaml").write_text(AFTER)
+    before = compile_catalog(tmp_path / "before.yaml", tmp_path)
+    after = compile_catalog(tmp_path / "after.yaml", tmp_path)
+    added, removed = diff_catalogs(before, after)
+    # the changed table, SQL example and fact, and the added ones
+    assert added == after["docs"]
+    catalog_sc = FakeSemanticCatalog(before["docs"])
+    # the changed and removed SQL examples and facts, but not the table, whose
+    # description is replaced when it is saved again
+    assert asyncio.run(drop_removed(None, catalog_sc, removed)) == 4
+    assert catalog_sc.dropped == [1, 2, 3, 4]
+    assert asyncio.run(drop_removed(None, FakeSemanticCatalog(after["docs"]), [])) == 0
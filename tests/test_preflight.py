@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+
+import pytest
+
+from suite.preflight import (
+    PreflightError,
+    Schema,
+    check_query,
+    preflight,
+    use_preflight,
+)
+
+SCHEMA = Schema(
+    {
+        ("public", "users"): {"id", "name", "created_at"},
+        ("public", "orders"): {"id", "user_id", "total"},
+    },
+    ["public"],
+)
+
+
+@pytest.mark.parametrize(
+    "query,status",
+    [
+        ("SELECT name FROM users", "ok"),
+        ("SELECT NAME FROM public.USERS", "ok"),
+        ("SELECT name, count(*) AS c FROM users GROUP BY name ORDER BY c DESC", "ok"),
+        (
+            "WITH x AS (SELECT user_id, sum(total) AS t FROM orders GROUP BY 1)"
+            " SELECT u.name, x.t FROM users u JOIN x ON x.user_id = u.id",
+            "ok",
+        ),
+        (
+            "SELECT name FROM users WHERE EXISTS"
+            " (SELECT 1 FROM orders WHERE user_id = users.id)",
+            "ok",
+        ),
+        ("SELECT g FROM generate_series(1, 3) g", "ok"),
+        ("SELECT json_agg(u) FROM users u", "ok"),
+        ("SELECT relname FROM pg_class", "ok"),
+        ("SELECT name FROM other.users", "ok"),
+        ("SELECT a FROM users AS u(a, b, c, d)", "ok"),
+        ("SELECT u.a FROM users AS u(a)", "ok"),
+        ("SELECT localtime, localtimestamp FROM users", "ok"),
+        ("SELECT user, current_role, current_catalog FROM users", "ok"),
+        ("SELECT name FROM users WHERE created_at < localtimestamp", "ok"),
+        ("SELEC name FROM users", "unparsed"),
+    ],
+)
+def test_check_query(query, status):
+    assert check_query(query, SCHEMA) == status
+
+
+@pytest.mark.parametrize(
+    "query,error",
+    [
+        ("SELECT * FROM customers", 'relation "customers" does not exist'),
+        ("SELECT nam FROM users", "column nam does not exist"),
+        ('SELECT "Name" FROM users', "column Name does not exist"),
+        ('SELECT "user" FROM users', "column user does not exist"),
+        ("SELECT u.nam FROM users u", "column u.nam does not exist"),
+        (
+            "SELECT name FROM users WHERE id IN (SELECT usr_id FROM orders)",
+            "column usr_id does not exist",
+        ),
+        ("DELETE FROM users", "DELETE statements are not allowed"),
+        ("SELECT 1; DROP TABLE users", "DROP statements are not allowed"),
+        (
+            "WITH d AS (DELETE FROM users RETURNING *) SELECT * FROM d",
+            "DELETE is not allowed",
+        ),
+        ("SELECT * INTO copy FROM users", "INTO is not allowed"),
+        ("SELECT * FROM users FOR UPDATE", "locking clauses are not allowed"),
+    ],
+)
+def test_check_query_rejected(query, error):
+    with pytest.raises(PreflightError, match=error):
+        check_query(query, SCHEMA)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.info = SimpleNamespace(host="localhost", port=5432, dbname="bird_db")
+        self.queries = 0
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, query):
+                conn.queries += 1
+
+            def fetchall(self):
+                return [("public", "users", "id"), ("public", "users", "name")]
+
+            def fetchone(self):
+                return (["public"],)
+
+        return Cursor()
+
+
+def test_preflight():
+    conn = FakeConnection()
+    assert preflight("SELECT name FROM users", conn) is None
+    with use_preflight() as cache:
+        assert preflight("SELECT name FROM users", conn) == "ok"
+        with pytest.raises(PreflightError):
+            preflight("SELECT * FROM orders", conn)
+    # the schema is only read once per database
+    assert conn.queries == 2
+    assert cache.checked == 2
+    assert cache.rejected == 1
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import polars as pl
+import psycopg
+import pytest
+
+from suite.query_cache import (
+    CachedQueryError,
+    get_cached_dataframe,
+    normalize_query,
+    use_query_cache,
+)
+
+
+@pytest.mark.parametrize(
+    "a,b",
+    [
+        ("SELECT name FROM users", "select  name\nfrom users"),
+        ('SELECT "name" FROM users WHERE id = 1', "SELECT name FROM users WHERE id=1"),
+        ("SELECT name FROM users;", "SELECT name FROM users"),
+    ],
+)
+def test_normalize_query(a, b):
+    assert normalize_query(a) == normalize_query(b)
+
+
+def test_normalize_query_distinct():
+    assert normalize_query("SELECT name FROM users") != normalize_query(
+        "SELECT id FROM users"
+    )
+
+
+class FakeConnection:
+    def __init__(self, tables: str):
+        self.info = SimpleNamespace(host="localhost", port=5432, dbname="bird_db")
+        self.tables = tables
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, query):
+                pass
+
+            def fetchone(self):
+                return (conn.tables,)
+
+        return Cursor()
+
+
+def test_get_cached_dataframe(tmp_path):
+    calls = []
+
+    def get_dataframe(query, conn):
+        calls.append(query)
+        if "missing" in query:
+            raise psycopg.errors.UndefinedColumn("column missing does not exist")
+        return pl.DataFrame({"a": [1, 2]})
+
+    conn = FakeConnection("v1")
+    with use_query_cache(tmp_path) as cache:
+        df, cached = get_cached_dataframe("SELECT a FROM t", conn, get_dataframe)
+        assert not cached
+        df, cached = get_cached_dataframe("select a\nfrom t", conn, get_dataframe)
+        assert cached
+        assert df.equals(pl.DataFrame({"a": [1, 2]}))
+        for _ in range(2):
+            with pytest.raises((psycopg.Error, CachedQueryError)):
+                get_cached_dataframe("SELECT missing FROM t", conn, get_dataframe)
+        assert (cache.hits, cache.misses) == (2, 2)
+    assert len(calls) == 2
+
+    # a different database fingerprint does not use the cached results
+    with use_query_cache(tmp_path):
+        _, cached = get_cached_dataframe(
+            "SELECT a FROM t", FakeConnection("v2"), get_dataframe
+        )
+    assert not cached
@@ -0,0 +1,120 @@
+import random
+
+import pytest
+from click.testing import CliRunner
+
+from suite.columnar import to_frame, write_results
+from suite.main import cli
+from suite.report import (
+    concat_frames,
+    get_breakdown,
+    get_error_counts,
+    summarize_timings,
+    summarize_usage,
+)
+from suite.timing import summarize_phases
+
+
+def get_evals(dataset: str, count: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    evals = []
+    for i in range(count):
+        status = rng.choice(["pass", "pass", "fail", "error"])
+        details = {
+            "usage": {
+                "cached_tokens": 0,
+                "cached_tokens_cost": 0.0,
+                "request_tokens": 100,
+                "request_tokens_cost": 0.01,
+                "response_tokens": 10,
+                "response_tokens_cost": 0.002,
+            },
+            "timings": {"agent": rng.random()},
+        }
+        if status == "error":
+            details["exception_class"] = rng.choice(["AgentFnError", "QueryError"])
+        else:
+            details["timings"]["gold_query"] = rng.random()
+        evals.append(
+            {
+                "status": status,
+                "dataset": dataset,
+                "database": f"db{i % 3}",
+                "name": f"{i:03}",
+                "question": "question",
+                "duration": rng.random() * 10,
+                "details": details,
+            }
+        )
+    return evals
+
+
+EVALS = get_evals("bird", 50, 0) + get_evals("spider", 30, 1)
+# one frame per results file, as in `generate_report`
+DF = concat_frames(
+    [to_frame({"results": {"bird": {"evals": EVALS[:50]}}})]
+    + [to_frame({"results": {"spider": {"evals": EVALS[50:]}}})]
+)
+
+
+def test_summarize_timings():
+    assert summarize_timings(DF) == summarize_phases(EVALS)
+
+
+def test_summarize_usage():
+    usage = summarize_usage(DF)
+    assert usage["request_tokens"] == 100 * len(EVALS)
+    assert usage["response_tokens_cost"] == pytest.approx(0.002 * len(EVALS))
+
+
+@pytest.mark.parametrize("by", [["dataset"], ["dataset", "database"]])
+def test_get_breakdown(by):
+    breakdown = get_breakdown(DF, by)
+    for row in breakdown.iter_rows(named=True):
+        evals = [x for x in EVALS if all(x[y] == row[y] for y in by)]
+        passing = sum(1 for x in evals if x["status"] == "pass")
+        assert row["total"] == len(evals)
+        assert row["passing"] == passing
+        assert row["duration"] == pytest.approx(sum(x["duration"] for x in evals))
+        assert row["cost_per_pass"] == pytest.approx(0.012 * len(evals) / passing)
+
+
+def test_get_error_counts():
+    counts = get_error_counts(DF, ["dataset"])
+    assert counts["count"].sum() == sum(1 for x in EVALS if x["status"] == "error")
+
+
+def test_generate_report_matrix(tmp_path):
+    # two combos of a sampled run, with the same evals
+    for combo, status in [("pgai", "pass"), ("baseline", "fail")]:
+        evals = [{**x, "status": status} for x in EVALS[:10]]
+        write_results(
+            {
+                "task": "text_to_sql",
+                "start_time": "2025-01-01T00:00:00+00:00",
+                "end_time": "2025-01-01T00:01:00+00:00",
+                "details": {},
+                "results": {
+                    "bird": {
+                        "evals": evals,
+                        "sample": {
+                            "strata": {
+                                "all": {
+                                    "population": 50,
+                                    "evals": [x["name"] for x in evals],
+                                }
+                            }
+                        },
+                    }
+                },
+            },
+            tmp_path / f"{combo}.json",
+        )
+    (tmp_path / "corrupt.parquet").write_bytes(b"not parquet")
+    result = CliRunner().invoke(
+        cli, ["generate-report", *sorted(str(x) for x in tmp_path.glob("*.*"))]
+    )
+    assert result.exception is None, result.output
+    assert "Failed to read corrupt.parquet" in result.output
+    assert "Overall: 10/20 (0.5)" in result.output
+    assert "Estimated pass rate: 0.5" in result.output
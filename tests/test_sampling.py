@@ -0,0 +1,59 @@
+import pytest
+
+from suite.sampling import allocate, estimate_pass_rate, get_complexity, sample_evals
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        ("SELECT name FROM users", "simple"),
+        ("SELECT COUNT(*) FROM users GROUP BY city", "medium"),
+        (
+            "SELECT u.name FROM users u JOIN orders o ON u.id = o.user_id"
+            " JOIN items i ON o.id = i.order_id"
+            " WHERE u.id IN (SELECT user_id FROM bans)",
+            "complex",
+        ),
+        ("SELEC name FORM users (", "unknown"),
+    ],
+)
+def test_get_complexity(query, expected):
+    assert get_complexity(query) == expected
+
+
+@pytest.mark.parametrize(
+    "populations,size,expected",
+    [
+        ({"a": 80, "b": 20}, 10, {"a": 8, "b": 2}),
+        ({"a": 98, "b": 1, "c": 1}, 10, {"a": 8, "b": 1, "c": 1}),
+        ({"a": 5, "b": 5}, 1, {"a": 1, "b": 0}),
+        ({"a": 2, "b": 3}, 50, {"a": 2, "b": 3}),
+    ],
+)
+def test_allocate(populations, size, expected):
+    assert allocate(populations, size) == expected
+
+
+def test_sample_evals():
+    evals = {f"{i:03}": "small" if i < 10 else "large" for i in range(100)}
+    sample = sample_evals("bird", evals, 0.2, 42)
+    assert sample["size"] == 20
+    assert sample["strata"]["small"]["population"] == 10
+    assert len(sample["strata"]["small"]["evals"]) == 2
+    assert len(sample["strata"]["large"]["evals"]) == 18
+    assert sample == sample_evals("bird", evals, 0.2, 42)
+    assert sample != sample_evals("bird", evals, 0.2, 43)
+
+
+def test_estimate_pass_rate():
+    strata = {
+        "a": {"population": 4, "evals": ["1", "2", "3", "4"]},
+        "b": {"population": 12, "evals": ["5", "6"]},
+    }
+    statuses = {"1": "pass", "2": "pass", "3": "fail", "4": "fail", "5": "pass"}
+    pass_rate = estimate_pass_rate(strata, statuses)
+    assert pass_rate["estimate"] == 0.875
+    assert pass_rate["low"] < 0.875 < pass_rate["high"]
+    # a stratum that was run in full has no sampling error
+    full = estimate_pass_rate({"a": strata["a"]}, statuses)
+    assert full == {"estimate": 0.5, "low": 0.5, "high": 0.5}
@@ -0,0 +1,96 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import polars as pl
+import pytest
+from psycopg.pq import TransactionStatus
+
+from suite.sandbox import (
+    DEFAULT_LIMITS,
+    BudgetExceededError,
+    check_rows,
+    get_sandboxed_dataframe,
+    to_dataframe,
+    use_sandbox,
+)
+
+
+class FakeConnection:
+    def __init__(self, rows: list[tuple[int]]):
+        self.info = SimpleNamespace(transaction_status=TransactionStatus.INTRANS)
+        self.rows = rows
+        self.queries = []  # type: list[str]
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def transaction(self):
+        return nullcontext()
+
+    def cursor(self, name=None):
+        conn = self
+
+        class Cursor:
+            description = [SimpleNamespace(name="a")]
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, query, params=None):
+                conn.queries.append(query)
+                self.rows = list(conn.rows)
+
+            def fetchmany(self, size):
+                batch, self.rows = self.rows[:size], self.rows[size:]
+                return batch
+
+        return Cursor()
+
+
+def test_to_dataframe():
+    df = to_dataframe([(1, 2, 3)], ["a", "b", "a"])
+    assert df.columns == ["a_0", "b", "a_2"]
+
+
+def test_get_sandboxed_dataframe():
+    conn = FakeConnection([(1,), (2,), (3,)])
+
+    def get_dataframe(query, conn):
+        return pl.DataFrame({"a": [1]})
+
+    df, usage = get_sandboxed_dataframe("SELECT a FROM t", conn, get_dataframe)
+    assert df.height == 1
+    assert usage["rows"] == 1
+    assert conn.queries == []
+
+    with use_sandbox(DEFAULT_LIMITS):
+        df, usage = get_sandboxed_dataframe("SELECT a FROM t;", conn, get_dataframe)
+    assert df["a"].to_list() == [1, 2, 3]
+    assert usage["rows"] == 3
+    assert usage["bytes"] > 0
+    # the open transaction is committed before the read only one begins
+    assert conn.commits == 1
+    assert conn.queries[0] == "SET TRANSACTION READ ONLY"
+    assert conn.queries[-1] == "SELECT a FROM t"
+
+    with (
+        use_sandbox({**DEFAULT_LIMITS, "max_rows": 2}),
+        pytest.raises(BudgetExceededError),
+    ):
+        get_sandboxed_dataframe("SELECT a FROM t", conn, get_dataframe)
+
+
+def test_check_rows():
+    df = pl.DataFrame({"a": [1, 2, 3]})
+    check_rows(df)
+    with use_sandbox(DEFAULT_LIMITS):
+        check_rows(df)
+    with (
+        use_sandbox({**DEFAULT_LIMITS, "max_rows": 2}),
+        pytest.raises(BudgetExceededError),
+    ):
+        check_rows(df)
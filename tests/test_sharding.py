@@ -0,0 +1,64 @@
+import pytest
+
+from suite.sharding import USAGE_KEYS, merge_results, partition
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 7])
+def test_partition(count):
+    names = [f"{i:03}" for i in range(50)]
+    shards = partition(names, count)
+    assert len(shards) == count
+    assert sorted(x for y in shards for x in y) == names
+    sizes = [len(x) for x in shards]
+    assert max(sizes) - min(sizes) <= 1
+    # independent of the order (e.g. by expected duration) of the evals
+    assert shards == partition(list(reversed(names)), count)
+
+
+def make_shard(index: int, evals: list[tuple[str, str]]) -> dict:
+    return {
+        "task": "text_to_sql",
+        "start_time": f"2025-01-01T00:0{index}:00+00:00",
+        "end_time": f"2025-01-01T01:0{index}:00+00:00",
+        "details": {"shard": f"{index}/2"},
+        "results": {
+            "bird": {
+                "passing": sum(1 for x in evals if x[1] == "pass"),
+                "total": len(evals),
+                "total_duration": float(len(evals)),
+                "usage": {x: 10 * len(evals) for x in USAGE_KEYS},
+                "failed": [x[0] for x in evals if x[1] == "fail"],
+                "failed_error_counts": {},
+                "errored": [],
+                "evals": [
+                    {"name": x[0], "status": x[1], "duration": 1.0, "details": {}}
+                    for x in evals
+                ],
+                "shard": {"index": index, "count": 2, "population": 3},
+            }
+        },
+    }
+
+
+def test_merge_results():
+    merged = merge_results(
+        [
+            make_shard(1, [("002", "pass")]),
+            make_shard(2, [("001", "fail"), ("003", "pass")]),
+        ]
+    )
+    assert merged["start_time"] == "2025-01-01T00:01:00+00:00"
+    assert merged["end_time"] == "2025-01-01T01:02:00+00:00"
+    assert merged["details"]["shards"] == ["1/2", "2/2"]
+    results = merged["results"]["bird"]
+    assert results["passing"] == 2
+    assert results["total"] == 3
+    assert results["total_duration"] == 3.0
+    assert results["usage"]["request_tokens"] == 30
+    assert results["failed"] == ["001"]
+    assert [x["name"] for x in results["evals"]] == ["001", "002", "003"]
+
+    with pytest.raises(ValueError, match="multiple shards"):
+        merge_results(
+            [make_shard(1, [("001", "pass")]), make_shard(2, [("001", "pass")])]
+        )
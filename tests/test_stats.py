@@ -0,0 +1,37 @@
+import pytest
+
+from suite.stats import percentile, summarize
+
+
+@pytest.mark.parametrize(
+    "values, pct, expected",
+    [
+        ([], 50, 0.0),
+        ([1.0], 99, 1.0),
+        ([1.0, 2.0, 3.0], 50, 2.0),
+        ([1.0, 2.0, 3.0, 4.0], 50, 2.5),
+        ([3.0, 1.0, 2.0], 0, 1.0),
+        ([3.0, 1.0, 2.0], 100, 3.0),
+        ([float(x) for x in range(1, 101)], 95, 95.05),
+    ],
+)
+def test_percentile(values, pct, expected):
+    assert percentile(values, pct) == pytest.approx(expected)
+
+
+def test_percentile_invalid():
+    with pytest.raises(ValueError):
+        percentile([1.0], 101)
+
+
+def test_summarize():
+    summary = summarize([0.1, 0.2, 0.3, 0.4])
+    assert summary["count"] == 4
+    assert summary["min"] == 0.1
+    assert summary["max"] == 0.4
+    assert summary["avg"] == 0.25
+    assert summary["p50"] == 0.25
+
+
+def test_summarize_empty():
+    assert summarize([])["count"] == 0
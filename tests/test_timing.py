@@ -0,0 +1,26 @@
+from suite.timing import record_timings, span, summarize_phases
+
+
+def test_span():
+    with span("outside"):
+        pass
+    with record_timings() as timings:
+        for _ in range(2):
+            with span("llm"):
+                pass
+        with span("compare"):
+            pass
+    assert sorted(timings.keys()) == ["compare", "llm"]
+    assert all(x >= 0 for x in timings.values())
+
+
+def test_summarize_phases():
+    evals = [
+        {"details": {"timings": {"llm": 1.0, "compare": 0.1}}},
+        {"details": {"timings": {"llm": 3.0}}},
+        {"details": {}},
+    ]
+    assert summarize_phases(evals) == {
+        "compare": {"count": 1, "p50": 0.1, "p95": 0.1, "max": 0.1},
+        "llm": {"count": 2, "p50": 2.0, "p95": 2.9, "max": 3.0},
+    }
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from suite.timing import span
+from suite.tracing import set_attributes, start_tracing, trace_span
+
+
+def test_trace_export(tmp_path, monkeypatch):
+    monkeypatch.delenv("OTEL_EXPORTER_OTLP_ENDPOINT", raising=False)
+    monkeypatch.delenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", raising=False)
+    with trace_span("untraced") as untraced:
+        assert untraced is None
+    with start_tracing({"eval.agent": "baseline"}) as tracer:
+        with trace_span("eval", {"eval.name": "001", "skipped": None}):
+            with span("agent"):
+                set_attributes({"gen_ai.usage.input_tokens": 10})
+            with pytest.raises(ValueError), span("generated_query"):
+                raise ValueError("bad query")
+
+    output_file = tmp_path / "trace.json"
+    assert tracer.export(output_file) == str(output_file)
+    with output_file.open() as fp:
+        trace = json.load(fp)
+    spans = trace["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [x["name"] for x in spans] == ["eval", "agent", "generated_query"]
+    assert "parentSpanId" not in spans[0]
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+    assert spans[2]["parentSpanId"] == spans[0]["spanId"]
+    assert spans[0]["attributes"] == [
+        {"key": "eval.name", "value": {"stringValue": "001"}}
+    ]
+    assert spans[1]["attributes"] == [
+        {"key": "gen_ai.usage.input_tokens", "value": {"intValue": "10"}}
+    ]
+    assert spans[2]["status"] == {"code": 2, "message": "ValueError: bad query"}